@@ -1,3 +1,4 @@
+from ..utilities import metrics
 from .utilities.navigable import make_navigable
 
 
@@ -40,7 +41,8 @@ def convert(resource, output_type, mime_override=None):
             # Raise the original, more specific, exception
             raise KeyError("No converters registered for "
                            "{0}".format(e)) from e
-    value = converter(resource)
+    value = metrics.time_conversion(
+            resource, mime_type, output_type, converter)
     if value is not None and not hasattr(value, 'parent'):
         value = make_navigable(value)
     return value
@@ -6,13 +6,18 @@ from ..model.core import Resource
 SHEET_TYPE = "application/x.os2datascanner.spreadsheet"
 
 
+def _format_row(row) -> str:
+    return "\t".join(str(v) for v in row if v is not None and v != "")
+
+
 @conversion(OutputType.Text, SHEET_TYPE)
-def pandas_dataframe_processor(r: Resource, **kwargs):
+def sheet_processor(r: Resource, **kwargs):
     """
-    Converts Sheets from Excel-like files to text using efficient pandas.Dataframes.
+    Converts Sheets from Excel-like files to text, one row at a time: each
+    non-empty row becomes a line of tab-separated cell values.
     """
-    sheet_name = r.handle.relative_path
-    df = r._sm.open(r.handle.source).parse(sheet_name=sheet_name)
-    text = df.columns.astype('string').str.cat(sep='\t') + '\n'
-    return text + "\n".join(
-        row.astype('string').str.cat(sep='\t') for _, row in df.iterrows())
+    workbook = r._sm.open(r.handle.source)
+    return "\n".join(
+            line for line in map(
+                    _format_row, workbook.iter_rows(r.handle.relative_path))
+            if line)
@@ -1,10 +1,13 @@
+from typing import Optional
+from functools import cache
 from tempfile import NamedTemporaryFile
-from subprocess import PIPE, DEVNULL
+from subprocess import PIPE, STDOUT, DEVNULL, TimeoutExpired
 
 from os2datascanner.utils.system_utilities import run_custom
 from ... import settings as engine2_settings
 from ..types import OutputType
 from ..registry import conversion
+from ..utilities.ocr_cache import get_ocr_cache
 
 
 def tesseract(path, dest="stdout", *args):
@@ -21,10 +24,50 @@ def tesseract(path, dest="stdout", *args):
         return None
 
 
+@cache
+def tesseract_version() -> Optional[str]:
+    """Returns a description of the installed version of tesseract and of the
+    languages available to it, or None if tesseract couldn't be asked."""
+    output = []
+    for flag in ("--version", "--list-langs",):
+        try:
+            # (older versions of tesseract print this information to stderr)
+            result = run_custom(
+                    ["tesseract", flag],
+                    universal_newlines=True,
+                    stdout=PIPE,
+                    stderr=STDOUT,
+                    timeout=engine2_settings.subprocess["timeout"])
+        except (OSError, TimeoutExpired):
+            return None
+        if result.returncode != 0:
+            return None
+        output.append(result.stdout.strip())
+    return "\n".join(output)
+
+
+def cached_ocr(path, compute, *config):
+    """Returns the result of calling compute(), or (if the system has an OCR
+    cache) the result of an earlier call for an identical image and
+    configuration, made with the same version of tesseract and the same
+    language data."""
+    if not (ocr_cache := get_ocr_cache()) or not (
+            version := tesseract_version()):
+        return compute()
+
+    key = ocr_cache.make_key(path, version, *config)
+    if (text := ocr_cache.get(key)) is None:
+        text = compute()
+        # (failures might be transient, so don't remember them)
+        if text is not None:
+            ocr_cache.put(key, text)
+    return text
+
+
 @conversion(OutputType.Text, "image/png", "image/jpeg")
 def image_processor(r):
     with r.make_path() as p:
-        return tesseract(p)
+        return cached_ocr(p, lambda: tesseract(p), "tesseract")
 
 
 # Some ostensibly-supported image formats are handled badly by tesseract, so
@@ -32,10 +75,16 @@ def image_processor(r):
 # palatable
 @conversion(OutputType.Text, "image/gif", "image/x-ms-bmp")
 def intermediate_image_processor(r):
-    with r.make_path() as p, NamedTemporaryFile("rb", suffix=".png") as ntf:
-        result = run_custom(
-                ["convert", p, "png:{0}".format(ntf.name)], isolate_tmp=True)
-        if result.returncode == 0:
-            return tesseract(ntf.name)
-        else:
-            return None
+    def _convert_and_ocr(p):
+        with NamedTemporaryFile("rb", suffix=".png") as ntf:
+            result = run_custom(
+                    ["convert", p, "png:{0}".format(ntf.name)],
+                    isolate_tmp=True)
+            if result.returncode == 0:
+                return tesseract(ntf.name)
+            else:
+                return None
+
+    with r.make_path() as p:
+        return cached_ocr(
+                p, lambda: _convert_and_ocr(p), "convert", "tesseract")
@@ -1,10 +1,14 @@
+import os
 import gzip
 import json
+from time import time
 from typing import Optional
 import structlog
 from pathlib import Path
 from datetime import datetime
 from functools import cached_property
+from tempfile import NamedTemporaryFile
+from prometheus_client import Counter
 
 import os2datascanner.engine2.settings as settings
 from ...model.core import Resource
@@ -16,6 +20,17 @@ from ..registry import convert
 
 logger = structlog.get_logger("engine2")
 
+_requests = Counter(
+        "os2datascanner_representation_cache_requests",
+        "Lookups in the representation cache", ["result"])
+_bytes_served = Counter(
+        "os2datascanner_representation_cache_bytes_served",
+        "Size of the (uncompressed) representations read from the cache")
+
+# The number of bytes written to the cache by this process since it was last
+# checked for things to evict
+_since_eviction = None
+
 
 def lastmod(p: Path) -> Optional[datetime]:
     return make_datetime_aware(
@@ -51,6 +66,10 @@ class CacheManager:
                     resource = None
         return None
 
+    @cached_property
+    def resource_lm(self) -> Optional[datetime]:
+        return make_datetime_aware(self._get_resource_lm())
+
     @cached_property
     def handle(self):
         return self._resource.handle.censor()
@@ -87,35 +106,68 @@ class CacheManager:
             else:
                 return None
 
+        @property
+        def cacheable(self) -> bool:
+            """Indicates whether or not a cached copy of this representation
+            could be used. (If the Resource can't say when it was last
+            modified, then there's no way to tell if a cached copy is
+            stale.)"""
+            return (self.path is not None
+                    and self._parent.resource_lm is not None)
+
         @property
         def cache_exists(self) -> bool:
             cf = self.path
-            lm = make_datetime_aware(self._parent._get_resource_lm())
-            return cf and cf.exists() and (not lm or lastmod(cf) >= lm)
+            return (self.cacheable and cf.exists()
+                    and lastmod(cf) >= self._parent.resource_lm)
 
         def create(self, mime_override: str = None):
             """Returns a representation corresponding to the output type of
             this Representation.
 
-            If the system's configuration permits it, the representation will
-            be saved to disk and reused by future calls to Representation.get.
-            Otherwise, it'll just be returned."""
+            If the system's configuration permits it (and if the Resource can
+            say when it was last modified), the representation will be saved
+            to disk and reused by future calls to Representation.get.
+            Otherwise, it'll just be returned. (Failed conversions, which
+            return None, are never saved.)"""
             output_type = self._output_type
-            cf = self.path
 
             representation = convert(
                     self._parent._resource, output_type, mime_override)
-            if cf:
+            if representation is not None and self.cacheable:
                 logger.debug(
                         f"saving cache for {self._parent.handle},"
                         f" type {output_type.value!r}")
                 raw_json = json.dumps(
                         output_type.encode_json_object(representation))
                 compressed = gzip.compress(raw_json.encode())
-                with cf.open("wb") as fp:
-                    fp.write(self._parent._box.encrypt(compressed))
+                encrypted = self._parent._box.encrypt(compressed)
+                if self._write(encrypted):
+                    _note_written(len(encrypted))
             return representation
 
+        def _write(self, content: bytes) -> bool:
+            """Atomically replaces the cached copy of this representation with
+            the given content, returning False if that wasn't possible."""
+            cf = self.path
+            # The cache directory can be shared by several processes, so make
+            # sure that they never see a partial representation. An eviction
+            # can also remove our (empty) folder between our creating it and
+            # putting a file into it, in which case we try again
+            for _ in range(3):
+                cf.parent.mkdir(parents=True, exist_ok=True)
+                try:
+                    with NamedTemporaryFile(
+                            "wb", dir=cf.parent, delete=False) as fp:
+                        fp.write(content)
+                except FileNotFoundError:
+                    continue
+                os.replace(fp.name, cf)
+                return True
+            logger.warning(
+                    f"couldn't save cache for {self._parent.handle}")
+            return False
+
         def get(self, *, create=False, mime_override: str = None):
             """Returns a representation corresponding to the output type of
             this Representation, if one is available. If the create flag is
@@ -129,6 +181,7 @@ class CacheManager:
                         f"cache for {self._parent.handle}, type"
                         f" {output_type.value!r} does not exist or"
                         " is stale")
+                _requests.labels("miss").inc()
                 return self.create(mime_override) if create else None
             else:
                 logger.debug(
@@ -138,12 +191,107 @@ class CacheManager:
                     unencrypted = self._parent._box.decrypt(fp.read())
                     decompressed = gzip.decompress(unencrypted)
                     raw_json = json.loads(decompressed.decode())
-                    return output_type.decode_json_object(raw_json)
+                # Mark this representation as recently used. (This can't make
+                # it look fresher than it is: we only get here if it was
+                # already newer than the Resource)
+                try:
+                    os.utime(cf)
+                except FileNotFoundError:
+                    # (... unless it's just been evicted)
+                    pass
+                _requests.labels("hit").inc()
+                _bytes_served.inc(len(decompressed))
+                return output_type.decode_json_object(raw_json)
 
     def representation(self, output_type: OutputType):
         return self.Representation(self, output_type)
 
+    @staticmethod
+    def should_cache(output_type: OutputType) -> bool:
+        """Indicates whether or not the system has been configured to cache
+        representations of the given type. (Cached representations are
+        encrypted, so nothing is cached if no secret value has been
+        configured.)"""
+        return bool(settings.conversions["cache"]["directory"]
+                    and settings.secret_value
+                    and output_type.value in settings.conversions[
+                            "cache"]["output_types"])
+
+
+def _note_written(size: int):
+    global _since_eviction
+    max_size = settings.conversions["cache"]["max_size"]
+    if _since_eviction is None or _since_eviction + size > max_size // 10:
+        evict()
+    else:
+        _since_eviction += size
+
+
+def _unlink(path: Path):
+    try:
+        path.unlink()
+    except FileNotFoundError:
+        # Another process got here first
+        return
+    try:
+        path.parent.rmdir()
+    except OSError:
+        # Either the directory still contains other representations, or
+        # another process has just created or removed it; either way, it's
+        # not our problem any more. (Representation._write copes with the
+        # directory disappearing under it)
+        pass
+
+
+def _evict_expired(directory: Path, cutoff: float):
+    """Deletes the representations in the cache that were last used before
+    the cutoff, and returns the number deleted along with a list of
+    (last-used time, size, path) tuples describing the ones that remain."""
+    entries = []
+    evicted = 0
+    for path in directory.glob("*/*"):
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            continue
+        if stat.st_mtime < cutoff:
+            _unlink(path)
+            evicted += 1
+        else:
+            entries.append((stat.st_mtime, stat.st_size, path))
+    return evicted, entries
+
+
+def evict():
+    """Deletes representations from the cache that haven't been used for
+    longer than the configured maximum age, and then as many of the least
+    recently used ones as necessary to make the cache comfortably smaller than
+    its configured maximum size."""
+    global _since_eviction
+    _since_eviction = 0
+
+    cd_s = settings.conversions["cache"]["directory"]
+    if not cd_s:
+        return
+    max_size = settings.conversions["cache"]["max_size"]
+    cutoff = time() - settings.conversions["cache"]["max_age"]
+
+    evicted, entries = _evict_expired(Path(cd_s), cutoff)
+    total = sum(size for _, size, _ in entries)
+    if total > max_size:
+        for _, size, path in sorted(entries):
+            if total <= max_size * 0.8:
+                break
+            _unlink(path)
+            total -= size
+            evicted += 1
+
+    if evicted:
+        logger.info("evicted representations from cache",
+                    count=evicted, size=total)
+
 
 __all__ = (
         "CacheManager",
+        "evict",
 )
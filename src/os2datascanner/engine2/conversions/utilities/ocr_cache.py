@@ -0,0 +1,175 @@
+import os
+import re
+import hashlib
+import structlog
+from pathlib import Path
+from typing import Optional
+from tempfile import NamedTemporaryFile
+from nacl.exceptions import CryptoError
+from prometheus_client import Counter
+
+import os2datascanner.engine2.settings as settings
+from ...utilities.cryptography import make_secret_box
+
+
+logger = structlog.get_logger("engine2")
+
+
+# Bump this if the format of cached results ever changes
+_FORMAT = b"2"
+
+# The names of result files. (Anything else in the cache directory, such as a
+# temporary file that another process is still writing, is none of our
+# business)
+_RESULT_NAME = re.compile(r"[0-9a-f]{64}")
+
+_requests = Counter(
+        "os2datascanner_ocr_cache_requests",
+        "Lookups in the OCR result cache", ["result"])
+
+
+class OCRCache:
+    """An OCRCache is a directory of the text found in images by OCR. Each
+    result is stored in a file named for a hash of the image and of the OCR
+    configuration that was used, so identical images (logos, signatures,
+    stamps, and so on) need only be processed once no matter how many
+    documents they appear in.
+
+    As with the representation cache, results are encrypted using the key
+    that identifies them as a password, and the file is named for a hash of
+    that key, so a result can only be read by someone who already has the
+    image it came from.
+
+    The directory can be shared by all of the processes on a machine. Once it
+    grows past a certain size, the results that were least recently used are
+    deleted."""
+
+    # The fraction of the maximum size to shrink the cache to when evicting
+    _LOW_WATER = 0.8
+
+    def __init__(self, directory: Path, max_size: int):
+        self._directory = Path(directory)
+        self._max_size = max_size
+        self._since_eviction = None
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    @staticmethod
+    def make_key(path, *config) -> str:
+        """Computes the cache key for the image at the given path when
+        processed with the given configuration. (The configuration should
+        identify everything that could change the result, including the
+        version of the OCR program and the languages it uses.)"""
+        h = hashlib.sha256(_FORMAT)
+        for c in config:
+            h.update(b"\0" + str(c).encode())
+        h.update(b"\0")
+        with open(path, "rb") as fp:
+            while (chunk := fp.read(1024 * 1024)):
+                h.update(chunk)
+        return h.hexdigest()
+
+    def _path(self, key: str) -> Path:
+        name = hashlib.sha256(key.encode()).hexdigest()
+        return self._directory / name[:2] / name
+
+    def get(self, key: str) -> Optional[str]:
+        path = self._path(key)
+        try:
+            text = make_secret_box(key).decrypt(path.read_bytes()).decode()
+            # Reading a file doesn't reliably update its access time, so mark
+            # this result as recently used explicitly
+            os.utime(path)
+        except (FileNotFoundError, CryptoError):
+            # (a result that can't be decrypted was written with a different
+            # secret value, and is as good as missing)
+            text = None
+
+        if text is None:
+            self.misses += 1
+            _requests.labels("miss").inc()
+        else:
+            self.hits += 1
+            _requests.labels("hit").inc()
+        logger.debug(
+                "OCR cache lookup", hit=text is not None,
+                hit_rate=round(self.hit_rate, 3))
+        return text
+
+    def put(self, key: str, text: str):
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Write the result to a temporary file first so that other processes
+        # never see a partial one
+        with NamedTemporaryFile(
+                "wb", dir=path.parent, delete=False) as fp:
+            fp.write(make_secret_box(key).encrypt(text.encode()))
+        os.replace(fp.name, path)
+
+        size = path.stat().st_size
+        if (self._since_eviction is None
+                or self._since_eviction + size > self._max_size // 10):
+            self.evict()
+        else:
+            self._since_eviction += size
+
+    def evict(self):
+        """Deletes the least recently used results from this cache until it's
+        comfortably smaller than its maximum size."""
+        self._since_eviction = 0
+        entries = []
+        total = 0
+        for path in self._directory.glob("??/*"):
+            if not _RESULT_NAME.fullmatch(path.name):
+                continue
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+            total += stat.st_size
+        if total <= self._max_size:
+            return
+
+        target = self._max_size * self._LOW_WATER
+        evicted = 0
+        for _, size, path in sorted(entries):
+            if total <= target:
+                break
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                # Another process got here first
+                pass
+            total -= size
+            evicted += 1
+        logger.info(
+                "OCR cache evicted old results",
+                count=evicted, size=total, hit_rate=round(self.hit_rate, 3))
+
+
+_caches = {}
+
+
+def get_ocr_cache() -> Optional[OCRCache]:
+    """Returns the OCRCache configured for this system, or None if OCR
+    results should not be cached. (Results can't be encrypted without the
+    engine's secret value, so they're never cached if that isn't set.)"""
+    directory = settings.conversions["ocr_cache"]["directory"]
+    if not directory or not settings.secret_value:
+        return None
+    if directory not in _caches:
+        _caches[directory] = OCRCache(
+                directory, settings.conversions["ocr_cache"]["max_size"])
+    return _caches[directory]
+
+
+__all__ = (
+        "OCRCache",
+        "get_ocr_cache",
+)
@@ -2,4 +2,5 @@ from .errors import UnknownSchemeError, DeserialisationError  # noqa
 from .source import Source  # noqa
 from .handle import Handle  # noqa
 from .resource import Resource, FileResource  # noqa
-from .utilities import takes_named_arg, SourceManager  # noqa
+from .utilities import (  # noqa
+        takes_named_arg, SourceManager, LastModifiedCutoff, Removed)
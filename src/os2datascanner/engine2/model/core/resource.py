@@ -7,6 +7,7 @@ from contextlib import contextmanager
 
 from os2datascanner.utils.system_utilities import time_now
 from ...utilities.datetime import unparse_datetime
+from ...utilities.metrics import instrument_resource_method
 from ..utilities.temp_resource import NamedTemporaryResource
 
 
@@ -186,3 +187,10 @@ class FileResource(TimestampedResource):
                     f"instantiable class {subclass.__name__} must implement"
                     " at least one of FileResource.make_path or"
                     " FileResource.make_stream")
+
+        # Record how long reading from this kind of resource takes (if the
+        # pipeline is exporting metrics)
+        for name in ("make_path", "make_stream",):
+            if name in vars(subclass):
+                setattr(subclass, name, instrument_resource_method(
+                        vars(subclass)[name]))
@@ -60,7 +60,8 @@ class Source(TypePropertyEquality, JSONSerialisable):
     @abstractmethod
     def handles(
             self, sm: "SourceManager", *,
-            rule=None) -> Iterator["mhandle.Handle"]:
+            rule=None, cutoff=None, scan_tag=None
+            ) -> Iterator["mhandle.Handle"]:
         """Yields Handles corresponding to every identifiable leaf node in this
         Source's hierarchy. These Handles are generated in an undefined order.
 
@@ -75,6 +76,20 @@ class Source(TypePropertyEquality, JSONSerialisable):
             timestamp of that rule could be used as a pre-filter when selecting
             Handles to yield.
 
+            cutoff: LastModifiedCutoff | None
+            A LastModifiedCutoff computed from the Rule for which this Source
+            is being scanned. Sources that can cheaply find out when an object
+            was last modified during exploration should use it to avoid
+            yielding Handles that the Rule would reject anyway; the cutoff
+            keeps count of how many objects were skipped in this way.
+
+            scan_tag: ScanTagFragment | None
+            The tag of the scan for which this Source is being explored.
+            Sources that can explore incrementally, by remembering what they
+            found last time, must keep that memory separate for each scanner,
+            and may yield Removed objects for things that have disappeared
+            since then.
+
         Note that this method can yield Handles that correspond to
         identifiable *but non-existent* leaf nodes. These might correspond to,
         for example, a broken link on a web page, or to an object that was
@@ -1,7 +1,10 @@
 from typing import Callable
+from datetime import datetime
 import inspect
 import structlog
 
+from ...utilities.datetime import make_datetime_aware
+
 logger = structlog.get_logger("engine2")
 
 
@@ -16,6 +19,52 @@ def takes_named_arg(func: Callable, argname: str) -> bool:
                     for p in sig.parameters.values()))
 
 
+class LastModifiedCutoff:
+    """A LastModifiedCutoff lets a Source skip, during exploration, objects
+    that a scan's LastModifiedRule would reject anyway, and keeps count of how
+    many objects it skipped in this way.
+
+    A LastModifiedCutoff without a timestamp excludes nothing."""
+
+    def __init__(self, after: datetime | None = None):
+        self.after = make_datetime_aware(after)
+        self.skipped = 0
+
+    @classmethod
+    def from_rule(cls, rule) -> "LastModifiedCutoff":
+        # Avoid a circular import (the rule engine depends on the model)
+        from ...rules.utilities.analysis import compute_last_modified_cutoff
+        return cls(compute_last_modified_cutoff(rule))
+
+    def __bool__(self):
+        return self.after is not None
+
+    def excludes(self, timestamp: datetime | None) -> bool:
+        """Returns True, and counts the object as skipped, if an object last
+        modified at the given time could not be modified after this cutoff.
+        (Naive timestamps are interpreted as UTC, as they are everywhere else
+        in the engine.)"""
+        if self.after is None or timestamp is None:
+            return False
+        elif make_datetime_aware(timestamp) <= self.after:
+            self.skipped += 1
+            return True
+        else:
+            return False
+
+
+class Removed:
+    """Sources that can explore incrementally yield a Removed object, in place
+    of a Handle, for each object that the previous exploration found but that
+    has since been deleted (or moved somewhere else)."""
+
+    def __init__(self, handle):
+        self.handle = handle
+
+    def __repr__(self):
+        return f"Removed({self.handle!r})"
+
+
 class _SourceDescriptor:
     def __init__(self, *, source, parent=None):
         self.source = source
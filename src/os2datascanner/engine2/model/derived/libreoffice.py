@@ -1,9 +1,15 @@
+import os
+import time
+import queue
+import signal
 import structlog
 import magic
+import threading
+import multiprocessing.util
 from os import unlink, listdir, scandir
 from tempfile import TemporaryDirectory
-from contextlib import closing
-from subprocess import DEVNULL
+from contextlib import closing, contextmanager
+from subprocess import DEVNULL, Popen, CalledProcessError, TimeoutExpired
 
 from ....utils.system_utilities import run_custom
 from ... import settings as engine2_settings
@@ -34,18 +40,166 @@ src/engine2/conversions folder
 """
 
 
-def libreoffice(*args):
-    """Invokes LibreOffice with a fresh settings directory (which will be
-    deleted as soon as the program finishes) and returns a CompletedProcess
-    with both stdout and stderr captured."""
-    with TemporaryDirectory() as tmpdir:
-        return run_custom(
+def _invoke(profile, *args):
+    return run_custom(
+            ["libreoffice",
+             "-env:UserInstallation=file://{0}".format(profile),
+             *args],
+            stdout=DEVNULL, stderr=DEVNULL, check=True,
+            timeout=engine2_settings.subprocess["timeout"],
+            kill_group=True, isolate_tmp=True,)
+
+
+class LibreOfficeServer:
+    """A LibreOfficeServer is a long-running headless LibreOffice process with
+    its own settings directory.
+
+    Invoking LibreOffice with the settings directory of a running instance
+    doesn't start a new office: the new process just passes its command line
+    over to the running one and waits for it to be processed. That skips both
+    the startup of the office itself and the (even slower) initialisation of a
+    fresh settings directory.
+
+    Note that the conversion itself happens in the server process, so the
+    isolate_tmp flag given to each invocation no longer keeps conversions'
+    temporary files apart. The server instead gets a temporary directory of
+    its own, which is shared by all of its conversions and deleted when it's
+    stopped (and so, at the latest, when it's recycled)."""
+
+    def __init__(self):
+        self._profile = None
+        self._tmpdir = None
+        self._process = None
+        self.conversions = 0
+
+    @property
+    def alive(self) -> bool:
+        return self._process is not None and self._process.poll() is None
+
+    def start(self):
+        self._profile = TemporaryDirectory()
+        self._tmpdir = TemporaryDirectory()
+        self._process = Popen(
                 ["libreoffice",
-                 "-env:UserInstallation=file://{0}".format(tmpdir),
-                 *args],
-                stdout=DEVNULL, stderr=DEVNULL, check=True,
-                timeout=engine2_settings.subprocess["timeout"],
-                kill_group=True, isolate_tmp=True,)
+                 "-env:UserInstallation=file://{0}".format(
+                         self._profile.name),
+                 "--headless", "--invisible", "--nologo", "--norestore"],
+                stdout=DEVNULL, stderr=DEVNULL, start_new_session=True,
+                env=os.environ | dict(
+                        TMP=self._tmpdir.name, TMPDIR=self._tmpdir.name,
+                        TEMP=self._tmpdir.name))
+        self.conversions = 0
+
+        # LibreOffice sets up the single-instance pipe that other invocations
+        # will talk to before it locks its settings directory, so wait for
+        # the lock
+        lock = os.path.join(self._profile.name, ".lock")
+        deadline = time.monotonic() + engine2_settings.subprocess["timeout"]
+        while not os.path.exists(lock):
+            if not self.alive or time.monotonic() > deadline:
+                self.stop()
+                raise TimeoutExpired("libreoffice",
+                                     engine2_settings.subprocess["timeout"])
+            time.sleep(0.1)
+        logger.debug("started LibreOffice server", pid=self._process.pid)
+
+    def stop(self):
+        if self._process is not None:
+            if self.alive:
+                logger.debug(
+                        "stopping LibreOffice server",
+                        pid=self._process.pid, conversions=self.conversions)
+                try:
+                    os.killpg(self._process.pid, signal.SIGKILL)
+                except ProcessLookupError:
+                    pass
+            self._process.wait()
+            self._process = None
+        for directory in (self._profile, self._tmpdir,):
+            if directory is not None:
+                directory.cleanup()
+        self._profile = self._tmpdir = None
+
+    def run(self, *args):
+        """Has this server process a LibreOffice command line, starting it
+        first if necessary. If the command fails or times out, the server is
+        stopped, and will be started again the next time it's used."""
+        if not self.alive:
+            self.stop()
+            self.start()
+        try:
+            return _invoke(self._profile.name, *args)
+        except (CalledProcessError, TimeoutExpired):
+            self.stop()
+            raise
+        finally:
+            self.conversions += 1
+
+
+class LibreOfficePool:
+    """A LibreOfficePool is a set of LibreOfficeServers belonging to this
+    process. Servers are started on demand, and are recycled once they've
+    performed the configured number of conversions."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pid = None
+        self._servers = []
+        self._idle = None
+
+    def _get_idle(self):
+        with self._lock:
+            # A forked child shouldn't touch its parent's servers
+            if self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._servers = [
+                        LibreOfficeServer() for _ in range(
+                                _server_settings()["instances"])]
+                self._idle = queue.Queue()
+                for server in self._servers:
+                    self._idle.put(server)
+                multiprocessing.util.Finalize(
+                        self, self.shutdown, exitpriority=0)
+            return self._idle
+
+    @contextmanager
+    def server(self):
+        idle = self._get_idle()
+        server = idle.get()
+        try:
+            if server.conversions >= _server_settings()["max_conversions"]:
+                server.stop()
+            yield server
+        finally:
+            idle.put(server)
+
+    def shutdown(self):
+        if self._pid == os.getpid():
+            for server in self._servers:
+                server.stop()
+
+
+def _server_settings():
+    return engine2_settings.model["libreoffice"]["server"]
+
+
+_pool = LibreOfficePool()
+
+
+def libreoffice(*args):
+    """Invokes LibreOffice and returns a CompletedProcess with both stdout and
+    stderr captured.
+
+    If the "model.libreoffice.server" preference is enabled, the command line
+    is handed to a long-running LibreOffice server; otherwise, LibreOffice is
+    started with a fresh settings directory (which will be deleted as soon as
+    the program finishes)."""
+    if _server_settings()["enabled"]:
+        with _pool.server() as server:
+            return server.run(*args)
+    else:
+        with TemporaryDirectory() as tmpdir:
+            return _invoke(tmpdir, *args)
 
 
 # The fallback CSV filter, used when HTML representations of spreadsheets are
@@ -1,3 +1,6 @@
+import os
+import re
+import shutil
 from os import listdir
 import pypdf
 import string
@@ -27,6 +30,160 @@ def _open_pdf_wrapped(obj):
     return reader
 
 
+_IMAGE_NAME = re.compile(r"^image-(?P<page>\d+)-(?P<num>\d+)\.(?P<ext>\w+)$")
+
+
+class PDFDocument:
+    """A PDFDocument is the state of an open PDFSource: a local copy of the
+    document, a pypdf reader for it (opened on demand), and the text and
+    images of its pages (extracted on demand).
+
+    If the document's pages are being enumerated in this process, then all of
+    them will be wanted while this state exists, so they're extracted all at
+    once the first time one of them is asked for. Otherwise -- when a page
+    has been handed to this process in a message of its own, for example --
+    the state won't outlive that page, so only that page is extracted."""
+
+    def __init__(self, path, outputdir, configuration):
+        self.path = path
+        self._outputdir = outputdir
+        self._configuration = configuration
+        self._reader = None
+        self._expanding = False
+        self._extracted = False
+        self._pages = set()
+
+    @property
+    def reader(self) -> pypdf.PdfReader:
+        if self._reader is None:
+            self._reader = _open_pdf_wrapped(self.path)
+        return self._reader
+
+    @property
+    def page_count(self) -> int:
+        return len(self.reader.pages) if self.reader else 0
+
+    def expand(self):
+        """Indicates that all of the pages of this document are about to be
+        processed, and so should be extracted all at once."""
+        self._expanding = True
+
+    def _run(self, args, *, whole_document=False):
+        subprocess = engine2_settings.subprocess
+        timeout = subprocess["timeout"]
+        if whole_document:
+            # The whole document gets the same time budget as running the
+            # tool once for every page would have done, up to a limit
+            timeout = min(timeout * max(self.page_count, 1),
+                          subprocess["document_timeout"])
+        run_custom(args, timeout=timeout, check=True, isolate_tmp=True)
+
+    def _extract_page(self, page: int):
+        """Runs pdftotext and pdfimages over a single page of the document.
+        If that fails, the page's directory is removed, so that it can be
+        tried again."""
+        directory = self.page_directory(page, extract=False)
+        try:
+            os.makedirs(directory, exist_ok=True)
+            self._run([
+                    "pdftotext", "-q", "-nopgbrk", "-eol", "unix",
+                    "-f", str(page), "-l", str(page), self.path,
+                    os.path.join(directory, "page.txt")])
+            if not should_skip_images(self._configuration):
+                self._run([
+                        "pdfimages", "-q", "-png", "-j",
+                        "-f", str(page), "-l", str(page), self.path,
+                        os.path.join(directory, "image")])
+        except BaseException:
+            shutil.rmtree(directory, ignore_errors=True)
+            raise
+
+        TinyImageFilter.apply(MD5DeduplicationFilter.apply(directory))
+        self._pages.add(page)
+
+    def _extract(self):
+        """Runs pdftotext and pdfimages over the whole document, and then
+        sorts their output into one directory for each page. If that fails,
+        everything produced so far is removed, so that it can be tried
+        again."""
+        pages = range(1, self.page_count + 1)
+        try:
+            for page in pages:
+                os.makedirs(
+                        self.page_directory(page, extract=False),
+                        exist_ok=True)
+            self._extract_text(pages)
+            if not should_skip_images(self._configuration):
+                self._extract_images(pages)
+        except BaseException:
+            self._clear()
+            raise
+
+        for page in pages:
+            TinyImageFilter.apply(MD5DeduplicationFilter.apply(
+                    self.page_directory(page, extract=False)))
+        self._extracted = True
+
+    def _clear(self):
+        self._pages.clear()
+        for name in listdir(self._outputdir):
+            path = os.path.join(self._outputdir, name)
+            if os.path.isdir(path):
+                shutil.rmtree(path, ignore_errors=True)
+            else:
+                os.unlink(path)
+
+    def _extract_text(self, pages):
+        # Run pdftotext and pdfimages separately instead of running
+        # pdftohtml. Not having to parse HTML is a big performance win by
+        # itself, but what's even better is that pdfimages doesn't produce
+        # uncountably many texture images for embedded vector graphics
+        text_path = os.path.join(self._outputdir, "document.txt")
+        self._run(["pdftotext", "-q", "-eol", "unix", self.path, text_path],
+                  whole_document=True)
+        with open(text_path, "rt") as fp:
+            # pdftotext ends every page with a form feed
+            for page, text in zip(pages, fp.read().split("\f")):
+                with open(os.path.join(
+                        self.page_directory(page, extract=False),
+                        "page.txt"), "wt") as out:
+                    out.write(text)
+        os.unlink(text_path)
+
+    def _extract_images(self, pages):
+        image_dir = os.path.join(self._outputdir, "images")
+        os.makedirs(image_dir, exist_ok=True)
+        self._run([
+                "pdfimages", "-q", "-png", "-j", "-p",
+                self.path, os.path.join(image_dir, "image")],
+                whole_document=True)
+
+        # pdfimages numbers images across the whole document, but the
+        # handles we produce have always been numbered per page
+        by_page = {}
+        for name in listdir(image_dir):
+            if (m := _IMAGE_NAME.match(name)) and int(m.group("page")) in pages:
+                by_page.setdefault(int(m.group("page")), []).append(
+                        (int(m.group("num")), m.group("ext"), name))
+        for page, images in by_page.items():
+            target = self.page_directory(page, extract=False)
+            for idx, (_, ext, name) in enumerate(sorted(images)):
+                shutil.move(
+                        os.path.join(image_dir, name),
+                        os.path.join(target, f"image-{idx:03d}.{ext}"))
+        shutil.rmtree(image_dir)
+
+    def page_directory(self, page: int, *, extract=True) -> str:
+        """Returns the path to the directory containing the text and images
+        of the given page, extracting them from the document if necessary."""
+        if extract and not self._extracted:
+            if self._expanding:
+                self._extract()
+            elif page not in self._pages:
+                self._extract_page(page)
+        return os.path.join(self._outputdir, str(page))
+
+
 @Source.mime_handler("application/pdf")
 class PDFSource(DerivedSource):
     type_label = "pdf"
@@ -34,34 +191,38 @@ class PDFSource(DerivedSource):
     def _generate_state(self, sm):
         with self.handle.follow(sm).make_path() as path:
             # Explicitly download the file here for the sake of PDFPageSource,
-            # which needs a local filesystem path to pass to pdftohtml
+            # which needs a local filesystem path to pass to pdftotext
             if engine2_settings.ghostscript["enabled"]:
-                yield from gs_convert(path)
+                for converted_path in gs_convert(path):
+                    yield from self._open_document(converted_path, sm)
             else:
-                yield path
+                yield from self._open_document(path, sm)
+
+    @staticmethod
+    def _open_document(path, sm):
+        with TemporaryDirectory() as outputdir:
+            yield PDFDocument(path, outputdir, sm.configuration)
 
     def handles(self, sm):
-        reader = _open_pdf_wrapped(sm.open(self))
-        for i in range(1, len(reader.pages) + 1 if reader else 0):
+        document = sm.open(self)
+        document.expand()
+        for i in range(1, document.page_count + 1):
             yield PDFPageHandle(self, str(i))
 
 
 class PDFPageResource(Resource):
     def _generate_metadata(self):
-        with self.handle.source.handle.follow(self._sm).make_stream() as fp:
-            reader = _open_pdf_wrapped(fp)
-            # Some PDF authoring tools helpfully stick null bytes into the
-            # author field. Make sure we remove these
-            author = reader.metadata.get("/Author", "").strip(WHITESPACE_PLUS)
+        reader = self._sm.open(self.handle.source).reader
+        # Some PDF authoring tools helpfully stick null bytes into the
+        # author field. Make sure we remove these
+        author = reader.metadata.get("/Author", "").strip(WHITESPACE_PLUS)
 
         if author:
             yield "pdf-author", str(author)
 
     def check(self) -> bool:
         page = int(self.handle.relative_path)
-        with self.handle.source._make_stream(self._sm) as fp:
-            reader = _open_pdf_wrapped(fp)
-            return page in range(1, len(reader.pages) + 1 if reader else 0)
+        return page in range(1, self._sm.open(self.handle.source).page_count + 1)
 
     def compute_type(self):
         return PAGE_TYPE
@@ -104,34 +265,11 @@ class PDFPageSource(DerivedSource):
     def _generate_state(self, sm):
         # As we produce FilesystemResources, we need to produce a cookie of the
         # same format as FilesystemSource: a filesystem directory in which to
-        # interpret relative paths
-        page = self.handle.relative_path
-        path = sm.open(self.handle.source)
-        with TemporaryDirectory() as outputdir:
-            # Run pdftotext and pdfimages separately instead of running
-            # pdftohtml. Not having to parse HTML is a big performance win by
-            # itself, but what's even better is that pdfimages doesn't produce
-            # uncountably many texture images for embedded vector graphics
-            run_custom(
-                    [
-                            "pdftotext", "-q", "-nopgbrk", "-eol", "unix",
-                            "-f", page, "-l", page, path,
-                            "{0}/page.txt".format(outputdir)
-                    ],
-                    timeout=engine2_settings.subprocess["timeout"],
-                    check=True, isolate_tmp=True)
-
-            if not should_skip_images(sm.configuration):
-                run_custom(
-                    [
-                            "pdfimages", "-q", "-png", "-j", "-f", page, "-l", page,
-                            path, "{0}/image".format(outputdir)
-                    ],
-                    timeout=engine2_settings.subprocess["timeout"],
-                    check=True, isolate_tmp=True)
-
-            yield TinyImageFilter.apply(
-                    MD5DeduplicationFilter.apply(outputdir))
+        # interpret relative paths. The directory belongs to the PDFSource,
+        # which might extract every page in one go the first time it's asked
+        # for one of them
+        document = sm.open(self.handle.source)
+        yield document.page_directory(int(self.handle.relative_path))
 
     def handles(self, sm):
         for p in listdir(sm.open(self)):
@@ -1,10 +1,10 @@
 import structlog
 import magic
-import pandas as pd
 
 from ..core import Handle, Source, Resource
 from .derived import DerivedSource
 from .utilities import office_metadata
+from .utilities.workbook import open_workbook
 
 
 logger = structlog.get_logger("engine2")
@@ -29,7 +29,11 @@ class SpreadsheetSource(DerivedSource):
 
     def _generate_state(self, sm):
         with self.handle.follow(sm).make_path() as path:
-            yield pd.ExcelFile(path)
+            workbook = open_workbook(path)
+            try:
+                yield workbook
+            finally:
+                workbook.close()
 
     def handles(self, sm):
         for sheet_name in sm.open(self).sheet_names:
@@ -57,9 +61,7 @@ class SpreadsheetSheetResource(Resource):
 
     def check(self) -> bool:
         sheet_name = str(self.handle.relative_path)
-        with self._sm.open(self.handle.source) as path:
-            sheet_names = pd.ExcelFile(path).sheet_names
-            return sheet_name in sheet_names
+        return sheet_name in self._sm.open(self.handle.source).sheet_names
 
     def compute_type(self):
         return SHEET_TYPE
@@ -0,0 +1,233 @@
+"""Streaming readers for the sheets of spreadsheet files."""
+
+from abc import ABC, abstractmethod
+from typing import Any, Iterator, Optional
+from zipfile import ZipFile, is_zipfile
+from datetime import datetime
+from itertools import repeat
+import xlrd
+import openpyxl
+from defusedxml.ElementTree import iterparse
+
+
+class Workbook(ABC):
+    """A Workbook is an open spreadsheet file. The rows of each of its sheets
+    can be read one at a time, so that even very large sheets never need to be
+    held in memory all at once."""
+
+    @property
+    @abstractmethod
+    def sheet_names(self) -> list[str]:
+        """The names of the sheets of this Workbook, in order."""
+
+    @abstractmethod
+    def iter_rows(self, sheet_name: str) -> Iterator[tuple[Any, ...]]:
+        """Yields the rows of the named sheet as tuples of cell values. Empty
+        cells are represented by None; empty rows may be skipped."""
+
+    @abstractmethod
+    def close(self):
+        """Releases the resources held by this Workbook."""
+
+
+class OOXMLWorkbook(Workbook):
+    """An OOXMLWorkbook reads an Office Open XML spreadsheet (.xlsx) with
+    openpyxl's read-only mode, which parses each sheet as a stream."""
+
+    def __init__(self, path):
+        self._book = openpyxl.load_workbook(
+                path, read_only=True, data_only=True)
+
+    @property
+    def sheet_names(self):
+        # (Chartsheets are also listed in Workbook.sheetnames, but they don't
+        # have any cells to read)
+        return [ws.title for ws in self._book.worksheets]
+
+    def iter_rows(self, sheet_name):
+        sheet = self._book[sheet_name]
+        # The dimensions recorded in the file are sometimes wrong, and we
+        # don't need them anyway
+        sheet.reset_dimensions()
+        yield from sheet.iter_rows(min_row=1, values_only=True)
+
+    def close(self):
+        self._book.close()
+
+
+_OFFICE = "{urn:oasis:names:tc:opendocument:xmlns:office:1.0}"
+_TABLE = "{urn:oasis:names:tc:opendocument:xmlns:table:1.0}"
+_TEXT = "{urn:oasis:names:tc:opendocument:xmlns:text:1.0}"
+
+_ODF_CELLS = (f"{_TABLE}table-cell", f"{_TABLE}covered-table-cell",)
+
+
+def _odf_cell_value(cell) -> Optional[Any]:
+    match cell.get(f"{_OFFICE}value-type"):
+        case None:
+            return None
+        case "float" | "percentage" | "currency":
+            try:
+                value = float(cell.get(f"{_OFFICE}value"))
+                return int(value) if value.is_integer() else value
+            except (TypeError, ValueError, OverflowError):
+                pass
+        case "boolean":
+            # (Some producers, including pandas, incorrectly put the value of
+            # a boolean cell in the office:value attribute)
+            return (cell.get(f"{_OFFICE}boolean-value")
+                    or cell.get(f"{_OFFICE}value")) == "true"
+        case "date":
+            try:
+                return datetime.fromisoformat(cell.get(f"{_OFFICE}date-value"))
+            except (TypeError, ValueError):
+                pass
+    # Anything else (including values that Python can't parse) is best
+    # represented by the text of the cell's paragraphs
+    return "\n".join(
+            "".join(p.itertext()) for p in cell.findall(f"{_TEXT}p"))
+
+
+def _odf_repeats(elem, attribute) -> int:
+    return int(elem.get(f"{_TABLE}{attribute}", 1))
+
+
+def _odf_row_values(row) -> list[Optional[Any]]:
+    """Returns the values of the cells of an OpenDocument table row, with
+    repeated cells expanded."""
+    values = []
+    for cell in row:
+        if cell.tag not in _ODF_CELLS:
+            continue
+        value = _odf_cell_value(cell)
+        if value is None or value == "":
+            # Runs of empty cells are often repeated thousands of times to pad
+            # a row out to the edge of the sheet; don't bother expanding them
+            values.append(None)
+        else:
+            values.extend(
+                    [value] * _odf_repeats(cell, "number-columns-repeated"))
+    return values
+
+
+class OpenDocumentWorkbook(Workbook):
+    """An OpenDocumentWorkbook reads an OpenDocument spreadsheet (.ods) by
+    parsing its content.xml as a stream. (odfpy, which pandas uses, builds a
+    tree of Python objects for the whole document first, which is both very
+    slow and very memory-hungry.)"""
+
+    def __init__(self, path):
+        self._zip = ZipFile(path)
+        self._sheet_names = None
+
+    def _walk(self):
+        """Yields a (sheet name, None) pair at the start of every sheet, and a
+        (sheet name, row element) pair for each of its rows. Rows are removed
+        from the document tree once they've been consumed, so that the tree
+        doesn't grow with the size of the sheet."""
+        stack = []
+        sheet_name = None
+        depth = 0
+        with self._zip.open("content.xml") as fp:
+            for event, elem in iterparse(fp, events=("start", "end",)):
+                if event == "start":
+                    if elem.tag == f"{_TABLE}table":
+                        # (Tables can also appear inside cells; only the
+                        # outermost ones are sheets)
+                        if not depth:
+                            sheet_name = elem.get(f"{_TABLE}name")
+                            yield sheet_name, None
+                        depth += 1
+                    stack.append(elem)
+                    continue
+
+                stack.pop()
+                if elem.tag == f"{_TABLE}table":
+                    depth -= 1
+                elif elem.tag == f"{_TABLE}table-row" and depth == 1:
+                    yield sheet_name, elem
+                    stack[-1].remove(elem)
+
+    @property
+    def sheet_names(self):
+        if self._sheet_names is None:
+            self._sheet_names = [
+                    name for name, row in self._walk() if row is None]
+        return self._sheet_names
+
+    def _sheet_rows(self, sheet_name):
+        """Yields the row elements of the named sheet."""
+        found = False
+        for name, elem in self._walk():
+            if elem is not None:
+                if found:
+                    yield elem
+            elif found:
+                break
+            else:
+                found = name == sheet_name
+
+    def iter_rows(self, sheet_name):
+        for elem in self._sheet_rows(sheet_name):
+            row = tuple(_odf_row_values(elem))
+            if any(v is not None for v in row):
+                yield from repeat(
+                        row, _odf_repeats(elem, "number-rows-repeated"))
+
+    def close(self):
+        self._zip.close()
+
+
+class XLSWorkbook(Workbook):
+    """An XLSWorkbook reads a legacy Excel spreadsheet (.xls) with xlrd,
+    loading only one sheet at a time."""
+
+    def __init__(self, path):
+        self._book = xlrd.open_workbook(path, on_demand=True)
+
+    @property
+    def sheet_names(self):
+        return self._book.sheet_names()
+
+    def _cell_value(self, cell):
+        match cell.ctype:
+            case xlrd.XL_CELL_EMPTY | xlrd.XL_CELL_BLANK | xlrd.XL_CELL_ERROR:
+                return None
+            case xlrd.XL_CELL_NUMBER:
+                value = cell.value
+                return int(value) if value.is_integer() else value
+            case xlrd.XL_CELL_DATE:
+                try:
+                    return xlrd.xldate.xldate_as_datetime(
+                            cell.value, self._book.datemode)
+                except xlrd.xldate.XLDateError:
+                    return cell.value
+            case xlrd.XL_CELL_BOOLEAN:
+                return bool(cell.value)
+            case _:
+                return cell.value
+
+    def iter_rows(self, sheet_name):
+        sheet = self._book.sheet_by_name(sheet_name)
+        try:
+            for rx in range(sheet.nrows):
+                yield tuple(self._cell_value(c) for c in sheet.row(rx))
+        finally:
+            self._book.unload_sheet(sheet_name)
+
+    def close(self):
+        self._book.release_resources()
+
+
+def open_workbook(path) -> Workbook:
+    """Opens the spreadsheet file at the given path with the most appropriate
+    Workbook implementation."""
+    if is_zipfile(path):
+        with ZipFile(path) as zf:
+            is_opendocument = "content.xml" in zf.namelist()
+        if is_opendocument:
+            return OpenDocumentWorkbook(path)
+        else:
+            return OOXMLWorkbook(path)
+    else:
+        return XLSWorkbook(path)
@@ -5,7 +5,7 @@ import dropbox
 from dropbox.files import GetMetadataError
 from dropbox.dropbox import create_session
 from dropbox.exceptions import ApiError
-from .core import Source, Handle, FileResource
+from .core import Source, Handle, FileResource, LastModifiedCutoff
 
 
 class DropboxSource(Source):
@@ -30,8 +30,9 @@ class DropboxSource(Source):
     def censor(self):
         return DropboxSource(self.token)
 
-    def handles(self, sm):
+    def handles(self, sm, *, cutoff: LastModifiedCutoff | None = None):
         dbx = sm.open(self)
+        cutoff = cutoff or LastModifiedCutoff()
         user_account = dbx.users_get_current_account()
 
         has_more = True
@@ -49,6 +50,8 @@ class DropboxSource(Source):
             cursor = result.cursor
             for entry in result.entries:
                 if isinstance(entry, dropbox.files.FileMetadata):
+                    if cutoff and cutoff.excludes(entry.server_modified):
+                        continue
                     yield DropboxHandle(self, entry.path_lower,
                                         user_account.email)
 
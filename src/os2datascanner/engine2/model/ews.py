@@ -10,12 +10,24 @@ from exchangelib.errors import (
 from exchangelib.protocol import BaseProtocol
 
 from ..utilities.backoff import DefaultRetrier
-from .core import Source, Handle, FileResource
+from .core import Source, Handle, FileResource, LastModifiedCutoff
 
 
 BaseProtocol.SESSION_POOLSIZE = 1
 
 
+_TIMESTAMP_FIELDS = ("datetime_created", "datetime_received", "datetime_sent")
+
+
+def _last_modified(message: Message):
+    """Returns the most recent of the timestamps associated with an Exchange
+    message, or None if it has none at all."""
+    return max(
+            (ts for ts in (getattr(message, f, None) for f in _TIMESTAMP_FIELDS)
+             if ts is not None),
+            default=None)
+
+
 # An "entry ID" is the special identifier used to open something in the Outlook
 # rich client (after converting it to a hexadecimal string). This property can
 # be retrieved over the EWS protocol, but exchangelib doesn't do so by default;
@@ -184,12 +196,20 @@ class EWSAccountSource(Source):
                 mail for mail in queryset
                 if isinstance(mail, Message) and hasattr(mail, "entry_id"))
 
-    def handles(self, sm) -> Iterator['EWSMailHandle']:
+    def handles(
+            self, sm, *, cutoff: LastModifiedCutoff | None = None
+            ) -> Iterator['EWSMailHandle']:
         account = sm.open(self)
+        cutoff = cutoff or LastModifiedCutoff()
+        fields = ("id", "subject")
+        if cutoff:
+            fields += _TIMESTAMP_FIELDS
 
         def relevant_mails(relevant_folders):
             for folder in relevant_folders:
-                for mail in self._relevant_mails(folder, "id", "subject"):
+                for mail in self._relevant_mails(folder, *fields):
+                    if cutoff and cutoff.excludes(_last_modified(mail)):
+                        continue
                     yield EWSMailHandle(
                         self,
                         "{0}.{1}".format(folder.id, mail.id),
@@ -300,11 +320,7 @@ class EWSMailResource(FileResource):
         return self.get_message_object().size
 
     def get_last_modified(self):
-        o = self.get_message_object()
-        oldest_stamp = max(filter(
-                lambda ts: ts is not None,
-                [o.datetime_created, o.datetime_received, o.datetime_sent]))
-        return oldest_stamp
+        return _last_modified(self.get_message_object())
 
     def compute_type(self):
         return "message/rfc822"
@@ -1,4 +1,4 @@
-from .core import Source, Handle, FileResource
+from .core import Source, Handle, FileResource, LastModifiedCutoff
 import os.path
 from pathlib import Path
 from datetime import datetime
@@ -10,8 +10,6 @@ from ..rules.rule import Rule
 from ..conversions.types import OutputType
 from ..conversions.utilities.navigable import make_values_navigable
 
-from os2datascanner.engine2.rules.utilities.analysis import compute_mss
-
 
 class FilesystemSource(Source):
     type_label = "file"
@@ -25,7 +23,8 @@ class FilesystemSource(Source):
     def path(self):
         return self._path
 
-    def _process_file(self, f: Path, base_path: Path, cutoff: datetime | None):
+    def _process_file(
+            self, f: Path, base_path: Path, cutoff: LastModifiedCutoff):
         if f.is_file():
             if cutoff:
                 # Note that this is *not* a good implementation of rule
@@ -34,19 +33,16 @@ class FilesystemSource(Source):
                 # satisfy the test suite, though
                 stat = f.stat()
                 mod_ts = datetime.fromtimestamp(stat.st_mtime, gettz())
-                if mod_ts < cutoff:
+                if cutoff.excludes(mod_ts):
                     return
 
             yield FilesystemHandle(self, str(f.relative_to(base_path)))
 
-    def handles(self, sm, *, rule: Rule | None = None):
-        cutoff = None
-        for essential_rule in compute_mss(rule):
-            # (we can't do isinstance() here without making a circular
-            # dependency)
-            if essential_rule.type_label == "last-modified":
-                after = essential_rule.after
-                cutoff = (after if not cutoff else max(cutoff, after))
+    def handles(
+            self, sm, *, rule: Rule | None = None,
+            cutoff: LastModifiedCutoff | None = None):
+        if cutoff is None:
+            cutoff = LastModifiedCutoff.from_rule(rule)
 
         base_path = Path(self.path)
         for d in base_path.glob("**"):
@@ -5,7 +5,8 @@ from google.oauth2 import service_account
 from googleapiclient.discovery import build
 from googleapiclient.http import MediaIoBaseDownload
 from googleapiclient.errors import HttpError
-from .core import Source, Handle, FileResource
+from dateutil.parser import isoparse
+from .core import Source, Handle, FileResource, LastModifiedCutoff
 
 
 class GoogleDriveSource(Source):
@@ -35,14 +36,19 @@ class GoogleDriveSource(Source):
         service = build(serviceName='drive', version='v3', credentials=credentials)
         yield service
 
-    def handles(self, sm):
+    def handles(self, sm, *, cutoff: LastModifiedCutoff | None = None):
         service = sm.open(self)
+        cutoff = cutoff or LastModifiedCutoff()
         page_token = None
         while True:
             files = service.files().list(q="mimeType !='application/vnd.google-apps.folder'",
-                                         fields='nextPageToken, files(id, name, mimeType)',
+                                         fields='nextPageToken,'
+                                                ' files(id, name, mimeType, modifiedTime)',
                                          pageToken=page_token).execute()
             for file in files.get('files', []):
+                if cutoff and (ts := file.get('modifiedTime')):
+                    if cutoff.excludes(isoparse(ts)):
+                        continue
                 yield GoogleDriveHandle(self, file.get('id'), name=file.get('name'))
             page_token = files.get('nextPageToken', None)
             if page_token is None:
@@ -115,13 +121,17 @@ class GoogleDriveResource(FileResource):
         if not self._metadata:
             self._metadata = self._get_cookie().files().get(
                     fileId=self.handle.relative_path,
-                    fields='name, size, quotaBytesUsed').execute()
+                    fields='name, size, quotaBytesUsed, modifiedTime').execute()
 
         return self._metadata
 
     def get_size(self):
         return self.metadata.get('size', self.metadata.get('quotaBytesUsed'))
 
+    def get_last_modified(self):
+        timestamp = self.metadata.get('modifiedTime')
+        return isoparse(timestamp) if timestamp else super().get_last_modified()
+
 
 class GoogleDriveHandle(Handle):
     type_label = "googledrive"
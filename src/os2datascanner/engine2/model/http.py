@@ -14,12 +14,15 @@ from ..conversions.utilities.navigable import (
         make_navigable, make_values_navigable)
 from .core import Source, Handle, FileResource
 from .utilities.sitemap import process_sitemap_url
+from .utilities.crawl_state import CrawlState
 
 from .utilities import crawler
 
 
 logger = structlog.get_logger("engine2")
 TTL: int = engine2_settings.model["http"]["ttl"]
+TIMEOUT: int = engine2_settings.model["http"]["timeout"]
+CRAWLER: dict = engine2_settings.model["http"]["crawler"]
 _equiv_domains = set({"www", "www2", "m", "ww1", "ww2", "en", "da", "secure"})
 # match whole words (\bWORD1\b | \bWORD2\b) and escape to handle metachars.
 # It is important to match whole words; www.magenta.dk should be .magenta.dk, not
@@ -178,39 +181,48 @@ class WebSource(Source):
 
     def handles(self, sm):  # noqa: CCR001
         session = sm.open(self)
-        wc = crawler.WebCrawler(
-                self._url, session=session, ttl=TTL,
-                allow_element_hints=self._extended_hints)
-        if self._exclude:
-            wc.exclude(*self._exclude)
-
-        wc.add(self._url)
-
-        if self._sitemap:
-            for (address, hints) in process_sitemap_url(self._sitemap):
-                if wc.is_crawlable(address):
-                    wc.add(address, **hints)
-            if not self._always_crawl:
-                wc.freeze()
-
-        for hints, url in wc.visit():
-            referrer = hints.get("referrer")
-            r = WebHandle.make_handle(
-                    referrer, self._url) if referrer else None
-
-            new_hints = {
-                    k: v for k, v in hints.items()
-                    if k in ("last_modified", "content_type", "true_url",
-                             "title", "fresh",)}
-            r = WebHandle.make_handle(
-                    referrer, self._url) if referrer else None
-            h = WebHandle.make_handle(
-                    url, self._url, referrer=r, hints=new_hints or None)
-            # make_handle doesn't copy properties other than the URL into the
-            # new WebSource object, so fix up the references manually
-            if h.source == self:
-                h._source = self
-            yield h
+        state = CrawlState.for_source(self)
+        complete = False
+        try:
+            wc = crawler.WebCrawler(
+                    self._url, session=session, ttl=TTL,
+                    allow_element_hints=self._extended_hints,
+                    workers=CRAWLER["workers"], per_host=CRAWLER["per_host"],
+                    delay=CRAWLER["delay"], timeout=TIMEOUT, state=state)
+            if self._exclude:
+                wc.exclude(*self._exclude)
+
+            wc.add(self._url)
+
+            if self._sitemap:
+                for (address, hints) in process_sitemap_url(self._sitemap):
+                    if wc.is_crawlable(address):
+                        wc.add(address, **hints)
+                if not self._always_crawl:
+                    wc.freeze()
+
+            for hints, url in wc.visit():
+                referrer = hints.get("referrer")
+                r = WebHandle.make_handle(
+                        referrer, self._url) if referrer else None
+
+                new_hints = {
+                        k: v for k, v in hints.items()
+                        if k in ("last_modified", "content_type", "true_url",
+                                 "title", "fresh",)}
+                r = WebHandle.make_handle(
+                        referrer, self._url) if referrer else None
+                h = WebHandle.make_handle(
+                        url, self._url, referrer=r, hints=new_hints or None)
+                # make_handle doesn't copy properties other than the URL into
+                # the new WebSource object, so fix up the references manually
+                if h.source == self:
+                    h._source = self
+                yield h
+            complete = True
+        finally:
+            if state:
+                state.close(complete=complete)
 
     @property
     def url(self):
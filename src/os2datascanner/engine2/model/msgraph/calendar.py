@@ -19,25 +19,13 @@ class MSGraphCalendarSource(MSGraphSource):
         super().__init__(client_id, tenant_id, client_secret)
         self._userlist = userlist
 
-    def handles(self, sm):  # noqa
-        if self._userlist is None:
-            for user in self._list_users(sm):
-                pn = user["userPrincipalName"]
-
-                with warn_on_httperror(f"calendar check for {pn}"):
-                    any_events = sm.open(self).get(
-                        "users/{0}/events?$select=id&$top=1".format(pn)).json()
-                    if not any_events["value"]:
-                        continue
-
+    def handles(self, sm):
+        for pn, response in self._get_for_users(
+                sm, "users/{0}/events?$select=id&$top=1", self._userlist):
+            with warn_on_httperror(f"calendar check for {pn}"):
+                response.raise_for_status()
+                if response.json()["value"]:
                     yield MSGraphCalendarAccountHandle(self, pn)
-        else:
-            for pn in self._userlist:
-                with warn_on_httperror(f"calendar check for {pn}"):
-                    any_events = sm.open(self).get(
-                        "users/{0}/events?$select=id&$top=1".format(pn)).json()
-                    if any_events["value"]:
-                        yield MSGraphCalendarAccountHandle(self, pn)
 
     def to_json_object(self):
         return dict(
@@ -118,17 +106,22 @@ class MSGraphCalendarEventResource(FileResource):
     def __init__(self, handle, sm):
         super().__init__(handle, sm)
         self._event = None
-        self._body = None
 
     def _generate_metadata(self):
         yield "email-account", self.handle.source.handle.relative_path
         yield from super()._generate_metadata()
 
+    def _get_event(self):
+        # Retrieve everything we need in one request instead of making the
+        # server answer separate ones for the body and the metadata
+        if not self._event:
+            self._event = self._get_cookie().get(
+                    self.make_object_path()
+                    + "?$select=lastModifiedDateTime,body").json()
+        return self._event
+
     def _get_body(self):
-        if not self._body:
-            self._body = self._get_cookie().get(
-                    self.make_object_path() + "?$select=body").json()
-        return self._body
+        return self._get_event()
 
     def check(self) -> bool:
         try:
@@ -145,10 +138,7 @@ class MSGraphCalendarEventResource(FileResource):
             self.handle.relative_path)
 
     def get_event_metadata(self):
-        if not self._event:
-            self._event = self._get_cookie().get(
-                self.make_object_path() + "?$select=lastModifiedDateTime").json()
-        return self._event
+        return self._get_event()
 
     @contextmanager
     def make_stream(self):
@@ -0,0 +1,201 @@
+import sqlite3
+import structlog
+from pathlib import Path
+from datetime import datetime
+from typing import Iterable, Iterator, Optional
+from requests import HTTPError
+
+from ... import settings as engine2_settings
+from ...utilities.datetime import make_datetime_aware, parse_datetime
+
+
+logger = structlog.get_logger("engine2")
+
+
+class DeltaState:
+    """A DeltaState is a small SQLite database that remembers, from one
+    exploration of a Microsoft Graph source by a scanner to the next, the
+    @odata.deltaLink for each collection that was explored (a mail folder or a
+    drive, for example), so that the next exploration can ask the server for
+    only what has changed since then.
+
+    Drives are identified by paths rather than by IDs, but the server doesn't
+    report the paths of changed items, so a DeltaState also remembers the
+    layout of each drive.
+
+    Each scanner has its own DeltaState for each source: a delta link only
+    tells us what changed since *some* exploration, and that has to be the
+    previous exploration by the same scanner."""
+
+    def __init__(self, path, scan_time: datetime):
+        self._db = sqlite3.connect(path)
+        self._db.execute(
+                "CREATE TABLE IF NOT EXISTS links ("
+                " scope TEXT PRIMARY KEY, link TEXT NOT NULL,"
+                " scan_time TEXT NOT NULL)")
+        self._db.execute(
+                "CREATE TABLE IF NOT EXISTS items ("
+                " scope TEXT NOT NULL, id TEXT NOT NULL, parent TEXT,"
+                " name TEXT, web_url TEXT, is_file INTEGER NOT NULL,"
+                " last_modified TEXT,"
+                " PRIMARY KEY (scope, id))")
+        self._db.execute(
+                "CREATE INDEX IF NOT EXISTS items_parent"
+                " ON items (scope, parent)")
+        self._scan_time = make_datetime_aware(scan_time)
+
+    @classmethod
+    def for_source(cls, source, scan_tag) -> Optional["DeltaState"]:
+        """Returns the DeltaState for the given Source and the scanner
+        responsible for the given scan, or None if the system has not been
+        configured to keep delta state (or if the scan doesn't come from a
+        scanner)."""
+        directory = engine2_settings.model["msgraph"]["delta"][
+                "state_directory"]
+        if not directory or not scan_tag or not scan_tag.scanner:
+            return None
+        path = Path(directory)
+        path.mkdir(parents=True, exist_ok=True)
+        return cls(
+                path / f"{scan_tag.scanner.pk}-{source.crunch(hash=True)}"
+                       ".sqlite3",
+                scan_tag.time)
+
+    def get_link(self, scope: str, since: Optional[datetime]) -> Optional[str]:
+        """Returns the delta link for the given scope, if it can be used to
+        find everything that has changed since the given time.
+
+        (A delta link recorded by an exploration that started after that time
+        can't be used: the scan it belonged to might never have finished, and
+        the changes it found might not have been examined.)"""
+        if since is None:
+            return None
+        row = self._db.execute(
+                "SELECT link, scan_time FROM links WHERE scope = ?",
+                (scope,)).fetchone()
+        if row and parse_datetime(row[1]) <= make_datetime_aware(since):
+            return row[0]
+        return None
+
+    def put_link(self, scope: str, link: str):
+        self._db.execute(
+                "INSERT OR REPLACE INTO links VALUES (?, ?, ?)",
+                (scope, link, self._scan_time.isoformat()))
+
+    def query(
+            self, gc, scope: str, query: str, since: Optional[datetime]
+            ) -> tuple[bool, Iterator[dict]]:
+        """Starts a delta query for the given scope, returning a flag that
+        indicates whether or not the query is incremental and an iterator over
+        the items that it returns.
+
+        If there's a usable delta link for the scope, the query will return
+        only the items that have changed since it was recorded. Otherwise (or
+        if the server has forgotten about the link), the initial query will be
+        used, and the query will return every item in the scope.
+
+        The new delta link is recorded once the iterator is exhausted, but it
+        isn't saved until DeltaState.commit is called."""
+        headers = {"Prefer": "odata.maxpagesize={0}".format(
+                engine2_settings.model["msgraph"]["page_size"])}
+        result = None
+        if (link := self.get_link(scope, since)):
+            try:
+                result = gc.follow_next_link(link, headers=headers).json()
+            except HTTPError as ex:
+                # The server can expire delta links whenever it likes, and
+                # uses various error codes to say so
+                if ex.response.status_code not in (400, 404, 410,):
+                    raise
+                logger.info(
+                        "DeltaState: delta link was rejected",
+                        scope=scope, status=ex.response.status_code)
+
+        incremental = result is not None
+        if not incremental:
+            result = gc.get(query, headers=headers).json()
+
+        def _items(result):
+            yield from result["value"]
+            while "@odata.nextLink" in result:
+                result = gc.follow_next_link(
+                        result["@odata.nextLink"], headers=headers).json()
+                yield from result["value"]
+            if (link := result.get("@odata.deltaLink")):
+                self.put_link(scope, link)
+        return incremental, _items(result)
+
+    def forget_items(self, scope: str):
+        """Forgets all of the items recorded for the given scope."""
+        self._db.execute("DELETE FROM items WHERE scope = ?", (scope,))
+
+    def put_item(
+            self, scope: str, item_id: str, parent: Optional[str],
+            name: str, web_url: Optional[str], is_file: bool,
+            last_modified: Optional[str]):
+        self._db.execute(
+                "INSERT OR REPLACE INTO items VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (scope, item_id, parent, name, web_url, int(is_file),
+                 last_modified))
+
+    def remove_item(self, scope: str, item_id: str):
+        self._db.execute(
+                "DELETE FROM items WHERE scope = ? AND id = ?",
+                (scope, item_id))
+
+    def files(self, scope: str, under: Iterable[str] = None) -> dict:
+        """Returns a dictionary mapping the ID of each file in the given scope
+        (or, if a collection of item IDs is specified, of each file that is
+        or is under one of those items) to a tuple of its path, its web URL,
+        the web URL of its parent folder, and its last modification
+        timestamp.
+
+        Paths are relative to the root of the scope, which is the item with
+        no parent."""
+        ctes = [
+            "paths(id, path, parent_url) AS ("
+            " SELECT id, '', NULL FROM items"
+            "  WHERE scope = :scope AND parent IS NULL"
+            " UNION ALL"
+            " SELECT i.id,"
+            "  CASE WHEN p.path = '' THEN i.name"
+            "   ELSE p.path || '/' || i.name END,"
+            "  pi.web_url"
+            " FROM paths p"
+            "  JOIN items pi ON pi.scope = :scope AND pi.id = p.id"
+            "  JOIN items i ON i.scope = :scope AND i.parent = p.id)"
+        ]
+        where = "i.is_file"
+
+        if under is not None:
+            # SQLite can't take a list as a parameter, so put the items in a
+            # temporary table instead
+            self._db.execute(
+                    "CREATE TEMPORARY TABLE IF NOT EXISTS under (id TEXT)")
+            self._db.execute("DELETE FROM under")
+            self._db.executemany(
+                    "INSERT INTO under VALUES (?)", ((i,) for i in under))
+            ctes.append(
+                    "selected(id) AS ("
+                    " SELECT id FROM under"
+                    " UNION"
+                    " SELECT i.id FROM selected s"
+                    "  JOIN items i ON i.scope = :scope AND i.parent = s.id)")
+            where += " AND i.id IN (SELECT id FROM selected)"
+
+        rows = self._db.execute(
+                f"WITH RECURSIVE {', '.join(ctes)}"
+                " SELECT i.id, p.path, i.web_url, p.parent_url,"
+                "  i.last_modified"
+                " FROM paths p JOIN items i ON i.scope = :scope AND i.id = p.id"
+                f" WHERE {where}",
+                {"scope": scope}).fetchall()
+        return {row[0]: tuple(row[1:]) for row in rows}
+
+    def commit(self):
+        self._db.commit()
+
+    def close(self):
+        """Closes this DeltaState, throwing away anything that hasn't been
+        committed."""
+        self._db.close()
@@ -1,10 +1,17 @@
 from io import BytesIO
+from collections import deque
 from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from dateutil.parser import isoparse
 from requests import HTTPError
 
-from ..core import Handle, Source, Resource, FileResource
+from os2datascanner.utils.timer import TimerManager
+
+from ... import settings as engine2_settings
+from ..core import (
+        Handle, Source, Resource, FileResource, LastModifiedCutoff, Removed)
 from ..derived.derived import DerivedSource
+from .delta import DeltaState
 from .utilities import MSGraphSource, warn_on_httperror
 
 
@@ -50,18 +57,11 @@ class MSGraphFilesSource(MSGraphSource):
                         yield self._make_drive_handle(drive)
 
         if self._user_drives:
-            if self._userlist is None:
-                for user in self._list_users(sm):
-                    pn = user["userPrincipalName"]
-                    with warn_on_httperror(f"drive check for {pn}"):
-                        drive = sm.open(self).get("users/{0}/drive".format(pn)).json()
-                        yield self._make_drive_handle(drive)
-
-            else:
-                for pn in self._userlist:
-                    with warn_on_httperror(f"drive check for {pn}"):
-                        drive = sm.open(self).get(f"users/{pn}/drive").json()
-                        yield self._make_drive_handle(drive)
+            for pn, response in self._get_for_users(
+                    sm, "users/{0}/drive", self._userlist):
+                with warn_on_httperror(f"drive check for {pn}"):
+                    response.raise_for_status()
+                    yield self._make_drive_handle(response.json())
 
     def to_json_object(self):
         return dict(
@@ -86,6 +86,11 @@ class MSGraphFilesSource(MSGraphSource):
 
 DUMMY_MIME = "application/vnd.os2.datascanner.graphdrive"
 
+_DRIVES = engine2_settings.model["msgraph"]["drives"]
+
+# The properties of drive items that are needed to explore a drive
+_ITEM_FIELDS = "id,name,file,folder,webUrl,lastModifiedDateTime,size"
+
 
 class MSGraphDriveResource(Resource):
     def check(self) -> bool:
@@ -163,35 +168,172 @@ class MSGraphDriveSource(DerivedSource):
             raise ValueError("Object didn't contain any driveId or UPN!:"
                              f" {self.to_json_object()}")
 
-    def handles(self, sm):
+    def handles(
+            self, sm, *,
+            cutoff: LastModifiedCutoff | None = None, scan_tag=None):
         gc: MSGraphSource.GraphCaller = sm.open(self)
-
-        def _explore_folder(
-                components, folder, parent_weblink=None, is_root=False):
-            for obj in folder:
-                name = obj["name"]
-                web_url = obj.get("webUrl", None)
-                if is_root:
-                    # Microsoft appears to have changed the default home page
-                    # of OneDrive from an actual list of files (which we want)
-                    # to some sort of fuzzy recent overview (which we don't)
-                    # without updating webUrl accordingly. Groan; attempt to
-                    # correct for that by requesting the file list view
-                    web_url += "?view=0"
-                here = components + ([name] if not is_root else [])
+        cutoff = cutoff or LastModifiedCutoff()
+
+        if (state := DeltaState.for_source(self, scan_tag)):
+            try:
+                yield from self._handles_incrementally(gc, state, cutoff)
+            finally:
+                state.close()
+            return
+
+        yield from self._explore(gc, cutoff)
+
+    def _list_children(self, gc, folder_id: str) -> list[dict]:
+        """Returns every item in the given folder, following the server's
+        pagination."""
+        return list(gc.paginated_get(
+                f"{self._drive_path}/items/{folder_id}/children"
+                f"?$top={_DRIVES['page_size']}&$select={_ITEM_FIELDS}"))
+
+    def _explore(self, gc, cutoff: LastModifiedCutoff):  # noqa CCR001
+        """Yields Handles for every file in this drive. Folders are listed
+        breadth first, with up to the configured number of folders being
+        listed at the same time; Handles are yielded in the order in which
+        their folders finish being listed."""
+        root = gc.get(
+                f"{self._drive_path}/root?$select={_ITEM_FIELDS}").json()
+        root_url = root.get("webUrl")
+        if root_url:
+            # Microsoft appears to have changed the default home page of
+            # OneDrive from an actual list of files (which we want) to some
+            # sort of fuzzy recent overview (which we don't) without updating
+            # webUrl accordingly. Groan; attempt to correct for that by
+            # requesting the file list view
+            root_url += "?view=0"
+        # Each folder waiting to be listed is represented by its ID, its path,
+        # and its web URL
+        to_list = deque([(root["id"], "", root_url)])
+
+        def _visit(path, web_url, children):
+            for obj in children:
+                here = f"{path}/{obj['name']}" if path else obj["name"]
                 if "file" in obj:
+                    ts = obj.get("lastModifiedDateTime")
+                    if ts and cutoff.excludes(isoparse(ts)):
+                        continue
+                    # Keep what the listing told us about this file, so that
+                    # MSGraphFileResource doesn't have to ask for it again
                     yield MSGraphFileHandle(
-                            self, "/".join(here),
-                            weblink=web_url, parent_weblink=parent_weblink)
-                elif "folder" in obj:
-                    folder_id: str = obj["id"]
-                    subfolder = gc.get(
-                            f"{self._drive_path}/items/"
-                            f"{folder_id}/children").json()
-                    yield from _explore_folder(
-                            here, subfolder["value"], parent_weblink=web_url)
-        root = [gc.get(f"{self._drive_path}/root").json()]
-        yield from _explore_folder([], root, is_root=True)
+                            self, here, weblink=obj.get("webUrl"),
+                            parent_weblink=web_url, hints={
+                                "last_modified": ts,
+                                "size": obj.get("size")})
+                elif "folder" in obj and obj["folder"].get("childCount") != 0:
+                    # (Anything that's neither a file nor a folder, like a
+                    # OneNote notebook or a remote item, has no children that
+                    # we could list)
+                    to_list.append((obj["id"], here, obj.get("webUrl")))
+
+        workers = max(1, _DRIVES["workers"])
+        pending = {}
+        with ThreadPoolExecutor(
+                max_workers=workers,
+                thread_name_prefix="MSGraphDrive") as pool:
+            try:
+                while to_list or pending:
+                    while to_list and len(pending) < workers:
+                        folder_id, path, web_url = to_list.popleft()
+                        future = pool.submit(
+                                self._list_children, gc, folder_id)
+                        pending[future] = (path, web_url)
+
+                    # Listing threads can't tell the main thread's timers that
+                    # they're sleeping because the server throttled them, so
+                    # suspend those timers here instead. (Every request has its
+                    # own timeout, so we'll still not wait forever)
+                    with TimerManager.get().suspension():
+                        done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        path, web_url = pending.pop(future)
+                        yield from _visit(path, web_url, future.result())
+            finally:
+                for future in pending:
+                    future.cancel()
+
+    @staticmethod
+    def _record(state: DeltaState, scope: str, item: dict):
+        if "deleted" in item:
+            state.remove_item(scope, item["id"])
+            return
+
+        web_url = item.get("webUrl")
+        if "root" in item:
+            parent = None
+            if web_url:
+                # See the comment about the root folder in handles()
+                web_url += "?view=0"
+        else:
+            parent = item.get("parentReference", {}).get("id")
+        state.put_item(
+                scope, item["id"], parent, item.get("name"), web_url,
+                "file" in item, item.get("lastModifiedDateTime"))
+
+    def _handles_incrementally(
+            self, gc, state: DeltaState, cutoff: LastModifiedCutoff):
+        """Yields Handles for the files in this drive using a delta query. If
+        this scanner has explored the drive before (and that exploration is
+        old enough to be covered by the cutoff), then only the files that have
+        changed since then will be yielded, along with Removed objects for the
+        files that have gone away.
+
+        The server doesn't tell us the paths of the items in a delta query,
+        so we keep track of the drive's layout ourselves."""
+        scope = self._drive_path
+        incremental, items = state.query(
+                gc, scope,
+                f"{scope}/root/delta?$select=id,name,parentReference,file,"
+                "folder,root,deleted,webUrl,lastModifiedDateTime",
+                cutoff.after)
+
+        if incremental:
+            yield from self._handles_changed(state, scope, items)
+        else:
+            yield from self._handles_all(state, scope, items, cutoff)
+        state.commit()
+
+    def _handles_all(
+            self, state: DeltaState, scope: str, items,
+            cutoff: LastModifiedCutoff):
+        """Records the complete layout of this drive, as returned by a
+        non-incremental delta query, and yields Handles for all of its files
+        that aren't excluded by the cutoff."""
+        state.forget_items(scope)
+        for item in items:
+            self._record(state, scope, item)
+        for path, web_url, parent_url, ts in state.files(scope).values():
+            if ts and cutoff.excludes(isoparse(ts)):
+                continue
+            yield MSGraphFileHandle(
+                    self, path, weblink=web_url, parent_weblink=parent_url,
+                    hints={"last_modified": ts})
+
+    def _handles_changed(self, state: DeltaState, scope: str, items):
+        """Records the changes to this drive returned by an incremental delta
+        query, and yields Handles for the files that have changed or moved and
+        Removed objects for the files that have gone away."""
+        changes = list(items)
+        changed = {item["id"] for item in changes}
+        # Renaming or moving a folder changes the paths of everything in it,
+        # but the server will only tell us about the folder itself
+        before = state.files(scope, under=changed)
+        for item in changes:
+            self._record(state, scope, item)
+        after = state.files(scope, under=changed)
+
+        for item_id, (path, *_) in before.items():
+            if item_id not in after or after[item_id][0] != path:
+                yield Removed(MSGraphFileHandle(self, path))
+        for item_id, (path, web_url, parent_url, ts) in after.items():
+            if (item_id in changed
+                    or item_id not in before or before[item_id][0] != path):
+                yield MSGraphFileHandle(
+                        self, path, weblink=web_url, parent_weblink=parent_url,
+                        hints={"last_modified": ts})
 
 
 class MSGraphFileResource(FileResource):
@@ -208,7 +350,10 @@ class MSGraphFileResource(FileResource):
 
     def check(self) -> bool:
         try:
-            self._get_cookie().get(self.make_object_path())
+            # (This gives us everything we'd otherwise have asked the server
+            # for later, so keep the result: it's fresher than any hints)
+            self._metadata = self._get_cookie().get(
+                    self.make_object_path()).json()
             return True
         except HTTPError as ex:
             if ex.response.status_code in (404, 410,):
@@ -225,10 +370,17 @@ class MSGraphFileResource(FileResource):
         return self._metadata
 
     def get_last_modified(self):
+        # Hints are only used until we've retrieved fresh metadata
+        if not self._metadata and (
+                timestamp := self.handle.hint("last_modified")):
+            return isoparse(timestamp)
         timestamp = self.get_file_metadata().get("lastModifiedDateTime")
         return isoparse(timestamp) if timestamp else None
 
     def get_size(self):
+        if not self._metadata and (
+                size := self.handle.hint("size")) is not None:
+            return size
         return self.get_file_metadata()["size"]
 
     @contextmanager
@@ -243,8 +395,10 @@ class MSGraphFileHandle(Handle):
     type_label = "msgraph-drive-file"
     resource_type = MSGraphFileResource
 
-    def __init__(self, source, path, weblink=None, parent_weblink=None):
-        super().__init__(source, path)
+    def __init__(
+            self, source, path, weblink=None, parent_weblink=None, *,
+            hints=None):
+        super().__init__(source, path, hints=hints)
         self._weblink = weblink
         self._parent_weblink = parent_weblink
 
@@ -281,4 +435,4 @@ class MSGraphFileHandle(Handle):
         return MSGraphFileHandle(
             Source.from_json_object(obj["source"]),
             obj["path"], obj.get("weblink"),
-            obj.get("parent_weblink"))
+            obj.get("parent_weblink"), hints=obj.get("hints"))
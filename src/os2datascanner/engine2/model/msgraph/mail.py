@@ -9,11 +9,15 @@ from requests import HTTPError
 
 from ... import settings as engine2_settings
 from ...rules.rule import Rule
-from ..core import Handle, Source, Resource, FileResource, SourceManager
+from ..core import (
+        Handle, Source, Resource, FileResource, SourceManager,
+        LastModifiedCutoff, Removed)
 from ..derived.derived import DerivedSource
+from .delta import DeltaState
 from .utilities import MSGraphSource, warn_on_httperror, MailFSBuilder
 
-from os2datascanner.engine2.rules.utilities.analysis import compute_mss
+from os2datascanner.engine2.rules.utilities.analysis import (
+        compute_last_modified_cutoff)
 
 logger = structlog.get_logger("engine2")
 
@@ -39,28 +43,16 @@ class MSGraphMailSource(MSGraphSource):
         self._scan_syncissues_folder = scan_syncissues_folder
         self._scan_attachments = scan_attachments
 
-    def handles(self, sm):  # noqa
-        if self._userlist is None:
-            for user in self._list_users(sm):
-                pn = user["userPrincipalName"]  # e.g. dan@contoso.onmicrosoft.com
-                # Getting a HTTP 404 response from the /messages endpoint means
-                # that this user doesn't have a mail account at all
-                with warn_on_httperror(f"mail check for {pn}"):
-                    any_mails = sm.open(self).get(
-                        "users/{0}/messages?$select=id&$top=1".format(pn)).json()
-                    if not any_mails["value"]:
-                        # This user has a mail account that contains no mails
-                        continue
-                    else:
-                        yield MSGraphMailAccountHandle(self, pn)
-
-        else:
-            for pn in self._userlist:
-                with warn_on_httperror(f"mail check for {pn}"):
-                    any_mails = sm.open(self).get(
-                        "users/{0}/messages?$select=id&$top=1".format(pn)).json()
-                    if any_mails["value"]:
-                        yield MSGraphMailAccountHandle(self, pn)
+    def handles(self, sm):
+        # Getting a HTTP 404 response from the /messages endpoint means that
+        # this user doesn't have a mail account at all
+        for pn, response in self._get_for_users(
+                sm, "users/{0}/messages?$select=id&$top=1", self._userlist):
+            with warn_on_httperror(f"mail check for {pn}"):
+                response.raise_for_status()
+                # (If the account contains no mails, we skip it)
+                if response.json()["value"]:
+                    yield MSGraphMailAccountHandle(self, pn)
 
     def to_json_object(self):
         return dict(
@@ -147,6 +139,33 @@ class MSGraphMailAccountHandle(Handle):
         return DUMMY_MIME
 
 
+def _excluded_folder_ids(
+        gc: MSGraphSource.GraphCaller, pn: str,
+        scan_deleted_items: bool, scan_sync_issues: bool):
+    """Yields the IDs of the special mail folders that shouldn't be scanned for
+    the given user."""
+    if not scan_deleted_items:
+        # Find folder id of deleted post for given mail account
+        yield gc.get(
+            f"users/{pn}/mailFolders/deleteditems?$select=id").json().get("id")
+    if not scan_sync_issues:
+        # Find folder id of syncissues for given mail account
+        # The syncissues folder is not guaranteed to be present, and requires a check
+        try:
+            yield gc.get(
+                f"users/{pn}/mailFolders/syncissues?$select=id").json().get("id")
+        except Exception:
+            logger.warning("Syncissues folder does not exist", exc_info=True)
+
+        # We've seen examples of conflicts being SyncIssues/Conflicts, but don't actually
+        # know if one can exist without the other, so side with caution here.
+        try:
+            yield gc.get(
+                f"users/{pn}/mailFolders/conflicts?$select=id").json().get("id")
+        except Exception:
+            logger.warning("Conflicts folder does not exist", exc_info=True)
+
+
 @Source.mime_handler(DUMMY_MIME)
 class MSGraphMailAccountSource(DerivedSource):
     type_label = "msgraph-mail-account"
@@ -172,34 +191,12 @@ class MSGraphMailAccountSource(DerivedSource):
         # The following logic is therefore reversed, and skips the steps if they are set to
         # true in the user-frontend
 
-        if not scan_deleted_items:
-            # Find folder id of deleted post for given mail account
-
-            del_post_folder_id = sm.open(self).get(
-                f"users/{pn}/mailFolders/deleteditems?$select=id").json().get("id")
-
-            # Exclude deleted post by issuing a 'not equal to' (ne) filter query
-            filters.append(f"parentFolderId ne '{del_post_folder_id}'")
-        if not scan_sync_issues:
-            # Find folder id of syncissues for given mail account
-            # The syncissues folder is not guaranteed to be present, and requires a check
-            try:
-                sync_issue_folder_id = sm.open(self).get(
-                    f"users/{pn}/mailFolders/syncissues?$select=id").json().get("id")
-
-                filters.append(f"parentFolderId ne '{sync_issue_folder_id}'")
-            except Exception:
-                logger.warning("Syncissues folder does not exist", exc_info=True)
-
-            # We've seen examples of conflicts being SyncIssues/Conflicts, but don't actually
-            # know if one can exist without the other, so side with caution here.
-            try:
-                conflicts_folder_id = sm.open(self).get(
-                    f"users/{pn}/mailFolders/conflicts?$select=id").json().get("id")
-
-                filters.append(f"parentFolderId ne '{conflicts_folder_id}'")
-            except Exception:
-                logger.warning("Conflicts folder does not exist", exc_info=True)
+        if not (scan_deleted_items and scan_sync_issues):
+            for fid in _excluded_folder_ids(
+                    sm.open(self), pn, scan_deleted_items, scan_sync_issues):
+                # Exclude the folder by issuing a 'not equal to' (ne) filter
+                # query
+                filters.append(f"parentFolderId ne '{fid}'")
 
         if cutoff:
             # Microsoft Graph requires all timestamps to be in UTC and doesn't
@@ -212,7 +209,18 @@ class MSGraphMailAccountSource(DerivedSource):
             query += f"&$filter={' and '.join(filters)}"
         return query
 
-    def handles(self, sm, *, rule: Rule | None = None):
+    def handles(
+            self, sm, *, rule: Rule | None = None,
+            cutoff: LastModifiedCutoff | None = None, scan_tag=None):
+        if (state := DeltaState.for_source(self, scan_tag)):
+            try:
+                yield from self._handles_incrementally(
+                        sm, state,
+                        cutoff or LastModifiedCutoff.from_rule(rule))
+            finally:
+                state.close()
+            return
+
         pn = self.handle.relative_path
         ps = engine2_settings.model["msgraph"]["page_size"]
         builder = MailFSBuilder(self, sm, pn)
@@ -220,13 +228,9 @@ class MSGraphMailAccountSource(DerivedSource):
         scan_deleted_items = self.handle.source.scan_deleted_items_folder
         scan_sync_issues = self.handle.source.scan_syncissues_folder
 
-        cutoff = None
-        for essential_rule in compute_mss(rule):
-            # (we can't do isinstance() here without making a circular
-            # dependency)
-            if essential_rule.type_label == "last-modified":
-                after = essential_rule.after
-                cutoff = (after if not cutoff else max(cutoff, after))
+        # (Graph can do this filtering for us, so we don't need to count the
+        # messages that it leaves out)
+        cutoff = compute_last_modified_cutoff(rule)
 
         # Sort out filters for our query string.
         query = self._append_msgraph_filters(
@@ -241,6 +245,56 @@ class MSGraphMailAccountSource(DerivedSource):
             result = sm.open(self).follow_next_link(result["@odata.nextLink"]).json()
             yield from (self._wrap(msg, builder) for msg in result["value"])
 
+    def _handles_incrementally(
+            self, sm, state: DeltaState, cutoff: LastModifiedCutoff):
+        """Yields Handles for the messages in each folder of this account
+        using delta queries. If this scanner has explored the account before
+        (and that exploration is old enough to be covered by the cutoff),
+        then only the messages that have changed since then will be yielded,
+        along with Removed objects for the messages that have gone away."""
+        pn = self.handle.relative_path
+        gc = sm.open(self)
+        builder = MailFSBuilder(self, sm, pn)
+        excluded = set(_excluded_folder_ids(
+                gc, pn,
+                self.handle.source.scan_deleted_items_folder,
+                self.handle.source.scan_syncissues_folder))
+
+        for fid in builder.folder_ids:
+            if fid in excluded:
+                continue
+            incremental, messages = state.query(
+                    gc, fid,
+                    f"users/{pn}/mailFolders/{fid}/messages/delta"
+                    "?$select=id,subject,webLink,parentFolderId,"
+                    "sentDateTime,lastModifiedDateTime",
+                    cutoff.after)
+            yield from self._handles_from_delta(
+                    messages, builder, cutoff if not incremental else None)
+            state.commit()
+
+    def _handles_from_delta(
+            self, messages, builder: MailFSBuilder,
+            cutoff: LastModifiedCutoff | None):
+        """Yields Handles for the messages returned by a delta query, and
+        Removed objects for those that the server reports as removed. If a
+        cutoff is specified, messages that it excludes are skipped."""
+        for message in messages:
+            if "@removed" in message:
+                yield Removed(MSGraphMailMessageHandle(
+                        self, message["id"],
+                        mail_subject=None, weblink=None))
+                continue
+            elif cutoff:
+                # This is what the $filter in the normal query does
+                timestamps = [
+                        isoparse(ts) for k in ("sentDateTime",
+                                               "lastModifiedDateTime",)
+                        if (ts := message.get(k))]
+                if timestamps and cutoff.excludes(max(timestamps)):
+                    continue
+            yield self._wrap(message, builder)
+
     def _wrap(self, message, builder: MailFSBuilder):
         fid = message["parentFolderId"]
         folder = builder.build_path(fid)
@@ -1,7 +1,13 @@
+import json
+import base64
+import binascii
+from typing import Iterable, Sequence
+from itertools import islice
 from dataclasses import dataclass
 from contextlib import contextmanager
 import structlog
 import requests
+from requests.structures import CaseInsensitiveDict
 
 from os2datascanner.utils.oauth2 import mint_cc_token
 from os2datascanner.engine2 import settings as engine2_settings
@@ -40,6 +46,31 @@ def raw_request_decorator(fn):
     return _wrapper
 
 
+def _make_batch_response(sub: dict, url: str) -> requests.Response:
+    """Converts one of the responses in the result of a JSON batch request
+    into a normal Response object."""
+    response = requests.Response()
+    response.status_code = sub["status"]
+    response.headers = CaseInsensitiveDict(sub.get("headers") or {})
+    response.url = url
+    response.encoding = "utf-8"
+
+    body = sub.get("body")
+    if body is None:
+        content = b""
+    elif isinstance(body, str) and not response.headers.get(
+            "content-type", "").startswith("application/json"):
+        # Graph base64-encodes response bodies that aren't JSON
+        try:
+            content = base64.b64decode(body, validate=True)
+        except binascii.Error:
+            content = body.encode()
+    else:
+        content = json.dumps(body).encode()
+    response._content = content
+    return response
+
+
 class MSGraphSource(Source):
     yields_independent_sources = True
 
@@ -65,24 +96,48 @@ class MSGraphSource(Source):
     def _list_users(self, sm):
         yield from sm.open(self).paginated_get("users")
 
+    def _get_for_users(self, sm, tail: str, userlist: Iterable[str] = None):
+        """Yields a (user principal name, Response) pair for each user in the
+        given list (or, if that's None, for every user in the tenant), where
+        each Response is the result of a GET request for the endpoint
+        tail.format(principal_name). The requests are sent in batches."""
+        if userlist is None:
+            userlist = (u["userPrincipalName"] for u in self._list_users(sm))
+        gc = sm.open(self)
+        userlist = iter(userlist)
+        while (chunk := list(islice(userlist, gc.batch_size))):
+            yield from zip(
+                    chunk, gc.batch_get([tail.format(pn) for pn in chunk]))
+
     class GraphCaller:
+        # The largest number of requests that Microsoft Graph accepts in a
+        # single JSON batch
+        MAX_BATCH_SIZE = 20
+
         def __init__(self, token_creator, session=None):
             self._token_creator = token_creator
             self._token = token_creator()
 
             self._session = session or requests
 
-        def _make_headers(self):
+        @property
+        def batch_size(self) -> int:
+            return max(1, min(
+                    engine2_settings.model["msgraph"]["batch_size"],
+                    self.MAX_BATCH_SIZE))
+
+        def _make_headers(self, extra=None):
             return {
                 "authorization": "Bearer {0}".format(self._token),
-            }
+            } | (extra or {})
 
         @raw_request_decorator
-        def get(self, tail, timeout=engine2_settings.model["msgraph"]["timeout"]):
+        def get(self, tail, timeout=engine2_settings.model["msgraph"]["timeout"],
+                *, headers=None):
             return WebRetrier().run(
                 self._session.get,
                 "https://graph.microsoft.com/v1.0/{0}".format(tail),
-                headers=self._make_headers(),
+                headers=self._make_headers(headers),
                 timeout=timeout)
 
         def paginated_get(self, endpoint: str):
@@ -96,6 +151,64 @@ class MSGraphSource(Source):
                 result = self.follow_next_link(result["@odata.nextLink"]).json()
                 yield from result.get('value')
 
+        @raw_request_decorator
+        def _post_batch(self, batch, timeout):
+            return WebRetrier().run(
+                self._session.post,
+                "https://graph.microsoft.com/v1.0/$batch",
+                headers=self._make_headers(),
+                json={"requests": batch},
+                timeout=timeout)
+
+        def batch_get(
+                self, tails: Sequence[str],
+                timeout=engine2_settings.model["msgraph"]["timeout"]
+                ) -> list[requests.Response]:
+            """Performs GET requests on several MSGraph endpoints at once by
+            combining them into JSON batch requests. Returns a list of
+            Response objects in the same order as the endpoints; unlike
+            GraphCaller.get, errors are not raised, so callers should call
+            Response.raise_for_status themselves.
+
+            Individual requests that are throttled by the server are retried
+            in a later batch, after waiting for as long as the server asks."""
+            responses = [None] * len(tails)
+            pending = list(range(len(tails)))
+            size = self.batch_size
+
+            def _attempt():
+                nonlocal pending
+                throttled = []
+                for start in range(0, len(pending), size):
+                    chunk = pending[start:start + size]
+                    result = self._post_batch(
+                            [{"id": str(idx), "method": "GET",
+                              "url": "/" + tails[idx]} for idx in chunk],
+                            timeout).json()
+                    for sub in result["responses"]:
+                        idx = int(sub["id"])
+                        responses[idx] = response = _make_batch_response(
+                                sub, tails[idx])
+                        if response.status_code in WebRetrier.RETRY_CODES:
+                            throttled.append(idx)
+                pending = sorted(throttled)
+                if pending:
+                    # Let the WebRetrier wait for as long as the server asked
+                    # us to before trying the throttled requests again
+                    responses[pending[0]].raise_for_status()
+
+            try:
+                WebRetrier().run(_attempt)
+            except requests.exceptions.HTTPError as ex:
+                if ex.response not in responses:
+                    raise
+                # We've given up on the throttled requests; return their
+                # final responses and let the caller decide what to do
+                logger.warning(
+                        "GraphCaller: giving up on throttled batch requests",
+                        count=len(pending))
+            return responses
+
         @raw_request_decorator
         def head(self, tail):
             return WebRetrier().run(
@@ -159,11 +272,11 @@ class MSGraphSource(Source):
             )
 
         @raw_request_decorator
-        def follow_next_link(self, next_page):
+        def follow_next_link(self, next_page, *, headers=None):
             return WebRetrier().run(
                 self._session.get,
                 next_page,
-                headers=self._make_headers())
+                headers=self._make_headers(headers))
 
     def to_json_object(self):
         return dict(
@@ -233,17 +346,26 @@ class MailFSBuilder:
 
     def _recurse_child_folders(self, recursion_stack):
         ps = engine2_settings.model["msgraph"]["page_size"]
-        head = recursion_stack.pop()
-        fid = head.fid
-
-        result = self._sm.open(self._source).get(
-            (f"users/{self._pn}/mailFolders/{fid}/childFolders?$select=id,"
-             f"parentFolderId,displayName,childFolderCount&$top={ps}")).json()
-
-        recursion_stack = self._process_result(result, recursion_stack)
-
-        if len(recursion_stack) > 0:
-            self._recurse_child_folders(recursion_stack)
+        gc = self._sm.open(self._source)
+
+        # Folders are independent of one another, so we can look up the
+        # children of several of them at once
+        while recursion_stack:
+            heads = recursion_stack[-gc.batch_size:]
+            del recursion_stack[-gc.batch_size:]
+
+            responses = gc.batch_get([
+                    (f"users/{self._pn}/mailFolders/{head.fid}/childFolders"
+                     f"?$select=id,parentFolderId,displayName,childFolderCount"
+                     f"&$top={ps}") for head in heads])
+            for response in responses:
+                response.raise_for_status()
+                recursion_stack = self._process_result(
+                        response.json(), recursion_stack)
+
+    @property
+    def folder_ids(self) -> list[str]:
+        return list(self._folder_map)
 
     def build_path(self, fid):
         """Builds a folder path given an fid"""
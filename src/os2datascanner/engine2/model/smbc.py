@@ -17,7 +17,7 @@ from ..conversions.utilities.navigable import make_values_navigable
 from .smb import (
     make_smb_url, compute_domain,
     make_full_windows_path, make_presentation_url)
-from .core import Source, Handle, FileResource
+from .core import Source, Handle, FileResource, LastModifiedCutoff
 from .core.errors import UncontactableError
 from .file import stat_attributes
 
@@ -213,8 +213,26 @@ class SMBCSource(Source):
             # owner
             return None
 
-    def handles(self, sm):  # noqa: C901,E501,CCR001
+    def _file_handle(
+            self, path, fi, attrs, hints, cutoff: LastModifiedCutoff):
+        """Returns a SMBCHandle for the file described by the given FileInfo,
+        or None if the cutoff excludes it. readdirplus() has already told us
+        when the file was last modified, so we can skip files that are too
+        old without another round trip to the server."""
+        if cutoff and cutoff.excludes(datetime.fromtimestamp(fi.mtime)):
+            return None
+        # Keep what readdirplus() told us about this file, so that
+        # SMBCResource doesn't have to go back and ask for it again
+        return SMBCHandle(
+                self, path, hints=hints | {
+                    "st_size": fi.size,
+                    "st_mtime": fi.mtime,
+                    "attrs": int(attrs)})
+
+    def handles(  # noqa: C901,E501,CCR001
+            self, sm, *, cutoff: LastModifiedCutoff | None = None):
         url, context = sm.open(self)
+        cutoff = cutoff or LastModifiedCutoff()
 
         def handle_fileinfo(parents, fi, owner_sid: str = None):
             name = fi.name
@@ -255,7 +273,9 @@ class SMBCSource(Source):
             else:
                 # We assume anything not tagged as a directory is (scannable as
                 # if it were) a normal file
-                yield handle_here
+                if (handle := self._file_handle(
+                        path, fi, attrs, hints, cutoff)):
+                    yield handle
 
         try:
             obj = context.opendir(url)
@@ -374,8 +394,10 @@ class SMBCResource(FileResource):
 
     def check(self) -> bool:
         try:
-            _, context = self._get_cookie()
-            context.stat(self._make_url())
+            # (stat() gives us everything we'd otherwise have asked the server
+            # for later, so keep the result: it's fresher than any hints)
+            self._mr = None
+            self.unpack_stat()
             return True
         except smbc.NoEntryError:
             return False
@@ -399,21 +421,24 @@ class SMBCResource(FileResource):
 
     def unpack_stat(self):
         if not self._mr:
-            f = self.open_file()
-            try:
-                stat = stat_result(f.fstat())
-                ts = datetime.fromtimestamp(stat.st_mtime)
-                self._mr = make_values_navigable(
-                        {k: getattr(stat, k) for k in stat_attributes} |
-                        {OutputType.LastModified: ts})
-            finally:
-                f.close()
+            _, context = self._get_cookie()
+            stat = stat_result(DefaultRetrier(smbc.TimedOutError).run(
+                    context.stat, self._make_url()))
+            ts = datetime.fromtimestamp(stat.st_mtime)
+            self._mr = make_values_navigable(
+                    {k: getattr(stat, k) for k in stat_attributes} |
+                    {OutputType.LastModified: ts})
         return self._mr
 
     def get_size(self):
+        # Hints are only used until we've retrieved a fresh stat() result
+        if not self._mr and (size := self.handle.hint("st_size")) is not None:
+            return size
         return self.unpack_stat()["st_size"]
 
     def get_last_modified(self):
+        if not self._mr and (mtime := self.handle.hint("st_mtime")) is not None:
+            return datetime.fromtimestamp(mtime)
         return self.unpack_stat().setdefault(OutputType.LastModified,
                                              super().get_last_modified())
 
@@ -0,0 +1,113 @@
+import json
+import sqlite3
+import structlog
+from pathlib import Path
+from typing import NamedTuple, Optional
+
+from ... import settings as engine2_settings
+
+
+logger = structlog.get_logger("engine2")
+
+
+class CrawlState:
+    """A CrawlState is a small SQLite database that remembers, from one crawl
+    of a website to the next, what was found at each of its URLs: the
+    validators needed to make a conditional request for it, the hash of its
+    content, and the links that it contained.
+
+    A WebCrawler with a CrawlState can skip downloading pages that haven't
+    changed since the last crawl, and can replay their links instead of
+    parsing them again.
+
+    Changes are committed every COMMIT_INTERVAL writes, so that a crawl that
+    is interrupted still leaves behind most of what it learned."""
+
+    COMMIT_INTERVAL = 100
+
+    class Entry(NamedTuple):
+        etag: Optional[str] = None
+        last_modified: Optional[str] = None
+        content_type: Optional[str] = None
+        content_hash: Optional[str] = None
+        outlinks: tuple = ()
+
+        @property
+        def validators(self) -> dict:
+            """Returns the HTTP headers needed to make a request conditional
+            on this Entry being out of date."""
+            headers = {}
+            if self.etag:
+                headers["If-None-Match"] = self.etag
+            if self.last_modified:
+                headers["If-Modified-Since"] = self.last_modified
+            return headers
+
+    def __init__(self, path):
+        self._db = sqlite3.connect(path)
+        self._db.execute(
+                "CREATE TABLE IF NOT EXISTS pages ("
+                " url TEXT PRIMARY KEY,"
+                " etag TEXT, last_modified TEXT, content_type TEXT,"
+                " content_hash TEXT, outlinks TEXT,"
+                " crawl INTEGER NOT NULL)")
+        self._crawl = 1 + (self._db.execute(
+                "SELECT MAX(crawl) FROM pages").fetchone()[0] or 0)
+        self._uncommitted = 0
+
+    @classmethod
+    def for_source(cls, source) -> Optional["CrawlState"]:
+        """Returns the CrawlState for the given Source, or None if the system
+        has not been configured to keep crawl state."""
+        directory = engine2_settings.model["http"]["crawler"]["state_directory"]
+        if not directory:
+            return None
+        path = Path(directory)
+        path.mkdir(parents=True, exist_ok=True)
+        return cls(path / f"{source.crunch(hash=True)}.sqlite3")
+
+    def get(self, url: str) -> Optional[Entry]:
+        row = self._db.execute(
+                "SELECT etag, last_modified, content_type, content_hash,"
+                " outlinks FROM pages WHERE url = ?", (url,)).fetchone()
+        if not row:
+            return None
+        *fields, outlinks = row
+        return self.Entry(
+                *fields,
+                outlinks=tuple(
+                        (link, hints)
+                        for link, hints in json.loads(outlinks or "[]")))
+
+    def put(self, url: str, entry: Entry):
+        self._db.execute(
+                "INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (url, entry.etag, entry.last_modified, entry.content_type,
+                 entry.content_hash, json.dumps(list(entry.outlinks)),
+                 self._crawl))
+        self._written()
+
+    def keep(self, url: str):
+        """Records that the entry for the given URL is still valid."""
+        self._db.execute(
+                "UPDATE pages SET crawl = ? WHERE url = ?", (self._crawl, url))
+        self._written()
+
+    def _written(self):
+        self._uncommitted += 1
+        if self._uncommitted >= self.COMMIT_INTERVAL:
+            self._db.commit()
+            self._uncommitted = 0
+
+    def close(self, *, complete: bool = False):
+        """Saves and closes this CrawlState. If the crawl was completed, then
+        the entries for URLs that weren't visited this time are forgotten."""
+        try:
+            if complete:
+                pruned = self._db.execute(
+                        "DELETE FROM pages WHERE crawl < ?",
+                        (self._crawl,)).rowcount
+                logger.debug("CrawlState pruned", count=pruned)
+            self._db.commit()
+        finally:
+            self._db.close()
@@ -1,13 +1,25 @@
 import re
+import copy
+import hashlib
+import threading
 from abc import ABC, abstractmethod
+from time import monotonic, sleep
+from datetime import timezone
+from email.utils import format_datetime
+from collections import deque
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from lxml.html import HtmlElement, document_fromstring
 from lxml.etree import ParserError
 from urllib.parse import urlsplit, urlunsplit, SplitResult
 import structlog
 import requests
 
+from os2datascanner.utils.timer import TimerManager
+from os2datascanner.utils.system_utilities import time_now
 from os2datascanner.engine2.factory import make_webretrier
 from os2datascanner.engine2.conversions.types import Link
+from .crawl_state import CrawlState
 
 logger = structlog.get_logger("engine2")
 
@@ -18,7 +30,7 @@ class Crawler(ABC):
     def __init__(self, ttl=10):
         self.ttl = ttl
         self.visited = set()
-        self.to_visit = list()
+        self.to_visit = deque()
         self._visiting = None
         self._frozen = False
 
@@ -65,7 +77,7 @@ class Crawler(ABC):
     def visit(self):
         """Recursively visits all of the objects added to this Crawler."""
         while self.to_visit:
-            (head, ttl, hints), *self.to_visit = self.to_visit
+            head, ttl, hints = self.to_visit.popleft()
             self._visiting = head
             try:
                 adapted = self._adapt(head)
@@ -113,23 +125,130 @@ def simplify_mime_type(mime):
     return mime.split(';', maxsplit=1)[0]
 
 
+class _HostLimiter:
+    """A _HostLimiter limits the number of concurrent requests made to a
+    single host, and optionally enforces a minimum delay between the start of
+    each of those requests."""
+
+    def __init__(self, concurrency: int, delay: float):
+        self._semaphore = threading.BoundedSemaphore(concurrency)
+        self._lock = threading.Lock()
+        self._delay = delay
+        self._next = 0.0
+
+    @contextmanager
+    def slot(self):
+        with self._semaphore:
+            if self._delay:
+                with self._lock:
+                    now = monotonic()
+                    wait_for = self._next - now
+                    self._next = max(now, self._next) + self._delay
+                if wait_for > 0:
+                    sleep(wait_for)
+            yield
+
+
+class CrawlerMetrics:
+    """A CrawlerMetrics object keeps track of the progress of a WebCrawler."""
+
+    def __init__(self):
+        self.started = None
+        self.pages = 0
+        self.unchanged = 0
+        self.in_flight = 0
+        self.queue_depth = 0
+        self.max_queue_depth = 0
+
+    def observe_queue(self, depth: int, in_flight: int):
+        self.queue_depth = depth
+        self.max_queue_depth = max(self.max_queue_depth, depth)
+        self.in_flight = in_flight
+
+    @property
+    def pages_per_second(self) -> float:
+        if self.started is None:
+            return 0.0
+        elapsed = monotonic() - self.started
+        return self.pages / elapsed if elapsed > 0 else 0.0
+
+    def to_dict(self):
+        return {
+            "pages": self.pages,
+            "unchanged": self.unchanged,
+            "pages_per_second": round(self.pages_per_second, 2),
+            "queue_depth": self.queue_depth,
+            "max_queue_depth": self.max_queue_depth,
+            "in_flight": self.in_flight,
+        }
+
+
 class WebCrawler(Crawler):
+    """A WebCrawler explores the links between web pages.
+
+    Pages are fetched by a pool of up to `workers` threads, of which no more
+    than `per_host` will be talking to the same host at once (with at least
+    `delay` seconds between the start of each request to that host). Parsing
+    pages and following their links always takes place on the thread that
+    called WebCrawler.visit.
+
+    If the WebCrawler has a CrawlState, then pages will only be downloaded
+    again if they have changed since the last crawl; the links of unchanged
+    pages are taken from the CrawlState instead."""
+
+    # How often, in pages fetched, to log the crawler's progress
+    METRICS_INTERVAL = 500
+
     def __init__(
             self, url: str, session: requests.Session,
-            *args, allow_element_hints=False, retrier=None, **kwargs):
+            *args, allow_element_hints=False, retrier=None,
+            workers: int = 1, per_host: int | None = None,
+            delay: float = 0.0, timeout: float | None = None,
+            state: CrawlState | None = None, **kwargs):
         super().__init__(*args, **kwargs)
         self._url = url
         self._split_url = urlsplit(url)
         self._session = session
         self._retrier = retrier or make_webretrier()
         self._allow_element_hints = allow_element_hints
+        self._workers = max(1, workers)
+        self._per_host = max(1, per_host or self._workers)
+        self._delay = delay
+        self._timeout = timeout
+        self._state = state
+        self._limiters = {}
+        self._limiters_lock = threading.Lock()
+        self._local = threading.local()
         self.exclusions = set()
+        self.metrics = CrawlerMetrics()
+
+    def _get_retrier(self):
+        # Retriers keep track of the operation they're running, so each
+        # fetching thread needs a copy of its own
+        if threading.current_thread() is threading.main_thread():
+            return self._retrier
+        if not hasattr(self._local, "retrier"):
+            self._local.retrier = copy.copy(self._retrier)
+        return self._local.retrier
+
+    def _request(self, method, *args, **kwargs):
+        if self._timeout is not None:
+            kwargs.setdefault("timeout", self._timeout)
+        return self._get_retrier().run(method, *args, **kwargs)
 
     def get(self, *args, **kwargs):
-        return self._retrier.run(self._session.get, *args, **kwargs)
+        return self._request(self._session.get, *args, **kwargs)
 
     def head(self, *args, **kwargs):
-        return self._retrier.run(self._session.head, *args, **kwargs)
+        return self._request(self._session.head, *args, **kwargs)
+
+    def _get_limiter(self, url: str) -> _HostLimiter:
+        netloc = urlsplit(url).netloc
+        with self._limiters_lock:
+            if netloc not in self._limiters:
+                self._limiters[netloc] = _HostLimiter(
+                        self._per_host, self._delay)
+            return self._limiters[netloc]
 
     def exclude(self, *exclusions):
         self.exclusions.update(exclusions)
@@ -186,22 +305,108 @@ class WebCrawler(Crawler):
                 if (true_url := element.get("data-true-url")):
                     extra_hints["true_url"] = true_url
             self.add(link.url, new_ttl, **extra_hints)
-
-    def visit_one(self, url: str, ttl: int, hints):  # noqa CCR001
-        if ttl > 0 and self.is_crawlable(url) and not self._frozen:
-            response = self.head(url)
+            return (link.url, extra_hints)
+
+    def _should_fetch(self, url: str, ttl: int) -> bool:
+        return ttl > 0 and self.is_crawlable(url) and not self._frozen
+
+    def _get_entry(self, url: str) -> CrawlState.Entry | None:
+        return self._state.get(url) if self._state else None
+
+    def fetch(
+            self, url: str,
+            entry: CrawlState.Entry | None = None) -> requests.Response:
+        """Retrieves the response that the WebCrawler will examine for the
+        given URL: the response to a HEAD request, unless that doesn't work or
+        indicates that the URL is a HTML page, in which case the response to a
+        GET request. If a CrawlState entry is given, then the requests will be
+        conditional on it being out of date. This method is safe to call from
+        any thread."""
+        headers = entry.validators if entry else {}
+        with self._get_limiter(url).slot():
+            response = self.head(url, headers=headers)
 
             if response.status_code == 405:
                 # The server doesn't support HEAD requests? That's odd. Oh,
                 # well, let's use GET instead
-                response = self.get(url)
+                response = self.get(url, headers=headers)
 
             if response.status_code == 200:
+                ct = response.headers.get(
+                        "Content-Type", "application/octet-stream")
+                if (simplify_mime_type(ct).lower() == "text/html"
+                        and not response.content):
+                    response = self.get(url)
+        return response
+
+    def _remember(self, url, response, entry, outlinks, hints):
+        """Stores what was learned about a URL in this WebCrawler's
+        CrawlState, and updates its hints accordingly."""
+        content_hash = None
+        if response.request.method == "GET":
+            content_hash = hashlib.sha256(response.content).hexdigest()
+
+        last_modified = response.headers.get("Last-Modified")
+        if not last_modified and content_hash:
+            # The server won't tell us when this page last changed, but we
+            # can tell whether or not it's changed since we last saw it
+            if entry and entry.content_hash == content_hash:
+                last_modified = entry.last_modified
+            else:
+                # (If-Modified-Since needs an HTTP date, in GMT)
+                last_modified = format_datetime(
+                        time_now().astimezone(timezone.utc), usegmt=True)
+
+        new_entry = CrawlState.Entry(
+                etag=response.headers.get("ETag"),
+                last_modified=last_modified,
+                content_type=response.headers.get("Content-Type"),
+                content_hash=content_hash,
+                outlinks=tuple(outlinks))
+        self._state.put(url, new_entry)
+        self._update_hints(hints, new_entry, fresh=False)
+
+    @staticmethod
+    def _update_hints(hints, entry: CrawlState.Entry, fresh=True):
+        # (hints that came from a sitemap take precedence over ours)
+        if entry.last_modified:
+            hints.setdefault("last_modified", entry.last_modified)
+        if entry.content_type:
+            hints.setdefault("content_type", entry.content_type)
+        if fresh:
+            hints["fresh"] = True
+
+    def visit_one(self, url: str, ttl: int, hints):
+        response = entry = None
+        if self._should_fetch(url, ttl):
+            entry = self._get_entry(url)
+            response = self.fetch(url, entry)
+        yield from self._process(url, ttl, hints, response, entry)
+
+    def _process(  # noqa CCR001
+            self, url: str, ttl: int, hints,
+            response: requests.Response | None,
+            entry: CrawlState.Entry | None = None):
+        if response is not None:
+            self.metrics.pages += 1
+            if self.metrics.pages % self.METRICS_INTERVAL == 0:
+                logger.info(
+                        "WebCrawler progress",
+                        url=self._url, **self.metrics.to_dict())
+
+            if response.status_code == 304 and entry:
+                # This object hasn't changed since the last crawl, so we can
+                # reuse what we learned about it then
+                self.metrics.unchanged += 1
+                self._state.keep(url)
+                self._update_hints(hints, entry)
+                for link_url, extra_hints in entry.outlinks:
+                    self.add(link_url, ttl - 1, **extra_hints)
+            elif response.status_code == 200:
+                outlinks = []
                 ct = response.headers.get(
                         "Content-Type", "application/octet-stream")
                 if simplify_mime_type(ct).lower() == "text/html":
-                    if not response.content:
-                        response = self.get(url)
                     doc = parse_html(response.content, url)
 
                     if self._allow_element_hints and not hints.get("title"):
@@ -214,10 +419,80 @@ class WebCrawler(Crawler):
                                 hints["title"] = title
 
                     for element, link in make_outlinks(doc):
-                        self._handle_outlink(ttl - 1, element, link)
+                        if (outlink := self._handle_outlink(
+                                ttl - 1, element, link)):
+                            outlinks.append(outlink)
+                if self._state:
+                    self._remember(url, response, entry, outlinks, hints)
             elif response.is_redirect and response.next:
                 # Redirects cost a TTL point *and* don't produce anything
                 self.add(response.next.url, ttl - 1)
                 return
 
         yield (hints, url)
+
+    def visit(self):
+        """Recursively visits all of the objects added to this WebCrawler,
+        fetching up to the configured number of pages at the same time.
+
+        Objects are yielded in the order in which their pages finish
+        downloading, which is not necessarily the order in which they were
+        discovered."""
+        self.metrics.started = monotonic()
+        if self._workers == 1:
+            yield from super().visit()
+        else:
+            yield from self._visit_concurrently()
+        self.metrics.observe_queue(len(self.to_visit), 0)
+        logger.info(
+                "WebCrawler finished", url=self._url, **self.metrics.to_dict())
+
+    def _visit_concurrently(self):  # noqa CCR001
+        pending = {}
+        with ThreadPoolExecutor(
+                max_workers=self._workers,
+                thread_name_prefix="WebCrawler") as pool:
+            try:
+                while self.to_visit or pending:
+                    # Top up the pool of requests from the frontier. (Objects
+                    # that don't need to be fetched can be dealt with
+                    # immediately)
+                    while self.to_visit and len(pending) < self._workers:
+                        head, ttl, hints = self.to_visit.popleft()
+                        adapted = self._adapt(head)
+                        if ttl <= 0 or adapted in self.visited:
+                            continue
+                        self.visited.add(adapted)
+                        if self._should_fetch(head, ttl):
+                            entry = self._get_entry(head)
+                            future = pool.submit(self.fetch, head, entry)
+                            pending[future] = (head, ttl, hints, entry)
+                        else:
+                            yield from self._visit_fetched(
+                                    head, ttl, hints, None, None)
+                    self.metrics.observe_queue(
+                            len(self.to_visit), len(pending))
+
+                    if not pending:
+                        continue
+                    # Fetching threads can't tell the main thread's timers
+                    # that they're sleeping because a server sent them a
+                    # Retry-After header, so suspend those timers here instead.
+                    # (Every request has its own timeout, so we'll still not
+                    # wait forever)
+                    with TimerManager.get().suspension():
+                        done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        head, ttl, hints, entry = pending.pop(future)
+                        yield from self._visit_fetched(
+                                head, ttl, hints, future.result(), entry)
+            finally:
+                for future in pending:
+                    future.cancel()
+
+    def _visit_fetched(self, url, ttl, hints, response, entry):
+        self._visiting = url
+        try:
+            yield from self._process(url, ttl, hints, response, entry)
+        finally:
+            self._visiting = None
@@ -1,6 +1,7 @@
 from .. import settings
 from ..model.core import (
-        Source, takes_named_arg, UnknownSchemeError, DeserialisationError)
+        Source, LastModifiedCutoff, Removed, takes_named_arg,
+        UnknownSchemeError, DeserialisationError)
 from ..model.core.errors import (ModelException,
                                  UncontactableError,
                                  UnauthorisedError,
@@ -75,6 +76,7 @@ def message_received_raw(body, channel, source_manager):  # noqa
 
     handle_count = 0
     source_count = None
+    removed_count = 0
     exception_message = ""
 
     # Update the configuration of the source manager.
@@ -85,9 +87,14 @@ def message_received_raw(body, channel, source_manager):  # noqa
     handles_method = scan_spec.source.handles
 
     # Inspect the handles() method to see if it can take any extra hints
+    cutoff = LastModifiedCutoff.from_rule(progress.rule)
     extra_kwargs = {}
     if takes_named_arg(handles_method, "rule"):
         extra_kwargs["rule"] = progress.rule
+    if takes_named_arg(handles_method, "cutoff"):
+        extra_kwargs["cutoff"] = cutoff
+    if takes_named_arg(handles_method, "scan_tag"):
+        extra_kwargs["scan_tag"] = scan_tag
 
     it = handles_method(source_manager, **extra_kwargs)
 
@@ -105,7 +112,17 @@ def message_received_raw(body, channel, source_manager):  # noqa
 
     try:
         while (handle := retrier.run(next, it)):
-            if isinstance(handle, tuple) and handle[1]:
+            if isinstance(handle, Removed):
+                # An incremental exploration has found that something we saw
+                # last time has gone away. Tell the rest of the system, just
+                # as the processor would if a checkup had found it missing
+                for problems_q in ("os2ds_problems", "os2ds_checkups",):
+                    yield (problems_q, messages.ProblemMessage(
+                            scan_tag=scan_tag, source=None,
+                            handle=handle.handle, missing=True,
+                            message="Object removed").to_json_object())
+                removed_count += 1
+            elif isinstance(handle, tuple) and handle[1]:
                 # We were able to construct a Handle for something that
                 # exists, but then something unexpected (that we can tie to
                 # that specific Handle) went wrong. Send a problem message
@@ -134,7 +151,9 @@ def message_received_raw(body, channel, source_manager):  # noqa
         # Exploration is complete
         log.info(
                 "finished",
-                handle_count=handle_count, source_count=source_count)
+                handle_count=handle_count, source_count=source_count,
+                skipped_by_last_modified=cutoff.skipped,
+                removed_count=removed_count)
     except Exception as e:
         if isinstance(e, ModelException):
             if isinstance(e, UncontactableError):
@@ -163,7 +182,9 @@ def message_received_raw(body, channel, source_manager):  # noqa
             it.close()
         yield ("os2ds_status", messages.StatusMessage(
                 scan_tag=scan_tag,
-                total_objects=handle_count, new_sources=source_count,
+                total_objects=handle_count + cutoff.skipped,
+                new_sources=source_count,
+                skipped_by_last_modified=cutoff.skipped or None,
                 message=exception_message,
                 status_is_error=exception_message != "").to_json_object())
 
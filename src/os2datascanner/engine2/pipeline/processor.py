@@ -5,6 +5,7 @@ from ..model.core import Source
 from ..utilities.backoff import TimeoutRetrier
 from ..conversions import convert
 from ..conversions.types import OutputType, encode_dict
+from ..conversions.utilities.cache import CacheManager
 from . import messages
 
 logger = structlog.get_logger("processor")
@@ -41,6 +42,18 @@ def check(source_manager, handle):
     return handle.follow(source_manager).check()
 
 
+def convert_cached(resource, output_type):
+    """
+    Converts a Resource into the given type of representation, reusing (and
+    storing) a cached one if the system has been configured to cache that type.
+    """
+    if CacheManager.should_cache(output_type):
+        return CacheManager(resource).representation(output_type).get(
+                create=True)
+    else:
+        return convert(resource, output_type)
+
+
 def format_exception_message(ex: Exception, conversion: messages.ConversionMessage) -> str:
     '''Utility function for formating exception messages depending on the exception type.'''
     exception_message = "Processing error. {0}: ".format(type(ex).__name__)
@@ -105,11 +118,11 @@ def message_received_raw(body, channel, source_manager, *, _check=True):  # noqa
                     break
             else:
                 # We have no reason to skip the conversion, so try to do it
-                representation = tr.run(convert, resource, required)
+                representation = tr.run(convert_cached, resource, required)
         else:
             # This isn't an OCR task (or there are no OCR exceptions defined);
             # just try to do the conversion
-            representation = tr.run(convert, resource, required)
+            representation = tr.run(convert_cached, resource, required)
 
         if representation and getattr(representation, "parent", None):
             # If the conversion also produced other values at the same
@@ -1,9 +1,13 @@
 import os
 import sys
+import time
 import click
 import pstats
 import random
+import signal
+import threading
 import structlog
+import multiprocessing
 from collections import deque
 
 from prometheus_client import Info, Summary, start_http_server, CollectorRegistry
@@ -12,6 +16,9 @@ from os2datascanner.utils import debug, profiling
 from ... import __version__
 from ..model.core import SourceManager
 from . import explorer, exporter, matcher, messages, processor, tagger, worker
+from ...utils.system_utilities import json_utf8_decode
+from ..utilities import metrics
+from ..rules.datasets.loader import common as common_loader
 from .utilities.pika import (ANON_QUEUE,
                              RejectMessage,
                              PikaPipelineThread,
@@ -38,6 +45,37 @@ def _compatibility_main(stage):
     main()
 
 
+_pool_source_manager = None
+
+
+def _pool_initialiser(width):
+    """(Pool process.) Prepares a forked handler process. Each handler
+    process has its own SourceManager, which is cleaned up when the process
+    exits."""
+    global _pool_source_manager
+    # Signals are the parent's business; it'll shut us down when it's ready
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    _pool_source_manager = SourceManager(width=width)
+    multiprocessing.util.Finalize(
+            _pool_source_manager, _pool_source_manager.clear, exitpriority=10)
+
+
+def _preload_datasets(stage):
+    """Loads the rules' datasets, if the given pipeline stage uses them, so
+    that forked handler processes share them (copy-on-write) instead of each
+    loading their own."""
+    if stage in ("matcher", "worker",):
+        common_loader.preload()
+
+
+def _pool_handle(stage, routing_key, body):
+    """(Pool process.) Runs the given pipeline stage's message handler and
+    returns everything it produced."""
+    return list(_module_mapping[stage].message_received_raw(
+            body, routing_key, _pool_source_manager))
+
+
 def restart_process():
     """Clean exit, used to release all ressources used by this process and children.
 
@@ -49,13 +87,13 @@ class GenericRunner(PikaPipelineThread):
     def __init__(self,
                  source_manager: SourceManager, *args,
                  stage: str, module, queue_suffix, limit,
-                 read, write, **kwargs):
+                 read, write, pool=None, processes=1, **kwargs):
         super().__init__(
                 *args, **kwargs,
                 read=read,
                 write=write,
                 queue_suffix=queue_suffix,
-                prefetch_count=module.PREFETCH_COUNT)
+                prefetch_count=module.PREFETCH_COUNT * max(processes, 1))
         self._module = module
         self._registry = CollectorRegistry()
         self._summary = Summary(
@@ -72,6 +110,12 @@ class GenericRunner(PikaPipelineThread):
         self._limit = limit
         self._count = 0
 
+        # If we've been given a pool of handler processes, then keep each of
+        # them busy with up to two messages at a time
+        self._pool = pool
+        self._slots = threading.BoundedSemaphore(2 * max(processes, 1))
+        self._pool_exception = None
+
     def make_channel(self):
         channel = super().make_channel()
 
@@ -109,7 +153,7 @@ class GenericRunner(PikaPipelineThread):
 
         yield from []
 
-    def _handle_content(self, routing_key, body):
+    def _check_cancelled(self, body):
         raw_scan_tag = body.get("scan_tag")
 
         if not raw_scan_tag and "scan_spec" in body:
@@ -124,9 +168,18 @@ class GenericRunner(PikaPipelineThread):
                         "ignoring")
                 raise RejectMessage(requeue=False)
 
+    def _handle_content(self, routing_key, body):
+        self._check_cancelled(body)
+
         yield from self._module.message_received_raw(
                 body, routing_key, self._source_manager)
 
+    def _route(self, results):
+        qs = self._queue_suffix
+        stage = self._stage
+        for rk, msg in results:
+            yield rk, msg, get_exchange(stage, qs, msg, rk), get_headers(stage, qs, msg, rk)
+
     def handle_message(self, routing_key, body) -> HandleMessageType:
         # If the routing_key points to the default exchange, then
         # we interpret the message as a command and yield a 2-tuple
@@ -139,10 +192,64 @@ class GenericRunner(PikaPipelineThread):
                 yield from self._handle_command(routing_key, body)
             else:
                 # Note: change exchange and headers here.
-                qs = self._queue_suffix
-                stage = self._stage
-                for rk, msg in self._handle_content(routing_key, body):
-                    yield rk, msg, get_exchange(stage, qs, msg, rk), get_headers(stage, qs, msg, rk)
+                yield from self._route(
+                        self._handle_content(routing_key, body))
+
+    def dispatch_message(self, method, properties, body):
+        routing_key = method.routing_key
+        if not self._pool or routing_key == "":
+            # Commands always run here, as they affect this process's state
+            return super().dispatch_message(method, properties, body)
+
+        dbd = json_utf8_decode(body)
+        try:
+            self._check_cancelled(dbd)
+        except RejectMessage as ex:
+            self.enqueue_reject(method.delivery_tag, requeue=ex.requeue)
+            return
+
+        # Wait for a handler process to become available (unless the
+        # background thread has gone away, in which case this message will
+        # never be acknowledged and we should just give up on it)
+        while not self._slots.acquire(timeout=1.0):
+            if not self.is_alive():
+                return
+
+        logger.debug(f"{routing_key}: {str(dbd)}")
+        start = time.monotonic()
+
+        def _done(results):
+            try:
+                self._summary.observe(time.monotonic() - start)
+                self.enqueue_results(self._route(results))
+                self.enqueue_ack(method.delivery_tag)
+                self.after_message(routing_key, dbd)
+            except RuntimeError:
+                # The background thread stopped while this message was being
+                # handled. It hasn't been acknowledged, so it'll come back
+                logger.debug("discarding results of an unacknowledged message")
+            except Exception as ex:
+                _failed(ex, release=False)
+            finally:
+                self._slots.release()
+
+        def _failed(ex, release=True):
+            # Treat an exception in a handler process just like one raised in
+            # this process: stop consuming, and let run_consumer raise it
+            self._pool_exception = ex
+            if release:
+                self._slots.release()
+            self.enqueue_stop()
+
+        self._pool.apply_async(
+                _pool_handle, (self._stage, routing_key, dbd),
+                callback=_done, error_callback=_failed)
+
+    def run_consumer(self):
+        super().run_consumer()
+        if self._pool_exception:
+            raise Exception("Handler process failed") from (
+                    self._pool_exception)
 
     def after_message(self, routing_key, body):
         # Check to see if we've met our quota and should restart
@@ -184,6 +291,20 @@ restarting = False
 @click.option('--queue-suffix', default=None,
               envvar='QUEUE_SUFFIX', type=str,
               help='suffix for queue(s) for the engine stage to read from/write to')
+@click.option('--batch-size', default=1,
+              envvar='BATCH_SIZE', type=click.IntRange(min=1),
+              help='acknowledge handled messages, and commit the messages'
+                   ' produced by them, in batches of at most COUNT (default: 1,'
+                   ' which disables batching)')
+@click.option('--batch-latency', default=100,
+              envvar='BATCH_LATENCY', type=click.IntRange(min=0),
+              help='commit a batch after at most MILLISECONDS, even if it'
+                   ' is not full (default: 100)')
+@click.option('--processes', default=1,
+              envvar='PROCESSES', type=click.IntRange(min=1),
+              help='handle messages in a pool of COUNT forked processes that'
+                   ' share this process\'s RabbitMQ connection (default: 1,'
+                   ' which handles messages in this process)')
 @click.argument('stage',
                 type=click.Choice(["explorer",
                                    "processor",
@@ -192,7 +313,8 @@ restarting = False
                                    "exporter",
                                    "worker"]))
 def main(enable_profiling, enable_rusage, enable_metrics,
-         prometheus_port, width, single_cpu, restart_after, queue_suffix, stage):
+         prometheus_port, width, single_cpu, restart_after, queue_suffix,
+         batch_size, batch_latency, processes, stage):
     debug.register_debug_signal()
     module = _module_mapping[stage]
     logger.info("starting pipeline", stage=stage)
@@ -203,7 +325,7 @@ def main(enable_profiling, enable_rusage, enable_metrics,
     if enable_metrics:
         i = Info(f"os2datascanner_pipeline_{stage}", "version number")
         i.info({"version": __version__})
-        start_http_server(prometheus_port)
+        metrics.enable(stage)
 
     if single_cpu:
         available_cpus = sorted(os.sched_getaffinity(0))
@@ -225,6 +347,28 @@ def main(enable_profiling, enable_rusage, enable_metrics,
     if queue_suffix:
         logger.info(f"Using dedicated queues with suffix: '{queue_suffix}'")
 
+    if batch_size > 1:
+        logger.info(f"Committing messages in batches of up to {batch_size}"
+                    f" (at most {batch_latency} ms apart)")
+
+    pool = None
+    if processes > 1:
+        logger.info(f"handling messages in {processes} processes")
+        _preload_datasets(stage)
+        # Fork the handler processes now, while this is the only thread (and
+        # after everything has been imported and configured). Nothing above
+        # this point starts a thread: the Prometheus server is only started
+        # below, and the Pika background thread only once the runner starts
+        # consuming
+        pool = multiprocessing.get_context("fork").Pool(
+                processes,
+                initializer=_pool_initialiser, initargs=(width,))
+
+    if enable_metrics:
+        # (The metrics server runs in a thread of its own, so it mustn't be
+        # started before the handler processes have been forked)
+        start_http_server(prometheus_port)
+
     try:
         with SourceManager(width=width) as source_manager:
             GenericRunner(
@@ -235,12 +379,26 @@ def main(enable_profiling, enable_rusage, enable_metrics,
                 queue_suffix=queue_suffix,
                 read=get_queues(module.READS_QUEUES, queue_suffix),
                 write=get_queues(module.WRITES_QUEUES, queue_suffix),
+                batch_size=batch_size,
+                batch_latency=batch_latency / 1000,
+                pool=pool,
+                processes=processes,
                 ).run_consumer()
 
+        if pool:
+            # Let the handler processes finish what they're doing and clean up
+            # after themselves
+            pool.close()
+            pool.join()
+            pool = None
+
         if restarting:
             logger.info(f"restarting after {restart_after} messages")
             restart_process()
     finally:
+        if pool:
+            pool.terminate()
+
         profiling.print_stats(pstats.SortKey.CUMULATIVE, silent=True)
 
         if enable_rusage:
@@ -6,6 +6,7 @@ import time
 import signal
 import threading
 import traceback
+from collections import deque
 from sortedcontainers import SortedList
 
 from ...utilities.backoff import ExponentialBackoffRetrier
@@ -259,21 +260,117 @@ class SynchronisationTimeoutError(RuntimeError):
 
 
 class PikaPipelineThread(threading.Thread, PikaPipelineRunner):
-    """Runs a Pika session in a background thread."""
+    """Runs a Pika session in a background thread.
 
-    def __init__(self, *args, exclusive=False, **kwargs):
+    The background thread blocks in Pika's I/O loop until either the broker
+    has something for it or the main thread enqueues a request, at which point
+    the main thread wakes it up with a thread-safe connection callback."""
+
+    idle_timeout = 1.0
+    """The longest time, in seconds, that the background thread will spend
+    waiting for I/O before checking its request queue again of its own accord.
+    (Enqueued requests wake the background thread up immediately; this is just
+    a safety net.)"""
+
+    def __init__(self, *args, exclusive=False,
+                 batch_size: int = 1, batch_latency: float = 0.1, **kwargs):
         super().__init__()
         PikaPipelineRunner.__init__(self, *args, **kwargs)
 
         self._incoming = SortedList(key=lambda e: -(e[1].priority or 0))
-        self._outgoing = []
+        self._outgoing = deque()
+        self._wakeup_pending = False
         self._live = None
         self._condition = threading.Condition()
         self._exclusive = exclusive
         self._default_basic_properties = dict(delivery_mode=2, content_encoding="gzip")
 
+        # Batching state. This is only touched by the background thread
+        self._batch_size = max(batch_size or 1, 1)
+        self._batch_latency = batch_latency
+        self._batch_started = None
+        self._deferred_acks = set()
+        self._settled = set()
+        self._settled_up_to = 0
+        if self.batching:
+            # The broker won't give us a full batch's worth of messages unless
+            # we're allowed to hold on to that many at once
+            self._prefetch_count = max(self._prefetch_count, self._batch_size)
+
         self._shutdown_exception = None
 
+    @property
+    def batching(self) -> bool:
+        """Indicates whether or not this PikaPipelineThread groups its
+        acknowledgements and publications into batches.
+
+        In batch mode, the channel is put into transactional mode. Outgoing
+        messages are published as soon as they're enqueued, but
+        acknowledgements are held back until either batch_size of them have
+        accumulated or batch_latency seconds have passed since the batch was
+        started; they're then sent as a single multiple=True acknowledgement
+        (wherever that's safe) and committed together with the messages.
+        Neither the messages nor the acknowledgements take effect until the
+        broker has confirmed the commit, so a message is never acknowledged
+        unless everything produced from it has been accepted."""
+        return self._batch_size > 1
+
+    def make_channel(self):
+        channel = super().make_channel()
+        if self.batching:
+            channel.tx_select()
+        return channel
+
+    def _mark_batch(self):
+        """(Background thread.) Notes that the current transaction contains
+        uncommitted work, starting the batch latency clock if necessary."""
+        if self._batch_started is None:
+            self._batch_started = time.monotonic()
+
+    def _batch_due(self) -> bool:
+        return self._batch_started is not None and (
+                len(self._deferred_acks) >= self._batch_size
+                or time.monotonic() - self._batch_started >= self._batch_latency)
+
+    def _flush_batch(self):
+        """(Background thread.) Sends all deferred acknowledgements and
+        commits the current transaction."""
+        if self._batch_started is None:
+            return
+
+        # Delivery tags are assigned sequentially per channel, so find the
+        # longest run of deliveries that have all been dealt with
+        bound = self._settled_up_to
+        while bound + 1 in self._settled:
+            bound += 1
+
+        # A multiple=True acknowledgement covers every outstanding delivery up
+        # to and including the given one, so we can only use it for that run;
+        # anything past it must be acknowledged individually
+        covered = [tag for tag in self._deferred_acks if tag <= bound]
+        if covered:
+            self.channel.basic_ack(max(covered), multiple=True)
+        for tag in sorted(self._deferred_acks):
+            if tag > bound:
+                self.channel.basic_ack(tag)
+        self.channel.tx_commit()
+
+        logger.trace(f"PikaPipelineThread - Thread TID: {self.native_id}"
+                     f" committed a batch of {len(self._deferred_acks)}"
+                     " acknowledgements.")
+        self._settled = {tag for tag in self._settled if tag > bound}
+        self._settled_up_to = bound
+        self._deferred_acks.clear()
+        self._batch_started = None
+
+    def _time_limit(self) -> float:
+        """(Background thread.) Returns the longest time that the background
+        thread can wait for I/O before it has to do something else."""
+        if self._batch_started is None:
+            return self.idle_timeout
+        remaining = self._batch_started + self._batch_latency - time.monotonic()
+        return max(min(remaining, self.idle_timeout), 0)
+
     def _enqueue(self, label: str, *args, check_live=True):
         """Enqueues a request for the background thread, optionally checking
         whether or not it's already finished.
@@ -289,6 +386,27 @@ class PikaPipelineThread(threading.Thread, PikaPipelineRunner):
             logger.trace(f"PikaPipelineThread - Thread TID: {self.native_id} "
                          "acquired conditional and enqueued outgoing message.")
             self._outgoing.append((label, *args))
+            # Only one wakeup needs to be in flight at a time: the background
+            # thread drains the whole request queue when it wakes up
+            wake, self._wakeup_pending = not self._wakeup_pending, True
+        if wake:
+            self._wake()
+
+    def _wake(self):
+        """Interrupts the background thread's wait for I/O so that it'll
+        process its request queue straight away.
+
+        If there's no connection yet, then there's nothing to interrupt: the
+        background thread will check its request queue as soon as it's
+        connected."""
+        connection = self._connection
+        if connection is not None and threading.current_thread() != self:
+            try:
+                connection.add_callback_threadsafe(lambda: None)
+            except pika.exceptions.ConnectionWrongStateError:
+                # The connection is going away; the background thread will
+                # notice that soon enough on its own
+                pass
 
     def enqueue_ack(self, delivery_tag: int):
         """Requests that the background thread acknowledge receipt of the
@@ -387,6 +505,24 @@ class PikaPipelineThread(threading.Thread, PikaPipelineRunner):
                      " done sleeping. Got a message.")
         return method, properties, body
 
+    def await_batch(self, first) -> list[tuple]:
+        """Returns a list of messages, in the form returned by await_message,
+        to be handled together: the given message, followed by any others
+        that arrive within batch_latency seconds (up to batch_size messages in
+        total).
+
+        This is useful for subclasses whose dispatch_message can do its work
+        more efficiently for several messages at once."""
+        batch = [first]
+        deadline = time.monotonic() + self._batch_latency
+        while len(batch) < self._batch_size:
+            method, properties, body = self.await_message(
+                    timeout=max(deadline - time.monotonic(), 0))
+            if method is None:
+                break
+            batch.append((method, properties, body))
+        return batch
+
     def handle_message(self, routing_key, body) -> HandleMessageType:
         """Handles an AMQP message by yielding zero or more (routing key,
         JSON-serialisable object) pairs to be sent as new messages.
@@ -401,6 +537,38 @@ class PikaPipelineThread(threading.Thread, PikaPipelineRunner):
 
         The default implementation of this method does nothing."""
 
+    def enqueue_results(self, results):
+        """Requests that the background thread send all of the messages
+        produced by a call to handle_message."""
+        for msg in results:
+            match msg:
+                case (routing_key, message, exchange, headers):
+                    self.enqueue_message(routing_key,
+                                         message,
+                                         exchange=exchange,
+                                         **headers)
+                case (routing_key, message):
+                    self.enqueue_message(routing_key, message)
+
+    def dispatch_message(self, method, properties, body):
+        """Handles a message returned by await_message, enqueueing the
+        resulting messages and then either an acknowledgement or a rejection.
+
+        The default implementation of this method calls handle_message and
+        after_message on the current thread. Subclasses can override it to
+        hand messages off elsewhere, as long as every message they accept is
+        eventually acknowledged or rejected."""
+        try:
+            key = method.routing_key
+            dbd = json_utf8_decode(body)
+
+            self.enqueue_results(self.handle_message(key, dbd))
+
+            self.enqueue_ack(method.delivery_tag)
+            self.after_message(key, dbd)
+        except RejectMessage as ex:
+            self.enqueue_reject(method.delivery_tag, requeue=ex.requeue)
+
     def handle_message_raw(self, channel, method, properties, body):
         """(Background thread.) Collects a message and stores it for later
         retrieval by the main thread."""
@@ -425,9 +593,10 @@ class PikaPipelineThread(threading.Thread, PikaPipelineRunner):
             running = True
             while running:
                 with self._condition:
+                    self._wakeup_pending = False
                     # Process all of the enqueued actions
                     while self._outgoing:
-                        head = self._outgoing.pop(0)
+                        head = self._outgoing.popleft()
                         logger.trace("PikaPipelineThread - Thread TID:"
                                      f" {self.native_id} got the conditional."
                                      " Processing outgoing message.")
@@ -438,25 +607,46 @@ class PikaPipelineThread(threading.Thread, PikaPipelineRunner):
                                         routing_key=routing_key,
                                         properties=pika.BasicProperties(**props),
                                         body=body)
+                                if self.batching:
+                                    self._mark_batch()
+                            case ("ack", delivery_tag) if self.batching:
+                                self._deferred_acks.add(delivery_tag)
+                                self._settled.add(delivery_tag)
+                                self._mark_batch()
                             case ("ack", delivery_tag):
                                 self.channel.basic_ack(delivery_tag)
+                            case ("rej", delivery_tag, requeue) if self.batching:
+                                # Rejections are rare; just get them out of
+                                # the way straight away
+                                self._flush_batch()
+                                self.channel.basic_reject(
+                                        delivery_tag, requeue=requeue)
+                                self.channel.tx_commit()
+                                self._settled.add(delivery_tag)
                             case ("rej", delivery_tag, requeue):
                                 self.channel.basic_reject(
                                         delivery_tag, requeue=requeue)
                             case ("fin",):
+                                self._flush_batch()
                                 running = False
                                 break
                             case ("syn", ev):
+                                self._flush_batch()
                                 ev.set()
                             case ("zzz", duration):
                                 time.sleep(duration)
 
+                    if running and self._batch_due():
+                        self._flush_batch()
+
+                if not running:
+                    break
+
                 # Dispatch any waiting timer (heartbeats) and channel (calls to
-                # our handle_message_raw method) callbacks...
-                self.connection.process_data_events(0)
-                # ... and then sleep for a moment to avoid overburdening the
-                # system
-                time.sleep(0.1)
+                # our handle_message_raw method) callbacks, blocking until
+                # either the broker sends us something or the main thread
+                # wakes us up with a new request
+                self.connection.process_data_events(self._time_limit())
         except BaseException as ex:
             if isinstance(ex, (
                     pika.exceptions.ChannelClosed,
@@ -481,7 +671,11 @@ class PikaPipelineThread(threading.Thread, PikaPipelineRunner):
     def run_consumer(self):  # noqa: CCR001, E501 too high cognitive complexity
         """Receives messages from the registered input queues, dispatches them
         to the handle_message function, and generates new output messages. All
-        Pika API calls are performed by the background thread."""
+        Pika API calls are performed by the background thread.
+
+        (In batch mode, the acknowledgements enqueued by this method are only
+        sent to the broker when the background thread commits a batch; see the
+        batching property for details.)"""
 
         if threading.main_thread() != threading.current_thread():
             raise ValueError(
@@ -509,24 +703,7 @@ class PikaPipelineThread(threading.Thread, PikaPipelineRunner):
                 method, properties, body = self.await_message(timeout=30.0)
                 if method == properties == body is None:
                     continue
-                try:
-                    key = method.routing_key
-                    dbd = json_utf8_decode(body)
-
-                    for msg in self.handle_message(key, dbd):
-                        match msg:
-                            case (routing_key, message, exchange, headers):
-                                self.enqueue_message(routing_key,
-                                                     message,
-                                                     exchange=exchange,
-                                                     **headers)
-                            case (routing_key, message):
-                                self.enqueue_message(routing_key, message)
-
-                    self.enqueue_ack(method.delivery_tag)
-                    self.after_message(key, dbd)
-                except RejectMessage as ex:
-                    self.enqueue_reject(method.delivery_tag, requeue=ex.requeue)
+                self.dispatch_message(method, properties, body)
         finally:
             self.enqueue_stop()
             self.join()
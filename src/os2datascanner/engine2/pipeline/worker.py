@@ -1,5 +1,6 @@
 import structlog
 
+from .. import settings
 from ..utilities.backoff import TimeoutRetrier
 from .explorer import message_received_raw as explorer_handler
 from .processor import message_received_raw as processor_handler
@@ -17,7 +18,10 @@ WRITES_QUEUES = (
     "os2ds_checkups",
     "os2ds_problems",
     "os2ds_metadata",
-    "os2ds_status",)
+    "os2ds_status",
+    # Only used for derived Sources too big to be handled in one go
+    "os2ds_scan_specs",
+    "os2ds_conversions",)
 PROMETHEUS_DESCRIPTION = "Messages handled by worker"
 # Let the Pika background thread aggressively collect tasks. Workers should
 # always be doing something -- every centisecond of RabbitMQ overhead is time
@@ -25,10 +29,67 @@ PROMETHEUS_DESCRIPTION = "Messages handled by worker"
 PREFETCH_COUNT = 8
 
 
-def explore(sm, msg, *, check=True):
+def _container_size(sm, msg):
+    """Returns the size of the object behind the derived Source in the given
+    scan specification, or None if that can't be worked out."""
+    try:
+        handle = messages.ScanSpecMessage.from_json_object(msg).source.handle
+        return handle.follow(sm).get_size() if handle else None
+    except Exception:
+        return None
+
+
+def expand(sm, msg):
+    """Explores a derived Source produced by the processor (for example, the
+    members of a Zip file or the pages of a PDF document).
+
+    Small derived Sources are expanded in this process, sharing the parent
+    object's state in the SourceManager. Objects bigger than the configured
+    size limit are instead sent back to the os2ds_scan_specs queue for an
+    explorer to deal with, and objects with more than the configured number of
+    children have their remaining children sent to the os2ds_conversions
+    queue so that other workers can help out."""
+    policy = settings.pipeline["worker"]
+    max_size = policy["inline_max_size"]
+    max_children = policy["inline_max_children"]
+
+    if max_size and (size := _container_size(sm, msg)) and size > max_size:
+        logger.debug(
+                "offloading large derived source", size=size)
+        # The explorer will count this Source as explored when it's done with
+        # it, so announce it as a new one now, just as an explorer would
+        yield ("os2ds_status", messages.StatusMessage(
+                scan_tag=messages.ScanTagFragment.from_json_object(
+                        msg["scan_tag"]),
+                new_sources=1).to_json_object())
+        yield ("os2ds_scan_specs", msg)
+        return
+
+    yield from explore(sm, msg, check=False, max_children=max_children)
+
+
+def explore(sm, msg, *, check=True, max_children=None):
+    children = 0
+    offloaded = 0
     for channel, message in explorer_handler(msg, "os2ds_scan_specs", sm):
-        if channel == "os2ds_conversions":
+        if channel == "os2ds_conversions" and (
+                max_children and children >= max_children):
+            # We've spent long enough on this Source; let someone else
+            # process the rest of its children
+            yield (channel, message)
+            offloaded += 1
+        elif channel == "os2ds_conversions":
+            children += 1
             yield from process(sm, message, check=check)
+        elif channel == "os2ds_status" and offloaded:
+            # The offloaded children will each produce a status message of
+            # their own, so they must be included in the object count. This
+            # message also counts as the exploration of a Source that no
+            # explorer announced, so announce it here
+            yield (channel, message | {
+                "total_objects": offloaded,
+                "new_sources": (message.get("new_sources") or 0) + 1,
+            })
         elif channel == "os2ds_scan_specs":
             # Huh? Surely a standalone explorer should have handled this
             logger.warning("worker exploring unexpected nested Source")
@@ -52,7 +113,7 @@ def process(sm, msg, *, check=True):
         elif channel == "os2ds_scan_specs":
             # Processing this object has given us a new source to scan. Make
             # sure we don't call Resource.check() on the objects under it
-            yield from explore(sm, message, check=False)
+            yield from expand(sm, message)
         else:
             yield channel, message
 
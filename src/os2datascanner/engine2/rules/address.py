@@ -94,11 +94,9 @@ class AddressRule(SimpleRule):
 
     def _load_datasets(self):
         if self.street_names is None:
-            # Convert list of str to upper case and to sets for efficient
-            # lookup
-            self.street_names = set(map(str.upper,
-                                        common_loader.load_dataset(
-                                            "addresses", "da_addresses")))
+            # (The word set is shared by every AddressRule in this process)
+            self.street_names = common_loader.word_set(
+                    "addresses", "da_addresses", case="upper")
 
     @property
     def presentation_raw(self):
@@ -37,6 +37,16 @@ _symbols = ("!", "#", "%", )
 _all_symbols = _operators + _symbols
 # fmt: on
 
+# Splits text into two capture groups: (word, symbol)
+# Ex: 'The brown, fox' ->
+# [('The', ''), ('brown', ''), ('', ','), ('fox', '')]
+_word_or_symbol = re.compile(r"(\w+(?:[-\./]\w*)*)|([^\w\s\.\"])")
+
+# Blacklist searches look at this many characters at a time, plus enough of
+# the next chunk to catch blacklisted words that straddle the boundary
+_blacklist_chunk = 1 << 20
+_blacklist_overlap = 256
+
 
 @dataclass
 class WordOrSymbol:
@@ -122,20 +132,18 @@ class CPRRule(RegexRule):
             return
 
         if self._examine_context and self._blacklist:
-            if (m := self._blacklist_pattern.search(content.lower())):
+            if (m := self._search_blacklist(content)):
                 logger.debug("Blacklist matched content", matches=m.group(0))
                 return
 
-        def _probability(match: Match[str]):
+        def _probability(match: Match[str], cpr: str):
             """Given a match, calculates probability of being a cpr number,
              by using the relevant probability calculations."""
-            cpr = match_to_cpr(match)
-
             probability = 1.0
             if self._ignore_irrelevant:
                 probability = calculator.cpr_check(cpr, do_mod11_check=self._modulus_11)
                 if isinstance(probability, str):
-                    logger.debug(f"{cpr} is not valid cpr due to {probability}")
+                    logger.debug("not a valid cpr", cpr=cpr, reason=probability)
                     return False
 
             #cpr = cpr[0:4] + "XXXXXX"
@@ -146,14 +154,15 @@ class CPRRule(RegexRule):
                 # determine if probability stems from context or calculator
                 probability = p if p is not None else probability
                 ctype = ctype if ctype != [] else Context.PROBABILITY_CALC
-                logger.debug(f"{cpr} with probability {probability} from context "
-                             f"due to {ctype}")
+                logger.debug("probability from context", cpr=cpr,
+                             probability=probability, ctype=ctype)
 
             return probability
 
-        def _is_cpr(candidate: Match[str]):
+        def _verdict(candidate: Match[str]):
             """Given a match, checks expections, modulus 11 check and calculates probability,
-             to determine if it is a cpr number."""
+             to determine if it is a cpr number. Returns the probability if it is, and
+             False otherwise."""
             cpr = match_to_cpr(candidate)
 
             if cpr in self._exceptions:
@@ -162,14 +171,21 @@ class CPRRule(RegexRule):
             if self._modulus_11:
                 mod11, reason = modulus11_check(cpr)
                 if not mod11:
-                    logger.debug(f"{cpr} failed modulus11 check due to {reason}")
+                    logger.debug("failed modulus11 check", cpr=cpr, reason=reason)
                     return False
 
-            return True if _probability(candidate) else False
+            return _probability(candidate, cpr) or False
 
-        numbers = [m for m in self._compiled_expression.finditer(content)]
-
-        cpr_numbers = [m for m in numbers if _is_cpr(m)]
+        # Work out every candidate's verdict exactly once, remembering the
+        # probabilities of the accepted ones by their (unique) offsets
+        numbers = []
+        cpr_numbers = []
+        probabilities = {}
+        for m in self._compiled_expression.finditer(content):
+            numbers.append(m)
+            if (probability := _verdict(m)):
+                cpr_numbers.append(m)
+                probabilities[m.start()] = probability
 
         if self._examine_context:
             cpr_numbers = cpr_bin_check(numbers, cpr_numbers)
@@ -187,9 +203,20 @@ class CPRRule(RegexRule):
                     self.sensitivity.value if self.sensitivity
                     else self.sensitivity
                 ),
-                "probability": _probability(m),
+                "probability": probabilities[m.start()],
             }
 
+    def _search_blacklist(self, content: str) -> Optional[Match[str]]:
+        """Searches the content for blacklisted words, ignoring case. (The
+        content is lowercased a chunk at a time instead of all at once, which
+        is much faster than a case-insensitive search and doesn't copy the
+        whole thing.)"""
+        for start in range(0, len(content), _blacklist_chunk):
+            chunk = content[start:start + _blacklist_chunk + _blacklist_overlap]
+            if (m := self._blacklist_pattern.search(chunk.lower())):
+                return m
+        return None
+
     def examine_context(  # noqa: CCR001, C901 too high cognitive complexity
         self, match: Match[str]
     ) -> Tuple[Optional[float], List[tuple]]:
@@ -279,14 +306,8 @@ class CPRRule(RegexRule):
         pre = " ".join(content[max(low-50, 0):low].split()[-n_words:])
         post = " ".join(content[high:high+50].split()[:n_words])
 
-        word_regex = r"(\w+(?:[-\./]\w*)*)"
-        symbol_regex = r"([^\w\s\.\"])"
-        # split in two capture groups: (word, symbol)
-        # Ex: 'The brown, fox' ->
-        # [('The', ''), ('brown', ''), ('', ','), ('fox', '')]
-        split_str = r"|".join([word_regex, symbol_regex])
-        pre_res = re.findall(split_str, pre)
-        post_res = re.findall(split_str, post)
+        pre_res = _word_or_symbol.findall(pre)
+        post_res = _word_or_symbol.findall(post)
         # remove empty strings
         pre_words = [WordOrSymbol(*s) for s in pre_res]
         post_words = [WordOrSymbol(*s) for s in post_res]
@@ -1,5 +1,11 @@
+import sys
 import json
 import pathlib
+import threading
+from typing import Collection, Iterator
+
+from ... import settings
+from .wordset import MappedWordSet, word_set_path
 
 
 class LoaderError(Exception):
@@ -13,9 +19,29 @@ class DatasetNotFoundError(LoaderError):
 _HERE = pathlib.Path(__file__).parent
 
 
+_CASES = {
+    None: str,
+    "upper": str.upper,
+    "lower": str.lower,
+}
+
+
+# The word sets used by the built-in rules. Pipeline stages that evaluate rules
+# load these before forking, so that their handler processes can share them
+RULE_WORD_SETS = (
+    ("names", "da_20140101_dst_fornavne-mænd", "upper"),
+    ("names", "da_20140101_dst_fornavne-kvinder", "upper"),
+    ("names", "da_20140101_dst_efternavne", "upper"),
+    ("addresses", "da_addresses", "upper"),
+    ("wordlists", "da_20211018_laegehaandbog_stikord", "lower"),
+)
+
+
 class Loader:
     def __init__(self, *categories):
         self._datasets = {}
+        self._word_sets = {}
+        self._lock = threading.Lock()
 
         for c in categories:
             self.load_category(c)
@@ -33,6 +59,15 @@ class Loader:
         cat = self.get_category(category)
         return cat.get(dataset) if cat else None
 
+    def available_datasets(self) -> Iterator[tuple[str, str]]:
+        """Yields a (category, dataset) pair for every bundled dataset,
+        whether or not it has been loaded."""
+        for folder in sorted(_HERE.iterdir()):
+            if folder.is_dir() and not folder.name.startswith("_"):
+                for f in sorted(folder.iterdir()):
+                    if f.is_file() and f.name.endswith(".jsonl"):
+                        yield folder.name, f.stem
+
     def load_category(self, category):
         try:
             category_folder = _HERE.joinpath(category)
@@ -42,18 +77,74 @@ class Loader:
         except FileNotFoundError:
             raise DatasetNotFoundError(category, None)
 
-    def load_dataset(self, category, dataset):
+    def _read_dataset(self, category, dataset):
         try:
             dataset_file = _HERE.joinpath(category, dataset + ".jsonl")
-            entries = []
             with dataset_file.open("rt") as f:
                 for line in f:
                     if not line.startswith("#"):
-                        entries.append(json.loads(line))
-            self._datasets.setdefault(category, {})[dataset] = entries
-            return entries
+                        yield json.loads(line)
         except FileNotFoundError:
             raise DatasetNotFoundError(category, dataset)
 
+    def load_dataset(self, category, dataset):
+        """Returns the entries of a dataset as a list, reading it only if it
+        hasn't already been loaded."""
+        entries = self.get_dataset(category, dataset)
+        if entries is None:
+            entries = list(self._read_dataset(category, dataset))
+            self._datasets.setdefault(category, {})[dataset] = entries
+        return entries
+
+    def words(self, category, dataset, *, case=None) -> Iterator[str]:
+        """Yields the entries of a dataset as strings, normalised to the
+        given case ("upper", "lower", or None to leave them as they are). If
+        the dataset contains structured data, it is flattened."""
+        normalise = _CASES[case]
+
+        def _flatten(elem):
+            match elem:
+                case list():
+                    for e in elem:
+                        yield from _flatten(e)
+                case _:
+                    yield normalise(str(elem))
+
+        for entry in self._read_dataset(category, dataset):
+            yield from _flatten(entry)
+
+    def word_set(self, category, dataset, *, case=None) -> Collection[str]:
+        """Returns the words of a dataset, normalised to the given case, as a
+        frozen collection suitable for membership tests.
+
+        Each word set is built only once in the lifetime of this Loader, so
+        rules can call this every time they're constructed. If the
+        rules.datasets.prebuilt_directory setting names a directory that
+        contains a word set file for this dataset, that file is memory-mapped
+        (see the wordset module); otherwise, the dataset is read into a
+        frozenset of interned strings."""
+        key = (category, dataset, case)
+        if (words := self._word_sets.get(key)) is None:
+            with self._lock:
+                if (words := self._word_sets.get(key)) is None:
+                    words = self._word_sets[key] = self._make_word_set(
+                            category, dataset, case)
+        return words
+
+    def _make_word_set(self, category, dataset, case):
+        if (directory := settings.rules["datasets"]["prebuilt_directory"]):
+            path = word_set_path(directory, category, dataset, case)
+            if path.is_file():
+                return MappedWordSet(path)
+        return frozenset(
+                sys.intern(w)
+                for w in self.words(category, dataset, case=case))
+
+    def preload(self, keys=RULE_WORD_SETS):
+        """Builds the word sets identified by the given (category, dataset,
+        case) triples."""
+        for category, dataset, case in keys:
+            self.word_set(category, dataset, case=case)
+
 
 common = Loader()
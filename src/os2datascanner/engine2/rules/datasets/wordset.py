@@ -0,0 +1,143 @@
+"""A compact, read-only file format for the word sets built from datasets.
+
+A word set file contains the UTF-8 encodings of a set of words, sorted and
+packed end to end, preceded by a table of their offsets:
+
+    magic (8 bytes) | count (uint32) | offsets ((count + 1) * uint32) | words
+
+(All integers are little-endian.) MappedWordSet memory-maps such a file and
+looks words up in it by binary search, so every process on a machine that
+uses the same file shares a single copy of it in the page cache.
+
+Run this module to build the word set files for all of the bundled datasets:
+
+    python -m os2datascanner.engine2.rules.datasets.wordset DIRECTORY"""
+
+import os
+import sys
+import mmap
+import struct
+import bisect
+import argparse
+from pathlib import Path
+from typing import Iterable, Iterator
+
+
+MAGIC = b"OS2DSWS1"
+_HEADER = struct.Struct("<8sI")
+_OFFSET = struct.Struct("<I")
+
+# The cases that the word set files built by main() are normalised to
+CASES = ("upper", "lower",)
+
+
+def word_set_path(directory, category, dataset, case) -> Path:
+    """Returns the path at which the word set file for the given dataset,
+    normalised to the given case, should be stored in the given directory."""
+    return Path(directory).joinpath(category, f"{dataset}.{case}.wordset")
+
+
+def write_word_set(path, words: Iterable[str]):
+    """Writes the given words to a new word set file at the given path."""
+    encoded = sorted(set(w.encode("utf-8") for w in words))
+    offsets = [0]
+    for word in encoded:
+        offsets.append(offsets[-1] + len(word))
+
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # Write to a temporary file first, so that a process that maps the file
+    # never sees a half-written one
+    temporary = path.with_name(path.name + ".tmp")
+    with temporary.open("wb") as fp:
+        fp.write(_HEADER.pack(MAGIC, len(encoded)))
+        fp.write(struct.pack(f"<{len(offsets)}I", *offsets))
+        for word in encoded:
+            fp.write(word)
+    os.replace(temporary, path)
+
+
+class _Entries:
+    """A read-only sequence view of the encoded words in a word set file,
+    suitable for use with the bisect module."""
+
+    def __init__(self, buf, count):
+        self._buf = buf
+        self._count = count
+        self._data = _HEADER.size + (count + 1) * _OFFSET.size
+
+    def __len__(self):
+        return self._count
+
+    def __getitem__(self, index):
+        if not 0 <= index < self._count:
+            raise IndexError(index)
+        position = _HEADER.size + index * _OFFSET.size
+        start, = _OFFSET.unpack_from(self._buf, position)
+        end, = _OFFSET.unpack_from(self._buf, position + _OFFSET.size)
+        return self._buf[self._data + start:self._data + end]
+
+
+class MappedWordSet:
+    """A MappedWordSet is a frozen set of words backed by a memory-mapped word
+    set file. It supports membership tests, iteration and len(), just as a
+    frozenset of strings would."""
+
+    def __init__(self, path):
+        self._path = str(path)
+        with open(path, "rb") as fp:
+            self._mmap = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            magic, count = _HEADER.unpack_from(self._mmap)
+        except struct.error:
+            magic = count = None
+        if magic != MAGIC:
+            self._mmap.close()
+            raise ValueError(f"{self._path} is not a word set file")
+        self._entries = _Entries(self._mmap, count)
+
+    def __contains__(self, word):
+        if not isinstance(word, str):
+            return False
+        encoded = word.encode("utf-8")
+        # UTF-8 preserves the order of code points, so the encoded words can
+        # be searched without decoding them
+        index = bisect.bisect_left(self._entries, encoded)
+        return (index < len(self._entries)
+                and self._entries[index] == encoded)
+
+    def __iter__(self) -> Iterator[str]:
+        for i in range(len(self._entries)):
+            yield self._entries[i].decode("utf-8")
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __repr__(self):
+        return f"MappedWordSet({self._path!r})"
+
+
+def main(argv=None):
+    # (Imported here to avoid a circular import: the loader uses this module)
+    from .loader import Loader
+
+    parser = argparse.ArgumentParser(
+            description="Builds the word set files for the bundled datasets,"
+                        " for use as the engine's"
+                        " rules.datasets.prebuilt_directory setting.")
+    parser.add_argument(
+            "directory",
+            help="the directory in which to store the word set files")
+    args = parser.parse_args(argv)
+
+    loader = Loader()
+    for category, dataset in loader.available_datasets():
+        for case in CASES:
+            path = word_set_path(args.directory, category, dataset, case)
+            write_word_set(path, loader.words(category, dataset, case=case))
+            print(path)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
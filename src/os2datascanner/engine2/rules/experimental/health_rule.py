@@ -1,4 +1,5 @@
 import structlog
+from functools import cache
 from typing import Iterator, Optional
 
 from ...conversions.types import OutputType
@@ -9,6 +10,14 @@ from os2ds_rules.wordlist_rule import WordListRule
 logger = structlog.get_logger("engine2")
 
 
+@cache
+def _get_word_list_rule() -> WordListRule:
+    """Returns the WordListRule shared by every TurboHealthRule in this
+    process."""
+    return WordListRule(sorted(common_loader.word_set(
+            "wordlists", "da_20211018_laegehaandbog_stikord", case="lower")))
+
+
 class TurboHealthRule(SimpleRule):
     """
     This rule searches for health-terms based on a revised version
@@ -23,8 +32,7 @@ class TurboHealthRule(SimpleRule):
 
     def __init__(self, **super_kwargs):
         super().__init__(**super_kwargs)
-        dataset = common_loader.load_dataset("wordlists", "da_20211018_laegehaandbog_stikord")
-        self._rule = WordListRule([str.lower(word) for word in dataset])
+        self._rule = _get_word_list_rule()
 
     def match(self, content: str) -> Optional[Iterator[dict]]:
         if not content:
@@ -1,13 +1,19 @@
 from typing import List
+from time import monotonic
+from threading import Lock
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from ..conversions.types import Link, OutputType
 from .rule import Rule, SimpleRule, Sensitivity
 from .. import settings as engine2_settings
 
 import requests
+from requests.adapters import HTTPAdapter
 from requests.exceptions import RequestException
 
 
 TIMEOUT = engine2_settings.model["http"]["timeout"]
+LINKS = engine2_settings.model["http"]["links"]
 
 
 class LinksFollowRule(SimpleRule):
@@ -25,8 +31,8 @@ class LinksFollowRule(SimpleRule):
         if links is None:
             return
 
-        for link in links:
-            followable, status_code = check(link)
+        for link, (followable, status_code) in zip(
+                links, check_all(links)):
             if not followable:
                 context = f"Unable to follow link. Error code: {status_code}."
                 if link.link_text is not None:
@@ -59,6 +65,58 @@ class LinksFollowRule(SimpleRule):
 __HEADERS = {"Range": "bytes=0-1"}
 
 
+class _LinkStatusCache:
+    """A _LinkStatusCache remembers, for a limited period of time, the result
+    of checking a link, so that links that appear on many pages (in headers,
+    footers and menus, for example) are only checked once in a while."""
+
+    def __init__(self, ttl: float, size: int):
+        self._ttl = ttl
+        self._size = size
+        self._entries = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, url: str):
+        with self._lock:
+            match self._entries.get(url):
+                case (expires, result) if expires > monotonic():
+                    self._entries.move_to_end(url)
+                    return result
+                case None:
+                    return None
+                case _:
+                    del self._entries[url]
+                    return None
+
+    def put(self, url: str, result: tuple[bool, int]):
+        with self._lock:
+            self._entries[url] = (monotonic() + self._ttl, result)
+            self._entries.move_to_end(url)
+            while len(self._entries) > self._size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+_cache = _LinkStatusCache(LINKS["cache_ttl"], LINKS["cache_size"])
+_session = None
+
+
+def _get_session() -> requests.Session:
+    global _session
+    if _session is None:
+        # Keep enough connections to each host open for every one of our
+        # checking threads to use
+        adapter = HTTPAdapter(
+                pool_connections=LINKS["workers"], pool_maxsize=LINKS["workers"])
+        _session = requests.Session()
+        _session.mount("http://", adapter)
+        _session.mount("https://", adapter)
+    return _session
+
+
 def check(link: Link) -> tuple[bool, int]:
     """return True if link can be followed and the final response is less than 400
 
@@ -66,9 +124,40 @@ def check(link: Link) -> tuple[bool, int]:
 
     """
 
-    r = requests.get(link.url, allow_redirects=True, timeout=TIMEOUT, headers=__HEADERS)
-    try:
-        r.raise_for_status()
-        return True, r.status_code
-    except RequestException:
-        return r.status_code not in (404, 410, 421, 423, 451), r.status_code
+    with _get_session().get(
+            link.url, allow_redirects=True, timeout=TIMEOUT,
+            headers=__HEADERS, stream=True) as r:
+        try:
+            r.raise_for_status()
+            return True, r.status_code
+        except RequestException:
+            return r.status_code not in (404, 410, 421, 423, 451), r.status_code
+
+
+def _check_cached(url: str) -> tuple[bool, int]:
+    if (result := _cache.get(url)) is None:
+        result = check(Link(url, link_text=None))
+        _cache.put(url, result)
+    return result
+
+
+def check_all(links: List[Link]) -> List[tuple[bool, int]]:
+    """Checks a list of links, returning the result of check() for each of
+    them in order.
+
+    Results are reused across calls for a while (see the model.http.links
+    settings), each distinct link is only checked once, and links that need
+    to be checked are checked concurrently."""
+    urls = list(dict.fromkeys(link.url for link in links))
+    results = {url: result for url in urls
+               if (result := _cache.get(url)) is not None}
+    unchecked = [url for url in urls if url not in results]
+
+    if len(unchecked) == 1:
+        results[unchecked[0]] = _check_cached(unchecked[0])
+    elif unchecked:
+        with ThreadPoolExecutor(
+                max_workers=min(LINKS["workers"], len(unchecked))) as pool:
+            results |= zip(unchecked, pool.map(_check_cached, unchecked))
+
+    return [results[link.url] for link in links]
@@ -1,4 +1,5 @@
 import regex
+from typing import Collection
 
 from ..conversions.types import OutputType
 from .rule import Rule, SimpleRule, Sensitivity
@@ -74,7 +75,6 @@ class NameRule(SimpleRule):
             **super_kwargs):
         super().__init__(**super_kwargs)
 
-        # Convert list of str to upper case and to sets for efficient lookup
         self.last_names = None
         self.first_names = None
 
@@ -88,21 +88,16 @@ class NameRule(SimpleRule):
 
     def _load_datasets(self):
         if self.first_names is None:
-            # Convert list of str to upper case and to sets for efficient
-            # lookup
-            m = set(map(str.upper,
-                    common_loader.load_dataset(
-                            "names", "da_20140101_dst_fornavne-mænd")))
-            k = set(map(str.upper,
-                    common_loader.load_dataset(
-                            "names", "da_20140101_dst_fornavne-kvinder")))
-            e = set(map(str.upper,
-                    common_loader.load_dataset(
-                            "names", "da_20140101_dst_efternavne")))
-            f = m.union(k)
-
-            self.last_names = e
-            self.first_names = f
+            # The word sets are shared by every NameRule in this process;
+            # the first names are kept as a tuple of sets rather than being
+            # merged into a new one
+            self.first_names = tuple(
+                    common_loader.word_set("names", dataset, case="upper")
+                    for dataset in (
+                            "da_20140101_dst_fornavne-mænd",
+                            "da_20140101_dst_fornavne-kvinder",))
+            self.last_names = common_loader.word_set(
+                    "names", "da_20140101_dst_efternavne", case="upper")
 
     def match(self, text):  # noqa: CCR001, too high cognitive complexity
         self._load_datasets()
@@ -110,7 +105,7 @@ class NameRule(SimpleRule):
 
         def is_name_component(
                 component: str,
-                *candidate_sets: set[str]):
+                *candidate_sets: Collection[str]):
             component = component.upper()
             if component in self._blacklist:
                 return True
@@ -126,19 +121,19 @@ class NameRule(SimpleRule):
             last_name = last_name or ""
 
             # Match each name against the list of first and last names
-            first_match = is_name_component(first_name, self.first_names)
+            first_match = is_name_component(first_name, *self.first_names)
             last_match = is_name_component(last_name, self.last_names)
             middle_match = any(
-                is_name_component(n, self.first_names, self.last_names)
+                is_name_component(n, *self.first_names, self.last_names)
                 for n in middle_names
             )
             # But what if the name is Word Firstname Lastname?
             while middle_match and not first_match:
                 old_name = first_name
                 first_name = middle_names.pop(0)
-                first_match = is_name_component(first_name, self.first_names)
+                first_match = is_name_component(first_name, *self.first_names)
                 middle_match = any(
-                    is_name_component(n, self.first_names, self.last_names)
+                    is_name_component(n, *self.first_names, self.last_names)
                     for n in middle_names
                 )
                 matched_text = matched_text.lstrip(old_name)
@@ -149,7 +144,7 @@ class NameRule(SimpleRule):
                 last_name = middle_names.pop()
                 last_match = is_name_component(last_name, self.last_names)
                 middle_match = any(
-                    is_name_component(n, self.first_names, self.last_names)
+                    is_name_component(n, *self.first_names, self.last_names)
                     for n in middle_names
                 )
                 matched_text = matched_text.rstrip(old_name)
@@ -201,7 +196,7 @@ class NameRule(SimpleRule):
             for m in it:
                 matched = m.group(0)
                 if is_name_component(
-                        matched.upper(), self.first_names, self.last_names):
+                        matched.upper(), *self.first_names, self.last_names):
                     yield {
                         "match": matched,
                         "probability": 0.1,
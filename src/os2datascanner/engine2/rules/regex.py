@@ -3,6 +3,7 @@ from typing import Iterator, Optional
 
 from ..conversions.types import OutputType
 from .rule import Rule, SimpleRule, Sensitivity
+from .utilities.analysis import compute_required_literal
 from .utilities.context import make_context
 from .utilities.properties import RulePrecedence, RuleProperties
 
@@ -19,6 +20,7 @@ class RegexRule(SimpleRule):
         super().__init__(**super_kwargs)
         self._expression = expression
         self._compiled_expression = re.compile(expression)
+        self._required_literal = compute_required_literal(expression)
 
     @property
     def presentation_raw(self) -> str:
@@ -27,6 +29,11 @@ class RegexRule(SimpleRule):
     def match(self, content: str) -> Optional[Iterator[dict]]:
         if content is None:
             return
+        elif (self._required_literal
+                and self._required_literal not in content):
+            # This expression can't possibly match, so don't bother scanning
+            # the content with it
+            return
 
         for match in self._compiled_expression.finditer(content):
             low, high = match.span()
@@ -6,6 +6,7 @@ from itertools import islice
 
 from .utilities.properties import RulePrecedence, RuleProperties
 from ..utilities.json import JSONSerialisable
+from ..utilities import metrics
 from ..utilities.equality import TypePropertyEquality
 from ..conversions.types import OutputType
 
@@ -49,6 +50,10 @@ sensitivity_labels = {
 }
 
 
+def _collect_matches(rule, representation, obj_limit):
+    return list(islice(rule.match(representation), obj_limit))
+
+
 class Rule(TypePropertyEquality, JSONSerialisable):
     """A Rule represents a test to be applied to a representation of an
     object.
@@ -135,8 +140,8 @@ class Rule(TypePropertyEquality, JSONSerialisable):
                 # evaluating rules and return what we have to the caller
                 break
             if head not in matches:
-                matches[head] = list(
-                        islice(head.match(required_form), obj_limit))
+                matches[head] = metrics.time_rule(
+                        head, _collect_matches, required_form, obj_limit)
             here = pve if matches[head] else nve
         return (here, list(matches.items()))
 
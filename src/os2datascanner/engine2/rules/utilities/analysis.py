@@ -1,5 +1,9 @@
+import re
 import operator
 from functools import reduce
+# The structure of compiled regular expressions isn't part of any public API,
+# but the parser has been stable (apart from its name) for a very long time
+from re import _parser, _constants
 
 from ..rule import Rule, SimpleRule
 from ..logical import OrRule, AndRule, NotRule, CompoundRule
@@ -31,3 +35,64 @@ def compute_mss(r: Rule | None) -> set[SimpleRule]:
         case _:
             raise ValueError(
                     f"Rule fragment {r} was not recognised")
+
+
+def compute_last_modified_cutoff(r: Rule | None):
+    """Returns the latest timestamp that an object must have been modified
+    after for the given Rule as a whole to match, or None if the Rule doesn't
+    impose such a requirement."""
+    cutoff = None
+    for essential_rule in compute_mss(r):
+        # (we can't do isinstance() here without making a circular
+        # dependency)
+        if getattr(essential_rule, "type_label", None) == "last-modified":
+            after = essential_rule.after
+            cutoff = (after if not cutoff else max(cutoff, after))
+    return cutoff
+
+
+def compute_required_literal(expression: str) -> str | None:
+    """Computes the longest string that must appear, exactly as written, in
+    any text matched by the given regular expression. Returns None if there's
+    no such string, or if the expression was too complicated to analyse.
+
+    (Python's substring search is far faster than any regular expression, so
+    checking for this string first is a cheap way of skipping content that
+    can't possibly match.)"""
+    try:
+        parsed = _parser.parse(expression)
+    except re.error:
+        return None
+    if parsed.state.flags & re.IGNORECASE:
+        return None
+    return max(_literal_runs(parsed), key=len, default=None) or None
+
+
+def _literal_runs(items):
+    """Yields every run of consecutive literal characters that a parsed
+    regular expression requires to be present."""
+    run = []
+    for op, av in items:
+        if op is _constants.LITERAL:
+            run.append(chr(av))
+            continue
+        elif run:
+            yield "".join(run)
+            run = []
+
+        match op:
+            case _constants.SUBPATTERN:
+                _, add_flags, _, sub = av
+                if not add_flags & re.IGNORECASE:
+                    yield from _literal_runs(sub)
+            case _constants.ATOMIC_GROUP:
+                yield from _literal_runs(av)
+            case (_constants.MAX_REPEAT | _constants.MIN_REPEAT
+                  | _constants.POSSESSIVE_REPEAT):
+                low, _, sub = av
+                if low > 0:
+                    yield from _literal_runs(sub)
+            # Everything else might match in more than one way (or not consume
+            # any text), so it doesn't contribute any required literals
+    if run:
+        yield "".join(run)
@@ -1,4 +1,5 @@
 from typing import Union, Tuple
+from bisect import bisect_left
 from datetime import date
 from math import ceil
 from itertools import chain
@@ -107,6 +108,17 @@ def modulus11_check_raw(cpr: str) -> bool:
     return sum([int(c) * v for c, v in zip(cpr, _mod_11_table)]) % 11 == 0
 
 
+# For each possible remainder modulo 11, the values of the last three digits of
+# a CPR number (read as an integer) whose weighted sum has that remainder, in
+# ascending order
+_suffixes_by_remainder = [[] for _ in range(11)]
+for _suffix in range(1000):
+    _suffixes_by_remainder[
+            sum(int(c) * v for c, v in zip(
+                    f"{_suffix:03d}", _mod_11_table[7:])) % 11].append(_suffix)
+del _suffix
+
+
 def cpr_bin_check(numbers: list[Match], cprs: list[Match], num_bins=40, cutoff=0.15):
     """Takes a list of cpr-looking numbers and accepted cpr-numbers,
     and divides them into 40 "bins" based on position in the scanned object.
@@ -185,10 +197,6 @@ class CprProbabilityCalculator(object):
       always 0.5
     """
 
-    def __init__(self):
-        # Cache of dates where the possible CPRs has already been calculated.
-        self.cached_cprs = {}
-
     @staticmethod
     def _form_validator(cpr: str) -> str:
         """Checks a CPR number for formal validity.
@@ -232,34 +240,39 @@ class CprProbabilityCalculator(object):
             legal_7s = [5, 6, 7, 8]
         return legal_7s
 
-    def _calc_all_cprs(self, birth_date: date, mod11_check: bool = True) -> list:
-        """Calculate all valid CPRs for a given birth date.
+    def _sequence_index(self, cpr: str, birth_date: date,
+                        mod11_check: bool = True) -> int | None:
+        """Calculate the position of a CPR number in the sequence of all legal
+        CPR numbers for its birth date, without building that sequence.
 
-        :param birh_date: The birh date to check.
-        :return: A list of all legal CPRs for that date.
+        :param cpr: The CPR number to check.
+        :param birth_date: The birth date of the CPR number.
+        :param mod11_check: Whether or not the sequence only contains numbers
+        that pass the modulus 11 check.
+        :return: The index of the CPR number, or None if it is not in the
+        sequence.
         """
-        cache_key = str(birth_date)
-        if cache_key in self.cached_cprs:
-            return self.cached_cprs[cache_key]
         legal_7 = self._legal_7s(birth_date.year)
+        digit_7, suffix = int(cpr[6]), int(cpr[7:])
+        if digit_7 not in legal_7:
+            return None
+        preceding_7s = legal_7[:legal_7.index(digit_7)]
+
+        if not mod11_check:
+            return len(preceding_7s) * 1000 + suffix
 
-        legal_cprs = []
-        for index_7 in legal_7:
-            for i in range(0, 1000):
-                cpr_candidate = (
-                    birth_date.strftime("%d%m%y")
-                    + str(index_7)
-                    + str(i).zfill(3)
-                )
-                if mod11_check:
-                    valid = modulus11_check_raw(cpr_candidate)
-                    if valid:
-                        legal_cprs.append(cpr_candidate)
-                else:
-                    legal_cprs.append(cpr_candidate)
-
-        self.cached_cprs[cache_key] = legal_cprs
-        return legal_cprs
+        # Each value of digit 7 contributes a block of those suffixes that
+        # bring the weighted sum of the whole number to a multiple of 11
+        date_sum = sum(int(c) * v for c, v in zip(cpr[:6], _mod_11_table))
+
+        def _suffixes(d7):
+            return _suffixes_by_remainder[-(date_sum + 4 * d7) % 11]
+
+        suffixes = _suffixes(digit_7)
+        position = bisect_left(suffixes, suffix)
+        if position == len(suffixes) or suffixes[position] != suffix:
+            return None
+        return sum(len(_suffixes(d7)) for d7 in preceding_7s) + position
 
     def cpr_check(self, cpr: str, do_mod11_check=True) -> Union[str, float]:
         """Estimate a probality that the number is actually a CPR.
@@ -303,10 +316,9 @@ class CprProbabilityCalculator(object):
                 birth_date not in CPR_EXCEPTION_DATES):
             return "Modulus 11 does not match"
 
-        legal_cprs = self._calc_all_cprs(birth_date, mod11_check=do_mod11_check)
-        try:
-            index_number = legal_cprs.index(cpr)
-        except ValueError:
+        index_number = self._sequence_index(
+                cpr, birth_date, mod11_check=do_mod11_check)
+        if index_number is None:
             return "CPR is not a legal value"
 
         if index_number <= 100:
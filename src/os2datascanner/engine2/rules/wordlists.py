@@ -15,17 +15,7 @@ def load_words(dataset):
     The content of the dataset is flattened, if it contains
     any structured data.
     """
-    loaded = common_loader.load_dataset("wordlists", dataset)
-
-    def _flatten(elem):
-        match elem:
-            case list():
-                for e in elem:
-                    yield from _flatten(e)
-            case _:
-                yield str(elem).lower()
-
-    yield from _flatten(loaded)
+    yield from common_loader.words("wordlists", dataset, case="lower")
 
 
 class OrderedWordlistRule(SimpleRule):
@@ -47,7 +37,10 @@ class OrderedWordlistRule(SimpleRule):
     def __init__(self, dataset: str, **super_kwargs):
         super().__init__(**super_kwargs)
         self._dataset = dataset
-        self._wordlists = frozenset(load_words(dataset))
+        # (The word set is shared by every rule for this dataset in this
+        # process)
+        self._wordlists = common_loader.word_set(
+                "wordlists", dataset, case="lower")
         self._compiled_expr = re.compile(r"\w+", re.IGNORECASE | re.DOTALL)
 
     @property
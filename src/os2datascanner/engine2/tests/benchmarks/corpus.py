@@ -0,0 +1,281 @@
+"""A generator for synthetic, but realistic, corpora of files to benchmark the
+engine against.
+
+Every file in a corpus is derived from a seeded random number generator, and
+every timestamp in it is fixed, so a given seed and scale always produce
+byte-for-byte the same corpus."""
+
+import io
+import os
+import re
+import gzip
+import random
+import tarfile
+import zipfile
+import hashlib
+from pathlib import Path
+from email.message import EmailMessage
+
+import openpyxl
+from PIL import Image, ImageDraw
+
+
+# The modification time given to every file and archive member
+TIMESTAMP = (2021, 6, 1, 12, 0, 0)
+_EPOCH_TIMESTAMP = 1622548800
+
+_WORDS = (
+        "kommune borger sag journal afgørelse ansøgning bevilling"
+        " skole elev forælder lærer klasse udtalelse møde referat"
+        " medarbejder løn ferie sygdom opsigelse kontrakt leverandør"
+        " faktura betaling budget regnskab plan byggeri tilladelse"
+        " adresse telefon henvendelse klage svar frist bilag notat").split()
+
+# The weights used to compute the modulus 11 check of a CPR number
+_CPR_WEIGHTS = (4, 3, 2, 7, 6, 5, 4, 3, 2, 1)
+
+
+def make_cpr(rng: random.Random) -> str:
+    """Returns a random (but valid, as far as the modulus 11 check is
+    concerned) CPR number, formatted with a hyphen."""
+    while True:
+        digits = "{0:02}{1:02}{2:02}{3:04}".format(
+                rng.randint(1, 28), rng.randint(1, 12), rng.randint(40, 99),
+                rng.randint(0, 9999))
+        if not sum(int(d) * w for d, w in zip(digits, _CPR_WEIGHTS)) % 11:
+            return f"{digits[:6]}-{digits[6:]}"
+
+
+def make_sentence(rng: random.Random, cpr_chance=0.1) -> str:
+    words = rng.choices(_WORDS, k=rng.randint(6, 14))
+    if rng.random() < cpr_chance:
+        words.insert(rng.randrange(len(words)), make_cpr(rng))
+    return " ".join(words).capitalize() + "."
+
+
+def make_paragraphs(rng: random.Random, count, cpr_chance=0.1) -> list[str]:
+    return [" ".join(make_sentence(rng, cpr_chance)
+                     for _ in range(rng.randint(3, 8)))
+            for _ in range(count)]
+
+
+def _zip_bytes(members: dict[str, bytes]) -> bytes:
+    """Returns a Zip file containing the given members, all of which have the
+    fixed timestamp."""
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w", zipfile.ZIP_DEFLATED) as zf:
+        for name, content in members.items():
+            zf.writestr(zipfile.ZipInfo(name, TIMESTAMP), content)
+    return buf.getvalue()
+
+
+def make_text(rng):
+    return "\n\n".join(make_paragraphs(rng, rng.randint(5, 40))).encode()
+
+
+def make_html(rng):
+    paragraphs = "\n".join(
+            f"<p>{p}</p>" for p in make_paragraphs(rng, rng.randint(5, 40)))
+    return ("<!DOCTYPE html>\n<html><head><meta charset=\"utf-8\">"
+            f"<title>{make_sentence(rng, 0)}</title></head>\n"
+            f"<body>\n<h1>{make_sentence(rng, 0)}</h1>\n{paragraphs}\n"
+            "</body></html>\n").encode()
+
+
+def _pdf_string(text):
+    text = text.encode("ascii", "replace").decode("ascii")
+    return "(" + text.replace("\\", "\\\\").replace(
+            "(", "\\(").replace(")", "\\)") + ")"
+
+
+def make_pdf(rng):
+    """Returns a PDF document with a few pages of text. (The document is built
+    by hand, so that producing it doesn't depend on an external program.)"""
+    pages = []
+    for _ in range(rng.randint(1, 4)):
+        lines = []
+        for p in make_paragraphs(rng, rng.randint(2, 6)):
+            while p:
+                lines.append(p[:90])
+                p = p[90:]
+            lines.append("")
+        pages.append(lines[:50])
+
+    objects = [
+        "<< /Type /Catalog /Pages 2 0 R >>",
+        "<< /Type /Pages /Kids [{0}] /Count {1} >>".format(
+                " ".join(f"{4 + 2 * i} 0 R" for i in range(len(pages))),
+                len(pages)),
+        "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica"
+        " /Encoding /WinAnsiEncoding >>",
+    ]
+    for i, lines in enumerate(pages):
+        stream = "BT /F1 10 Tf 12 TL 50 800 Td\n" + "\n".join(
+                f"{_pdf_string(line)} '" for line in lines) + "\nET"
+        objects.append(
+                "<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842]"
+                " /Resources << /Font << /F1 3 0 R >> >>"
+                f" /Contents {5 + 2 * i} 0 R >>")
+        objects.append(
+                f"<< /Length {len(stream)} >>\nstream\n{stream}\nendstream")
+
+    out = io.BytesIO()
+    out.write(b"%PDF-1.4\n")
+    offsets = []
+    for number, obj in enumerate(objects, start=1):
+        offsets.append(out.tell())
+        out.write(f"{number} 0 obj\n{obj}\nendobj\n".encode("latin-1"))
+    xref = out.tell()
+    out.write(f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode())
+    for offset in offsets:
+        out.write(f"{offset:010} 00000 n \n".encode())
+    out.write(
+            f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\n"
+            f"startxref\n{xref}\n%%EOF\n".encode())
+    return out.getvalue()
+
+
+def make_docx(rng):
+    """Returns a minimal Office Open XML word processing document."""
+    body = "".join(
+            f"<w:p><w:r><w:t>{p}</w:t></w:r></w:p>"
+            for p in make_paragraphs(rng, rng.randint(5, 30)))
+    return _zip_bytes({
+        "[Content_Types].xml": (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            '<Types xmlns="http://schemas.openxmlformats.org/package/2006/'
+            'content-types"><Default Extension="rels" ContentType="'
+            'application/vnd.openxmlformats-package.relationships+xml"/>'
+            '<Default Extension="xml" ContentType="application/xml"/>'
+            '<Override PartName="/word/document.xml" ContentType="'
+            'application/vnd.openxmlformats-officedocument.'
+            'wordprocessingml.document.main+xml"/></Types>'),
+        "_rels/.rels": (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            '<Relationships xmlns="http://schemas.openxmlformats.org/package/'
+            '2006/relationships"><Relationship Id="rId1" Type="http://'
+            'schemas.openxmlformats.org/officeDocument/2006/relationships/'
+            'officeDocument" Target="word/document.xml"/></Relationships>'),
+        "word/document.xml": (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            '<w:document xmlns:w="http://schemas.openxmlformats.org/'
+            'wordprocessingml/2006/main">'
+            f"<w:body>{body}</w:body></w:document>"),
+    })
+
+
+def make_xlsx(rng):
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    ws.title = "Data"
+    ws.append(["Navn", "CPR", "Beløb", "Note"])
+    for i in range(rng.randint(20, 400)):
+        ws.append([
+            f"Person {i}", make_cpr(rng) if rng.random() < 0.3 else None,
+            round(rng.uniform(0, 100000), 2), make_sentence(rng, 0)])
+    buf = io.BytesIO()
+    wb.save(buf)
+
+    # openpyxl stamps both the document properties and the members of the
+    # Zip file with the current time, so repack the workbook with the fixed
+    # timestamp instead
+    with zipfile.ZipFile(buf) as zf:
+        members = {name: zf.read(name) for name in zf.namelist()}
+    members["docProps/core.xml"] = re.sub(
+            rb"\d{4}-\d\d-\d\dT\d\d:\d\d:\d\dZ", b"2021-06-01T12:00:00Z",
+            members["docProps/core.xml"])
+    return _zip_bytes(members)
+
+
+def make_png(rng):
+    image = Image.new("L", (600, 200), color=255)
+    draw = ImageDraw.Draw(image)
+    for i in range(6):
+        draw.text((10, 10 + 30 * i), make_sentence(rng, 0.3)[:80], fill=0)
+    buf = io.BytesIO()
+    image.save(buf, format="PNG")
+    return buf.getvalue()
+
+
+def make_zip(rng):
+    return _zip_bytes({
+        f"dokumenter/notat-{i}.txt": make_text(rng)
+        for i in range(rng.randint(2, 6))
+    } | {"bilag.html": make_html(rng)})
+
+
+def make_tar_gz(rng):
+    """Returns a gzipped tarball that contains, among other things, a Zip
+    file."""
+    buf = io.BytesIO()
+    with gzip.GzipFile(fileobj=buf, mode="wb", mtime=0) as gz:
+        with tarfile.open(fileobj=gz, mode="w") as tf:
+            for name, content in (
+                    ("arkiv/referat.txt", make_text(rng)),
+                    ("arkiv/bilag.zip", make_zip(rng)),
+                    ("arkiv/side.html", make_html(rng)),):
+                info = tarfile.TarInfo(name)
+                info.size = len(content)
+                info.mtime = _EPOCH_TIMESTAMP
+                tf.addfile(info, io.BytesIO(content))
+    return buf.getvalue()
+
+
+def make_eml(rng, index):
+    msg = EmailMessage()
+    msg["From"] = f"sagsbehandler{index}@placeholder.invalid"
+    msg["To"] = "borger@placeholder.invalid"
+    msg["Subject"] = make_sentence(rng, 0)
+    msg["Date"] = "Tue, 01 Jun 2021 12:00:00 +0000"
+    msg["Message-ID"] = f"<corpus-{index}@placeholder.invalid>"
+    msg.set_content("\n\n".join(make_paragraphs(rng, rng.randint(2, 6))))
+    msg.add_attachment(
+            make_text(rng), maintype="text", subtype="plain",
+            filename="bilag.txt")
+    if rng.random() < 0.5:
+        msg.add_attachment(
+                make_pdf(rng), maintype="application", subtype="pdf",
+                filename="afgoerelse.pdf")
+    if rng.random() < 0.3:
+        msg.add_attachment(
+                make_zip(rng), maintype="application", subtype="zip",
+                filename="bilag.zip")
+    # The email package otherwise picks a random boundary when it serialises
+    # the message
+    msg.set_boundary(f"==corpus-boundary-{index}==")
+    return msg.as_bytes()
+
+
+# The kinds of file in a corpus, the number of each at scale 1, and the
+# functions that make them
+KINDS = {
+    "txt": (40, make_text),
+    "html": (20, make_html),
+    "pdf": (10, make_pdf),
+    "docx": (10, make_docx),
+    "xlsx": (5, make_xlsx),
+    "png": (5, make_png),
+    "zip": (5, make_zip),
+    "tar.gz": (3, make_tar_gz),
+    "eml": (10, make_eml),
+}
+
+
+def generate_corpus(root, *, seed=0, scale=1) -> dict[str, str]:
+    """Generates a corpus in the given directory, returning a dictionary
+    mapping the path of each file (relative to that directory) to the SHA-256
+    digest of its content."""
+    root = Path(root)
+    rng = random.Random(seed)
+    manifest = {}
+    for kind, (count, maker) in KINDS.items():
+        folder = root / kind.split(".")[0]
+        folder.mkdir(parents=True, exist_ok=True)
+        for i in range(count * scale):
+            content = (maker(rng, i) if maker is make_eml else maker(rng))
+            path = folder / f"{kind.split('.')[0]}-{i:04}.{kind}"
+            path.write_bytes(content)
+            os.utime(path, (_EPOCH_TIMESTAMP, _EPOCH_TIMESTAMP))
+            manifest[str(path.relative_to(root))] = hashlib.sha256(
+                    content).hexdigest()
+    return manifest
@@ -0,0 +1,294 @@
+"""An offline benchmark harness for the engine's pipeline.
+
+The harness generates a synthetic corpus (see the corpus module), scans it
+with a FilesystemSource by passing messages between the pipeline stages'
+message_received_raw functions in this process, and reports how long each
+stage and each conversion took and how much memory the process needed. No
+RabbitMQ server, database or external service is involved.
+
+Run it as a module to print a report, to save one as a baseline, or to
+compare one with a saved baseline:
+
+    python -m os2datascanner.engine2.tests.benchmarks.harness \\
+            --save-baseline baseline.json
+    python -m os2datascanner.engine2.tests.benchmarks.harness \\
+            --baseline baseline.json
+
+(Timings depend on the machine, so baselines should only be compared with
+reports from the machine that produced them.)"""
+
+import sys
+import json
+import time
+import argparse
+import resource
+import tempfile
+from collections import Counter, defaultdict, deque
+from contextlib import ExitStack, contextmanager
+from statistics import quantiles
+
+from ...model.core import SourceManager
+from ...model.file import FilesystemSource
+from ...rules.cpr import CPRRule
+from ...pipeline import (
+        explorer, processor, matcher, tagger, worker, messages)
+from .corpus import generate_corpus
+
+
+# The stages that each mode of the harness passes messages to, and the queues
+# that they read from. Messages sent to any other queue leave the pipeline
+MODES = {
+    "staged": {
+        "os2ds_scan_specs": ("explorer", explorer.message_received_raw),
+        "os2ds_conversions": ("processor", processor.message_received_raw),
+        "os2ds_representations": ("matcher", matcher.message_received_raw),
+        "os2ds_handles": ("tagger", tagger.message_received_raw),
+    },
+    "worker": {
+        "os2ds_scan_specs": ("explorer", explorer.message_received_raw),
+        "os2ds_conversions": ("worker", worker.message_received_raw),
+    },
+}
+
+
+# Differences in conversion latency smaller than this (in seconds) are
+# indistinguishable from noise, however big they are relative to the baseline
+LATENCY_NOISE = 0.005
+
+
+def make_scan_spec(root, rule=None) -> dict:
+    if rule is None:
+        rule = CPRRule(
+                modulus_11=True, ignore_irrelevant=False,
+                examine_context=False)
+    return messages.ScanSpecMessage(
+            scan_tag=messages.ScanTagFragment.make_dummy(),
+            source=FilesystemSource(str(root)),
+            rule=rule,
+            configuration={},
+            filter_rule=None,
+            progress=None).to_json_object()
+
+
+@contextmanager
+def _timed_conversions(latencies):
+    """Records the time taken by each call to processor.convert_cached made
+    in this context, by MIME type and output type."""
+    convert_cached = processor.convert_cached
+
+    def _wrapper(resource, output_type):
+        start = time.perf_counter()
+        try:
+            return convert_cached(resource, output_type)
+        finally:
+            latencies[
+                    f"{resource.handle.guess_type()} -> {output_type.value}"
+                    ].append(time.perf_counter() - start)
+
+    processor.convert_cached = _wrapper
+    try:
+        yield
+    finally:
+        processor.convert_cached = convert_cached
+
+
+def _summarise(samples: list[float]) -> dict:
+    if len(samples) > 1:
+        p50, p90, p99 = (
+                quantiles(samples, n=100, method="inclusive")[i]
+                for i in (49, 89, 98))
+    else:
+        p50 = p90 = p99 = samples[0]
+    return {
+        "count": len(samples),
+        "p50": p50,
+        "p90": p90,
+        "p99": p99,
+        "max": max(samples),
+    }
+
+
+def run_pipeline(scan_spec: dict, mode="staged") -> dict:
+    """Scans something by passing messages between pipeline stages, starting
+    with the given scan specification, and returns a report on the scan.
+
+    Each stage has its own SourceManager, just as it would if it were running
+    in its own process."""
+    stages = MODES[mode]
+    queue = deque([("os2ds_scan_specs", scan_spec)])
+    calls = Counter()
+    produced = Counter()
+    durations = defaultdict(float)
+    outputs = Counter()
+    latencies = defaultdict(list)
+
+    start = time.perf_counter()
+    with ExitStack() as stack:
+        managers = {
+            name: stack.enter_context(SourceManager())
+            for name, _ in stages.values()}
+        stack.enter_context(_timed_conversions(latencies))
+
+        while queue:
+            channel, body = queue.popleft()
+            if channel not in stages:
+                outputs[channel] += 1
+                continue
+
+            name, handler = stages[channel]
+            stage_start = time.perf_counter()
+            replies = list(handler(body, channel, managers[name]))
+            durations[name] += time.perf_counter() - stage_start
+            calls[name] += 1
+            produced[name] += len(replies)
+            queue.extend(replies)
+    wall_time = time.perf_counter() - start
+
+    return {
+        "mode": mode,
+        "wall_time": wall_time,
+        "stages": {
+            name: {
+                "messages": calls[name],
+                "replies": produced[name],
+                "time": durations[name],
+                "throughput": (
+                        calls[name] / durations[name]
+                        if durations[name] else None),
+            } for name, _ in stages.values()},
+        "conversions": {
+            key: _summarise(samples)
+            for key, samples in sorted(latencies.items())},
+        "outputs": dict(sorted(outputs.items())),
+        # (ru_maxrss is measured in kibibytes on Linux. Conversions that run
+        # external programs count towards the children's figure)
+        "peak_rss_kib": {
+            "self": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+            "children": resource.getrusage(
+                    resource.RUSAGE_CHILDREN).ru_maxrss,
+        },
+    }
+
+
+def run_benchmark(*, seed=0, scale=1, mode="staged") -> dict:
+    """Generates a corpus in a temporary directory, scans it, and returns a
+    report on the scan."""
+    with tempfile.TemporaryDirectory() as root:
+        manifest = generate_corpus(root, seed=seed, scale=scale)
+        report = run_pipeline(make_scan_spec(root), mode)
+    return {
+        "corpus": {"seed": seed, "scale": scale, "files": len(manifest)},
+    } | report
+
+
+def compare(report: dict, baseline: dict, tolerance=0.25) -> list[str]:
+    """Compares a report with a baseline report, returning a description of
+    each regression: each stage whose throughput, and each conversion whose
+    90th percentile latency, is more than the given fraction worse than in the
+    baseline (ignoring differences in latency of less than LATENCY_NOISE), any
+    increase in peak memory usage of more than that fraction, and any
+    difference in the messages that left the pipeline."""
+    regressions = []
+    if (report["corpus"], report["mode"]) != (
+            baseline["corpus"], baseline["mode"]):
+        return ["report and baseline are for different corpora or modes"]
+    if report["outputs"] != baseline["outputs"]:
+        regressions.append(
+                f"outputs differ: {report['outputs']}"
+                f" != {baseline['outputs']}")
+
+    for name, stage in report["stages"].items():
+        before = baseline["stages"].get(name, {}).get("throughput")
+        after = stage["throughput"]
+        if before and after and after < before * (1 - tolerance):
+            regressions.append(
+                    f"{name} throughput fell from {before:.1f}"
+                    f" to {after:.1f} messages/s")
+
+    for key, summary in report["conversions"].items():
+        before = baseline["conversions"].get(key, {}).get("p90")
+        after = summary["p90"]
+        if (before and after > before * (1 + tolerance)
+                and after - before > LATENCY_NOISE):
+            regressions.append(
+                    f"{key} p90 latency rose from {before * 1000:.1f}"
+                    f" to {after * 1000:.1f} ms")
+
+    for which, after in report["peak_rss_kib"].items():
+        before = baseline["peak_rss_kib"].get(which)
+        if before and after > before * (1 + tolerance):
+            regressions.append(
+                    f"peak RSS ({which}) rose from {before}"
+                    f" to {after} KiB")
+    return regressions
+
+
+def _print_report(report):
+    print("Corpus: {files} files (seed {seed}, scale {scale})".format(
+            **report["corpus"]))
+    print(f"Mode: {report['mode']}, wall time {report['wall_time']:.2f} s")
+    print("Stages:")
+    for name, stage in report["stages"].items():
+        print(f"  {name:10} {stage['messages']:6} messages"
+              f" in {stage['time']:8.2f} s"
+              f" ({stage['throughput'] or 0:8.1f}/s)")
+    print("Conversions (ms):")
+    for key, s in report["conversions"].items():
+        print(f"  {key:60} n={s['count']:<5}"
+              f" p50={s['p50'] * 1000:8.1f} p90={s['p90'] * 1000:8.1f}"
+              f" p99={s['p99'] * 1000:8.1f} max={s['max'] * 1000:8.1f}")
+    print("Outputs:")
+    for channel, count in report["outputs"].items():
+        print(f"  {channel:22} {count}")
+    print("Peak RSS: {self} KiB (children: {children} KiB)".format(
+            **report["peak_rss_kib"]))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+            description="Benchmarks the engine's pipeline against a"
+                        " synthetic corpus.")
+    parser.add_argument(
+            "--seed", type=int, default=0,
+            help="the seed for the corpus generator")
+    parser.add_argument(
+            "--scale", type=int, default=1,
+            help="how many times bigger than the basic corpus to make the"
+                 " corpus")
+    parser.add_argument(
+            "--mode", choices=tuple(MODES), default="staged",
+            help="whether to pass messages between the individual stages or"
+                 " to use the combined worker stage")
+    parser.add_argument(
+            "--baseline", metavar="PATH",
+            help="a saved report to compare this one with")
+    parser.add_argument(
+            "--tolerance", type=float, default=0.25,
+            help="how much worse than the baseline (as a fraction) a"
+                 " measurement can be before it counts as a regression")
+    parser.add_argument(
+            "--save-baseline", metavar="PATH",
+            help="where to save this report as a baseline")
+    args = parser.parse_args(argv)
+
+    report = run_benchmark(seed=args.seed, scale=args.scale, mode=args.mode)
+    _print_report(report)
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as fp:
+            json.dump(report, fp, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as fp:
+            baseline = json.load(fp)
+        if (regressions := compare(report, baseline, args.tolerance)):
+            print("Regressions:")
+            for regression in regressions:
+                print(f"  {regression}")
+            return 1
+        print("No regressions against the baseline")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
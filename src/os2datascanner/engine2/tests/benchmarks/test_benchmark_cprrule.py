@@ -1,6 +1,11 @@
 """Benchmarking for CPRRule."""
 from os2datascanner.engine2.rules.cpr import CPRRule
-from .utilities import HTML_CONTENT
+from .utilities import HTML_CONTENT, SPREADSHEET_CONTENT
+
+
+def _match_all(rule, content):
+    # CPRRule.match is a generator, so nothing happens until it's consumed
+    return list(rule.match(content))
 
 
 def test_benchmark_cpr_rule_no_context(benchmark):
@@ -9,7 +14,7 @@ def test_benchmark_cpr_rule_no_context(benchmark):
     rule = CPRRule(modulus_11=True,
                    ignore_irrelevant=False,
                    examine_context=False)
-    benchmark(rule.match, content)
+    benchmark(_match_all, rule, content)
 
 
 def test_benchmark_cpr_rule_with_context(benchmark):
@@ -18,4 +23,24 @@ def test_benchmark_cpr_rule_with_context(benchmark):
     rule = CPRRule(modulus_11=True,
                    ignore_irrelevant=False,
                    examine_context=True)
-    benchmark(rule.match, content)
+    benchmark(_match_all, rule, content)
+
+
+def test_benchmark_cpr_rule_spreadsheet_no_context(benchmark):
+    """Test performance on CPRRule without enabling examine_context on a
+    spreadsheet with thousands of CPR-like numbers."""
+    rule = CPRRule(modulus_11=True,
+                   ignore_irrelevant=True,
+                   examine_context=False)
+    matches = benchmark(_match_all, rule, SPREADSHEET_CONTENT)
+    assert matches
+
+
+def test_benchmark_cpr_rule_spreadsheet_with_context(benchmark):
+    """Test performance on CPRRule with all checks enabled on a spreadsheet
+    with thousands of CPR-like numbers."""
+    rule = CPRRule(modulus_11=True,
+                   ignore_irrelevant=True,
+                   examine_context=True)
+    matches = benchmark(_match_all, rule, SPREADSHEET_CONTENT)
+    assert matches
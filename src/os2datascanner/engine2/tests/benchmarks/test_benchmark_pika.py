@@ -0,0 +1,75 @@
+"""Benchmarking for PikaPipelineThread."""
+from os2datascanner.engine2.pipeline.utilities.pika import PikaPipelineThread
+
+from ..pika_stand_ins import StandInConnection
+
+
+MESSAGE_COUNT = 500
+
+
+class ForwardingRunner(PikaPipelineThread):
+    """Forwards every message it receives to another queue, stopping once it
+    has handled a fixed number of them."""
+
+    def __init__(self, *args, limit, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._limit = limit
+        self.count = 0
+
+    def make_connection(self):
+        return StandInConnection()
+
+    def handle_message(self, routing_key, body):
+        yield ("bench_out", body)
+
+    def after_message(self, routing_key, body):
+        self.count += 1
+        if self.count >= self._limit:
+            self.enqueue_stop()
+
+
+def _make_runner(**kwargs):
+    runner = ForwardingRunner(
+            read=["bench_in"], write=["bench_out"],
+            prefetch_count=1, limit=MESSAGE_COUNT, **kwargs)
+    for i in range(MESSAGE_COUNT):
+        runner.channel.basic_publish(
+                exchange="", routing_key="bench_in",
+                body=b'{"index": %d}' % i)
+    runner.channel.published = 0
+    return (runner,), {}
+
+
+def _consume(runner):
+    runner.run_consumer()
+    return runner
+
+
+def test_benchmark_pika_pipeline_thread_throughput(benchmark):
+    """Test end-to-end throughput of PikaPipelineThread with a prefetch count
+    of one, where every delivery has to wait for the previous acknowledgement
+    to reach the broker."""
+    runner = benchmark.pedantic(_consume, setup=_make_runner, rounds=5)
+
+    assert runner.count == MESSAGE_COUNT
+    assert runner.channel.published == MESSAGE_COUNT
+    benchmark.extra_info["messages_per_second"] = (
+            benchmark.stats.stats.rounds * MESSAGE_COUNT
+            / benchmark.stats.stats.total)
+
+
+def test_benchmark_pika_pipeline_thread_batched_throughput(benchmark):
+    """Test end-to-end throughput of PikaPipelineThread when acknowledgements
+    and publications are committed in batches."""
+    runner = benchmark.pedantic(
+            _consume,
+            setup=lambda: _make_runner(batch_size=50, batch_latency=0.05),
+            rounds=5)
+
+    assert runner.count == MESSAGE_COUNT
+    assert runner.channel.published == MESSAGE_COUNT
+    assert not runner.channel._unacked
+    assert runner.channel.commits <= MESSAGE_COUNT // 10
+    benchmark.extra_info["messages_per_second"] = (
+            benchmark.stats.stats.rounds * MESSAGE_COUNT
+            / benchmark.stats.stats.total)
@@ -0,0 +1,60 @@
+"""Benchmarking for the pipeline as a whole, against a synthetic corpus."""
+import pytest
+
+from .corpus import generate_corpus
+from .harness import compare, make_scan_spec, run_pipeline
+
+
+@pytest.fixture(scope="module")
+def corpus(tmp_path_factory):
+    root = tmp_path_factory.mktemp("corpus")
+    generate_corpus(root)
+    return root
+
+
+def _run(root, mode):
+    return run_pipeline(make_scan_spec(root), mode)
+
+
+def test_corpus_is_deterministic(tmp_path):
+    """Generating a corpus twice with the same seed should produce exactly the
+    same files."""
+    assert (generate_corpus(tmp_path / "a", seed=5)
+            == generate_corpus(tmp_path / "b", seed=5))
+    assert (generate_corpus(tmp_path / "c", seed=6)
+            != generate_corpus(tmp_path / "a", seed=5))
+
+
+def test_benchmark_staged_pipeline(benchmark, corpus):
+    """Test performance of scanning a corpus with the individual pipeline
+    stages."""
+    report = benchmark.pedantic(_run, (corpus, "staged"), rounds=1)
+    assert report["outputs"]["os2ds_matches"] > 0
+    assert set(report["stages"]) == {
+            "explorer", "processor", "matcher", "tagger"}
+    assert "text/plain -> text" in report["conversions"]
+
+
+def test_benchmark_worker_pipeline(benchmark, corpus):
+    """Test performance of scanning a corpus with the combined worker stage,
+    which should find exactly the same things as the individual stages."""
+    report = benchmark.pedantic(_run, (corpus, "worker"), rounds=1)
+    staged = _run(corpus, "staged")
+    for channel in ("os2ds_matches", "os2ds_metadata", "os2ds_problems",):
+        assert report["outputs"][channel] == staged["outputs"][channel]
+
+
+def test_baseline_comparison(corpus):
+    """A report should not regress against itself, but should against a
+    baseline that was much faster."""
+    report = {"corpus": {"seed": 0, "scale": 1, "files": 0}} | _run(
+            corpus, "staged")
+    assert compare(report, report) == []
+
+    faster = report | {
+        "stages": {
+            name: stage | {"throughput": stage["throughput"] * 10}
+            for name, stage in report["stages"].items()},
+    }
+    regressions = compare(report, faster)
+    assert len(regressions) == len(report["stages"])
@@ -0,0 +1,57 @@
+"""Benchmarking for the conversion of large spreadsheets to text."""
+import pytest
+import openpyxl
+import pandas as pd
+
+from os2datascanner.engine2.model.core import SourceManager
+from os2datascanner.engine2.model.file import FilesystemHandle
+from os2datascanner.engine2.model.derived.spreadsheet import SpreadsheetSource
+from os2datascanner.engine2.conversions import convert
+from os2datascanner.engine2.conversions.types import OutputType
+
+
+ROW_COUNT = 10000
+
+
+def _rows():
+    for i in range(ROW_COUNT):
+        yield [i, f"Person {i}", 1000000000 + i, i * 1.25, "note" if i % 7 else None]
+
+
+@pytest.fixture(scope="module")
+def xlsx_path(tmp_path_factory):
+    path = tmp_path_factory.mktemp("spreadsheets") / "large.xlsx"
+    wb = openpyxl.Workbook(write_only=True)
+    ws = wb.create_sheet("Data")
+    for row in _rows():
+        ws.append(row)
+    wb.save(path)
+    return path
+
+
+@pytest.fixture(scope="module")
+def ods_path(tmp_path_factory):
+    path = tmp_path_factory.mktemp("spreadsheets") / "large.ods"
+    pd.DataFrame(_rows()).to_excel(
+            path, engine="odf", sheet_name="Data", header=False, index=False)
+    return path
+
+
+def _convert_all(path):
+    with SourceManager() as sm:
+        source = SpreadsheetSource(FilesystemHandle.make_handle(str(path)))
+        return [convert(h.follow(sm), OutputType.Text)
+                for h in source.handles(sm)]
+
+
+def test_benchmark_xlsx_to_text(benchmark, xlsx_path):
+    """Test performance of converting a large OOXML spreadsheet to text."""
+    text, = benchmark(_convert_all, xlsx_path)
+    assert text.count("\n") == ROW_COUNT - 1
+
+
+def test_benchmark_ods_to_text(benchmark, ods_path):
+    """Test performance of converting a large OpenDocument spreadsheet to
+    text."""
+    text, = benchmark(_convert_all, ods_path)
+    assert text.count("\n") == ROW_COUNT - 1
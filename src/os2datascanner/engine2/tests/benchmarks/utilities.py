@@ -2,7 +2,7 @@
 from pathlib import Path
 
 # Root folder for benchmarking data.
-DATA_ROOT = Path('/code/src/os2datascanner/engine2/tests/benchmarks/data/')
+DATA_ROOT = Path(__file__).parent / "data"
 
 # This is the html of the longest page on Wikipedia:
 # "List of victims of the September 11 attacks"
@@ -10,6 +10,11 @@ DATA_ROOT = Path('/code/src/os2datascanner/engine2/tests/benchmarks/data/')
 # irrelevant images and scripts have been removed.
 BIG_HTML = DATA_ROOT / 'list_9_11_victims.html'
 
+# A tab-separated export of a made-up spreadsheet with 3000 rows, each of which
+# contains several ten-digit numbers -- some of them valid CPR numbers in
+# various formats, some of them not -- and occasional notes in Danish.
+CPR_SPREADSHEET = DATA_ROOT / 'cpr_spreadsheet.tsv'
+
 
 def read_content(path):
     """Helper function that reads some content into memory."""
@@ -23,3 +28,4 @@ def read_content(path):
 
 # Read the contents into memory. Yes, this will hurt.
 HTML_CONTENT = read_content(BIG_HTML)
+SPREADSHEET_CONTENT = read_content(CPR_SPREADSHEET)
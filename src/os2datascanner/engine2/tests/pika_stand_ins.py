@@ -0,0 +1,149 @@
+"""In-memory stand-ins for Pika's blocking connection and channel classes, for
+testing PikaPipelineThread and its subclasses without a RabbitMQ server."""
+
+import gzip
+import json
+import threading
+from types import SimpleNamespace
+from collections import deque
+
+
+class StandInChannel:
+    """An in-memory stand-in for a Pika BlockingChannel that honours the
+    prefetch count and routes published messages straight to their queues
+    through the default exchange."""
+
+    def __init__(self, connection):
+        self._connection = connection
+        self._queues = {}
+        self._consumers = {}
+        self._unacked = set()
+        self._prefetch_count = 0
+        self._next_tag = 0
+        self.published = 0
+        self.commits = 0
+        # A record of everything sent to the broker, in order
+        self.log = []
+
+    @property
+    def prefetch_count(self):
+        return self._prefetch_count
+
+    def basic_qos(self, prefetch_count=0):
+        self._prefetch_count = prefetch_count
+
+    def queue_declare(self, queue, **kwargs):
+        self._queues.setdefault(queue, deque())
+        return SimpleNamespace(method=SimpleNamespace(queue=queue))
+
+    def exchange_declare(self, *args, **kwargs):
+        pass
+
+    def exchange_bind(self, *args, **kwargs):
+        pass
+
+    def queue_bind(self, *args, **kwargs):
+        pass
+
+    def basic_consume(self, queue, callback, **kwargs):
+        self._consumers[queue] = callback
+        return queue
+
+    def basic_cancel(self, consumer_tag):
+        self._consumers.pop(consumer_tag, None)
+
+    def basic_publish(self, exchange, routing_key, body, properties=None):
+        self.published += 1
+        self.log.append(("publish", routing_key))
+        self._queues.setdefault(routing_key, deque()).append((body, properties))
+
+    def basic_ack(self, delivery_tag, multiple=False):
+        # Like RabbitMQ, refuse to acknowledge something that isn't outstanding
+        assert delivery_tag in self._unacked, "unknown delivery tag"
+        self.log.append(("ack", delivery_tag, multiple))
+        if multiple:
+            self._unacked = {t for t in self._unacked if t > delivery_tag}
+        else:
+            self._unacked.discard(delivery_tag)
+
+    def basic_reject(self, delivery_tag, requeue=True):
+        self.log.append(("reject", delivery_tag, requeue))
+        self._unacked.discard(delivery_tag)
+
+    def tx_select(self):
+        pass
+
+    def tx_commit(self):
+        self.commits += 1
+        self.log.append(("commit",))
+
+    def close(self):
+        pass
+
+    def _can_deliver(self):
+        return (not self._prefetch_count
+                or len(self._unacked) < self._prefetch_count)
+
+    def messages(self, queue):
+        """Returns (and removes) the decoded bodies of the messages waiting
+        in the given queue."""
+        pending = self._queues.get(queue, deque())
+        bodies = []
+        while pending:
+            body, properties = pending.popleft()
+            if properties and properties.content_encoding == "gzip":
+                body = gzip.decompress(body)
+            bodies.append(json.loads(body))
+        return bodies
+
+    def deliverable(self):
+        return self._can_deliver() and any(
+                self._queues.get(q) for q in self._consumers)
+
+    def dispatch(self):
+        for queue, callback in list(self._consumers.items()):
+            pending = self._queues.get(queue)
+            while pending and self._can_deliver():
+                body, properties = pending.popleft()
+                self._next_tag += 1
+                self._unacked.add(self._next_tag)
+                callback(
+                        self,
+                        SimpleNamespace(
+                                routing_key=queue,
+                                delivery_tag=self._next_tag),
+                        properties or SimpleNamespace(
+                                priority=None, content_encoding=None),
+                        body)
+
+
+class StandInConnection:
+    """An in-memory stand-in for a Pika BlockingConnection. As with the real
+    thing, process_data_events blocks until there's something to deliver, a
+    thread-safe callback is requested, or the time limit elapses."""
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._callbacks = []
+        self._channel = StandInChannel(self)
+
+    def channel(self):
+        return self._channel
+
+    def add_callback_threadsafe(self, callback):
+        with self._condition:
+            self._callbacks.append(callback)
+            self._condition.notify()
+
+    def process_data_events(self, time_limit=0):
+        with self._condition:
+            if not self._channel.deliverable():
+                self._condition.wait_for(
+                        lambda: self._callbacks, timeout=time_limit)
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            callback()
+        self._channel.dispatch()
+
+    def close(self):
+        pass
@@ -1,11 +1,17 @@
 import os.path
 import unittest
+from datetime import datetime
+from tempfile import TemporaryDirectory
+import openpyxl
+import pandas as pd
 
 from os2datascanner.engine2.model.core import Source, SourceManager
 from os2datascanner.engine2.model.derived import libreoffice
+from os2datascanner.engine2.model.derived.spreadsheet import SpreadsheetSource
 from os2datascanner.engine2.model.file import FilesystemHandle
 from os2datascanner.engine2.rules.cpr import CPRRule
 from os2datascanner.engine2.conversions import convert
+from os2datascanner.engine2.conversions.types import OutputType
 
 
 here_path = os.path.dirname(__file__)
@@ -167,3 +173,41 @@ class Engine2CompoundSourceTest(unittest.TestCase):
                             libreoffice.LibreOfficeSource(spreadsheet_file),
                             sm,
                             offset=8)
+
+    def test_spreadsheet_text(self):
+        """Sheets of both OOXML and OpenDocument spreadsheets are converted to
+        text in the same way."""
+        rows = [
+            ["Navn", "CPR"],
+            ["Alice", 1310169996],
+            [None, None],
+            [None, "x"],
+            [datetime(2020, 1, 2), 1.5, True],
+        ]
+        with TemporaryDirectory() as d:
+            xlsx = os.path.join(d, "test.xlsx")
+            wb = openpyxl.Workbook()
+            for row in rows:
+                wb.active.append(row)
+            wb.active.title = "Ark1"
+            wb.save(xlsx)
+
+            ods = os.path.join(d, "test.ods")
+            pd.DataFrame(rows).to_excel(
+                    ods, engine="odf", sheet_name="Ark1",
+                    header=False, index=False)
+
+            for path in (xlsx, ods,):
+                with self.subTest(path), SourceManager() as sm:
+                    source = SpreadsheetSource(
+                            FilesystemHandle.make_handle(path))
+                    handles = list(source.handles(sm))
+                    resource = handles[0].follow(sm)
+
+                    self.assertEqual(
+                            [h.relative_path for h in handles], ["Ark1"])
+                    self.assertTrue(resource.check())
+                    self.assertEqual(
+                            convert(resource, OutputType.Text),
+                            "Navn\tCPR\nAlice\t1310169996\nx\n"
+                            "2020-01-02 00:00:00\t1.5\tTrue")
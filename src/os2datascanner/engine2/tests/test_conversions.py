@@ -1,10 +1,18 @@
 import pytest
 import os.path
+from unittest.mock import patch, Mock
+
+from os2datascanner.engine2 import settings
 
 from os2datascanner.engine2.model.core import SourceManager
 from os2datascanner.engine2.model.file import FilesystemHandle
 from os2datascanner.engine2.conversions.types import OutputType
 from os2datascanner.engine2.conversions.registry import convert
+from os2datascanner.engine2.conversions.text import ocr
+from os2datascanner.engine2.conversions.text.ocr import cached_ocr
+from os2datascanner.engine2.conversions.utilities import cache
+from os2datascanner.engine2.conversions.utilities.ocr_cache import OCRCache
+from os2datascanner.engine2.pipeline.processor import convert_cached
 
 
 class TestEngine2Conversion:
@@ -92,3 +100,189 @@ class TestEngine2Conversion:
 
         # Assert
         assert converted is None
+
+    def test_ocr_cache(self, tmp_path):
+        """OCR results are reused for identical images, but not across
+        different OCR configurations or versions of tesseract."""
+        # Arrange
+        image = os.path.join(os.path.dirname(__file__), "data/ocr/good/cpr.png")
+        compute = Mock(return_value="1111111118")
+
+        # Act
+        with patch.dict(settings.conversions["ocr_cache"],
+                        {"directory": str(tmp_path)}), \
+                patch.object(settings, "secret_value", "not a secret"), \
+                patch.object(ocr, "tesseract_version",
+                             return_value="tesseract 5.3.0\neng"):
+            results = [
+                    cached_ocr(image, compute, "tesseract"),
+                    cached_ocr(image, compute, "tesseract"),
+                    cached_ocr(image, compute, "convert", "tesseract")]
+            ocr.tesseract_version.return_value = "tesseract 5.3.0\ndan\neng"
+            results.append(cached_ocr(image, compute, "tesseract"))
+
+        # Assert
+        assert results == ["1111111118"] * 4
+        assert compute.call_count == 3
+        for path in tmp_path.glob("*/*"):
+            assert b"1111111118" not in path.read_bytes()
+
+    def test_ocr_cache_without_secret(self, tmp_path):
+        """OCR results can't be encrypted without a secret value, so they
+        aren't cached if one hasn't been configured."""
+        # Arrange
+        image = os.path.join(os.path.dirname(__file__), "data/ocr/good/cpr.png")
+        compute = Mock(return_value="1111111118")
+
+        # Act
+        with patch.dict(settings.conversions["ocr_cache"],
+                        {"directory": str(tmp_path)}), \
+                patch.object(settings, "secret_value", ""), \
+                patch.object(ocr, "tesseract_version",
+                             return_value="tesseract 5.3.0\neng"):
+            results = [
+                    cached_ocr(image, compute, "tesseract"),
+                    cached_ocr(image, compute, "tesseract")]
+
+        # Assert
+        assert results == ["1111111118"] * 2
+        assert compute.call_count == 2
+        assert not list(tmp_path.glob("*"))
+
+    def test_ocr_cache_eviction(self, tmp_path):
+        """OCR caches delete their least recently used results when they grow
+        too big, but leave files that aren't results alone."""
+        # Arrange
+        cache = OCRCache(tmp_path, max_size=250)
+        (tmp_path / "ab").mkdir()
+        in_progress = tmp_path / "ab" / "tmp_yjp2wlc"
+        in_progress.write_bytes(b"x" * 100)
+        os.utime(in_progress, (0, 0))
+
+        # Act
+        with patch.object(settings, "secret_value", "not a secret"):
+            for i in range(5):
+                cache.put(f"{i:064x}", "x" * 30)
+                # (make sure that every result has a distinct time of last
+                # use)
+                os.utime(cache._path(f"{i:064x}"), (i + 1, i + 1))
+            results = [cache.get(f"{i:064x}") for i in range(5)]
+
+        # Assert
+        assert results == [None, None, "x" * 30, "x" * 30, "x" * 30]
+        assert cache.hit_rate == 0.6
+        assert in_progress.exists()
+
+    def test_representation_cache(self, tmp_path):
+        """Representations of the configured types are reused by the processor
+        until they're evicted from the cache."""
+        # Arrange
+        real_convert = Mock(wraps=cache.convert)
+
+        # Act
+        with patch.dict(settings.conversions["cache"],
+                        {"directory": str(tmp_path), "output_types": ["text"],
+                         "max_age": 3600}), \
+                patch.object(settings, "secret_value", "not a secret"), \
+                patch.object(cache, "convert", real_convert):
+            first = convert_cached(self._hr, OutputType.Text)
+            second = convert_cached(self._hr, OutputType.Text)
+            convert_cached(self._hr, OutputType.Links)
+
+            for path in tmp_path.glob("*/*"):
+                os.utime(path, (0, 0))
+            cache.evict()
+            third = convert_cached(self._hr, OutputType.Text)
+
+        # Assert
+        assert first == second == third
+        assert real_convert.call_count == 2
+        assert len(list(tmp_path.glob("*/*"))) == 1
+
+    def test_representation_cache_without_last_modified(self, tmp_path):
+        """Representations of Resources that can't say when they were last
+        modified are never cached, as there'd be no way to tell when they
+        became stale."""
+        # Arrange
+        real_convert = Mock(wraps=cache.convert)
+
+        # Act
+        with patch.dict(settings.conversions["cache"],
+                        {"directory": str(tmp_path), "output_types": ["text"],
+                         "max_age": 3600}), \
+                patch.object(settings, "secret_value", "not a secret"), \
+                patch.object(cache, "convert", real_convert), \
+                patch.object(cache.CacheManager, "_get_resource_lm",
+                             return_value=None):
+            first = convert_cached(self._hr, OutputType.Text)
+            second = convert_cached(self._hr, OutputType.Text)
+
+        # Assert
+        assert first == second
+        assert real_convert.call_count == 2
+        assert not list(tmp_path.glob("*/*"))
+
+    def test_representation_cache_failed_conversion(self, tmp_path):
+        """Failed conversions are never cached, so that they're tried again
+        the next time they're needed."""
+        # Arrange
+        failing_convert = Mock(return_value=None)
+
+        # Act
+        with patch.dict(settings.conversions["cache"],
+                        {"directory": str(tmp_path), "output_types": ["text"],
+                         "max_age": 3600}), \
+                patch.object(settings, "secret_value", "not a secret"), \
+                patch.object(cache, "convert", failing_convert):
+            first = convert_cached(self._hr, OutputType.Text)
+            second = convert_cached(self._hr, OutputType.Text)
+
+        # Assert
+        assert first is second is None
+        assert failing_convert.call_count == 2
+        assert not list(tmp_path.glob("*/*"))
+
+    def test_representation_cache_without_secret(self, tmp_path):
+        """Representations can't be encrypted without a secret value, so the
+        cache isn't used if one hasn't been configured."""
+        # Act
+        with patch.dict(settings.conversions["cache"],
+                        {"directory": str(tmp_path), "output_types": ["text"],
+                         "max_age": 3600}), \
+                patch.object(settings, "secret_value", ""):
+            first = convert_cached(self._hr, OutputType.Text)
+            second = convert_cached(self._hr, OutputType.Text)
+
+        # Assert
+        assert first == second
+        assert first is not None
+        assert not list(tmp_path.glob("*"))
+
+    def test_representation_cache_eviction_race(self, tmp_path):
+        """Saving a representation should cope with an eviction removing its
+        folder at the wrong moment."""
+        # Arrange
+        real_ntf = cache.NamedTemporaryFile
+        calls = []
+
+        def _racing_ntf(*args, dir, **kwargs):
+            calls.append(dir)
+            if len(calls) == 1:
+                # Simulate another process's eviction removing the (empty)
+                # folder just after we created it
+                os.rmdir(dir)
+            return real_ntf(*args, dir=dir, **kwargs)
+
+        # Act
+        with patch.dict(settings.conversions["cache"],
+                        {"directory": str(tmp_path), "output_types": ["text"],
+                         "max_age": 3600}), \
+                patch.object(settings, "secret_value", "not a secret"), \
+                patch.object(cache, "NamedTemporaryFile", _racing_ntf):
+            first = convert_cached(self._hr, OutputType.Text)
+            second = convert_cached(self._hr, OutputType.Text)
+
+        # Assert
+        assert first == second
+        assert len(calls) == 2
+        assert len(list(tmp_path.glob("*/*"))) == 1
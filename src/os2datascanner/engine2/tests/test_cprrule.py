@@ -344,8 +344,22 @@ class TestCPRRule:
         ("1111119997", True, []),
         ("1111119998", True, []),
         ("1111119999", True, []),
-        ("1111119990", False, []),
-        ("1111119991", False, []),
+        ("1111119990", False, [
+            {'match': '1111XXXXXX',
+             'offset': 0,
+             'context': 'XXXXXX-XXXX',
+             'context_offset': 0,
+             'sensitivity': None,
+             'probability': 0.1}
+            ]),
+        ("1111119991", False, [
+            {'match': '1111XXXXXX',
+             'offset': 0,
+             'context': 'XXXXXX-XXXX',
+             'context_offset': 0,
+             'sensitivity': None,
+             'probability': 0.1}
+            ]),
         ("1111119992", False, [
             {'match': '1111XXXXXX',
              'offset': 0,
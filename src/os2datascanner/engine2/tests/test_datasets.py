@@ -0,0 +1,117 @@
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+from os2datascanner.engine2 import settings
+from os2datascanner.engine2.rules.rule import Rule
+from os2datascanner.engine2.rules.name import NameRule
+from os2datascanner.engine2.rules.address import AddressRule
+from os2datascanner.engine2.rules.wordlists import OrderedWordlistRule
+from os2datascanner.engine2.rules.datasets import wordset
+from os2datascanner.engine2.rules.datasets.loader import (
+        Loader, DatasetNotFoundError)
+
+
+class LoaderTests(unittest.TestCase):
+    def test_load_dataset_cached(self):
+        """Loading a dataset twice should return the entries read the first
+        time."""
+        loader = Loader()
+        dataset = ("wordlists", "en_20211018_unit_test_words")
+        entries = loader.load_dataset(*dataset)
+        self.assertIs(loader.load_dataset(*dataset), entries)
+
+    def test_words_flattened(self):
+        """The words of a dataset of lists should be flattened and
+        normalised."""
+        words = list(Loader().words(
+                "wordlists", "en_20211018_unit_test_words", case="lower"))
+        self.assertIn("good", words)
+        self.assertIn("dog", words)
+        self.assertTrue(all(isinstance(w, str) and w == w.lower()
+                            for w in words))
+
+    def test_missing_dataset(self):
+        with self.assertRaises(DatasetNotFoundError):
+            Loader().word_set("wordlists", "not_a_real_dataset")
+
+    def test_word_set_shared(self):
+        """Each word set should be built only once, and should be normalised
+        to the requested case."""
+        loader = Loader()
+        a = loader.word_set("names", "da_20140101_dst_efternavne",
+                            case="upper")
+        self.assertIs(
+                a, loader.word_set("names", "da_20140101_dst_efternavne",
+                                   case="upper"))
+        self.assertIn("JENSEN", a)
+        self.assertNotIn("Jensen", a)
+
+    def test_rules_share_word_sets(self):
+        """Rules deserialised from the same JSON object should look words up
+        in the same word sets."""
+        n1, n2 = (Rule.from_json_object(NameRule().to_json_object())
+                  for _ in range(2))
+        n1._load_datasets()
+        n2._load_datasets()
+        self.assertIs(n1.last_names, n2.last_names)
+        for a, b in zip(n1.first_names, n2.first_names, strict=True):
+            self.assertIs(a, b)
+
+        a1, a2 = (Rule.from_json_object(AddressRule().to_json_object())
+                  for _ in range(2))
+        a1._load_datasets()
+        a2._load_datasets()
+        self.assertIs(a1.street_names, a2.street_names)
+
+        obj = OrderedWordlistRule(
+                "en_20211018_unit_test_words").to_json_object()
+        w1, w2 = (Rule.from_json_object(obj) for _ in range(2))
+        self.assertIs(w1._wordlists, w2._wordlists)
+
+
+class WordSetTests(unittest.TestCase):
+    def setUp(self):
+        self._tempdir = tempfile.TemporaryDirectory()
+        self.directory = Path(self._tempdir.name)
+
+    def tearDown(self):
+        self._tempdir.cleanup()
+
+    def test_mapped_word_set(self):
+        """A memory-mapped word set should behave like a frozenset."""
+        words = {"ÆBLE", "ØRN", "ÅRHUS", "ABE", "ZEBRA", "Ünïcödé", ""}
+        path = self.directory / "test.wordset"
+        wordset.write_word_set(path, list(words) + ["ABE"])
+
+        mapped = wordset.MappedWordSet(path)
+        self.assertEqual(len(mapped), len(words))
+        self.assertEqual(set(mapped), words)
+        for word in words:
+            self.assertIn(word, mapped)
+        for word in ("ÆBL", "ØRNE", "abe", "AAA", "ZZZ", None,):
+            self.assertNotIn(word, mapped)
+
+    def test_not_a_word_set(self):
+        path = self.directory / "bad.wordset"
+        path.write_bytes(b"definitely not a word set")
+        with self.assertRaises(ValueError):
+            wordset.MappedWordSet(path)
+
+    def test_prebuilt_directory(self):
+        """If a prebuilt word set file exists, the Loader should map it rather
+        than reading the dataset."""
+        self.assertEqual(wordset.main([str(self.directory)]), 0)
+
+        datasets = dict(settings.rules["datasets"])
+        datasets["prebuilt_directory"] = str(self.directory)
+        with patch.dict(settings.rules, {"datasets": datasets}):
+            mapped = Loader().word_set(
+                    "wordlists", "en_20211018_unit_test_words", case="lower")
+        self.assertIsInstance(mapped, wordset.MappedWordSet)
+        self.assertEqual(
+                set(mapped),
+                set(Loader().words(
+                        "wordlists", "en_20211018_unit_test_words",
+                        case="lower")))
@@ -1,4 +1,5 @@
 import unittest
+from datetime import datetime
 
 from os2datascanner.engine2.model.smbc import SMBCSource, SMBCHandle
 
@@ -42,3 +43,18 @@ class HintTests(unittest.TestCase):
             self.assertIsNone(
                     self._handle.hint(k),
                     "hint survived deletion")
+
+    def test_stat_hints(self):
+        """SMBCResources use the stat hints attached to their Handles instead
+        of asking the server again."""
+        handle = SMBCHandle(
+                self._source, "Budget.xlsx",
+                hints={"st_size": 4096, "st_mtime": 1700000000.0})
+        # (with no SourceManager, any attempt to contact the server would
+        # fail)
+        resource = handle.follow(None)
+
+        self.assertEqual(resource.get_size(), 4096)
+        self.assertEqual(
+                resource.get_last_modified(),
+                datetime.fromtimestamp(1700000000.0))
@@ -1,11 +1,14 @@
 import os
 import os.path
 import http.server
+import tempfile
 import unittest
 import contextlib
+import threading
 import time
 from random import choice
 from datetime import datetime
+from email.utils import parsedate_to_datetime
 from multiprocessing import Manager, Process
 from requests import exceptions as rexc
 from unittest import mock
@@ -17,12 +20,14 @@ from os2datascanner.engine2.model.core import Handle, SourceManager
 from os2datascanner.engine2.model.http import (
         WebHandle, WebSource, try_make_relative)
 from os2datascanner.engine2.model.utilities.crawler import (
-        parse_html, make_outlinks)
+        WebCrawler, parse_html, make_outlinks)
+from os2datascanner.engine2.model.utilities.crawl_state import CrawlState
 from os2datascanner.engine2.model.utilities.sitemap import (
     process_sitemap_url, _get_url_data)
 from os2datascanner.engine2.conversions.types import Link, OutputType
 from os2datascanner.engine2.conversions.registry import convert
-from os2datascanner.engine2.rules.links_follow import check
+from os2datascanner.engine2.rules import links_follow
+from os2datascanner.engine2.rules.links_follow import check, check_all
 from os2datascanner.engine2 import settings as engine2_settings
 
 here_path = os.path.dirname(__file__)
@@ -459,6 +464,121 @@ def run_web_server(started):
         os.chdir(cwd)
 
 
+def test_crawl_state_round_trip():
+    """CrawlStates remember entries between crawls, and forget the entries of
+    URLs that a complete crawl didn't visit."""
+    entry = CrawlState.Entry(
+            etag='"abc"', last_modified="Fri, 06 Dec 2024 16:32:33 GMT",
+            content_type="text/html",
+            outlinks=(("http://localhost/a.html", {"title": "A"}),))
+    with tempfile.TemporaryDirectory() as td:
+        path = os.path.join(td, "state.sqlite3")
+
+        state = CrawlState(path)
+        state.put("http://localhost/", entry)
+        state.put("http://localhost/gone.html", CrawlState.Entry())
+        state.close(complete=True)
+
+        state = CrawlState(path)
+        assert state.get("http://localhost/") == entry
+        assert state.get("http://localhost/").validators == {
+            "If-None-Match": '"abc"',
+            "If-Modified-Since": "Fri, 06 Dec 2024 16:32:33 GMT",
+        }
+        state.keep("http://localhost/")
+        state.close(complete=True)
+
+        state = CrawlState(path)
+        assert state.get("http://localhost/") == entry
+        assert state.get("http://localhost/gone.html") is None
+        state.close()
+
+
+def test_crawl_state_periodic_commit():
+    """CrawlStates commit their changes as they go, so that an interrupted
+    crawl doesn't lose everything it learned."""
+    with tempfile.TemporaryDirectory() as td:
+        path = os.path.join(td, "state.sqlite3")
+
+        state = CrawlState(path)
+        for i in range(CrawlState.COMMIT_INTERVAL + 1):
+            state.put(f"http://localhost/{i}.html", CrawlState.Entry())
+        # (Simulate a crash by not closing the first CrawlState)
+        other = CrawlState(path)
+        try:
+            assert other.get("http://localhost/0.html") is not None
+            assert other.get(
+                    f"http://localhost/{CrawlState.COMMIT_INTERVAL}.html"
+                    ) is None
+        finally:
+            other.close()
+            state.close()
+
+
+def test_crawl_state_synthesised_last_modified():
+    """When a server doesn't say when a page was last modified, the date that
+    the crawler remembers instead should be a valid HTTP date."""
+    response = mock.Mock(content=b"<html></html>", headers={})
+    response.request.method = "GET"
+    with tempfile.TemporaryDirectory() as td:
+        state = CrawlState(os.path.join(td, "state.sqlite3"))
+        try:
+            crawler = WebCrawler(
+                    "http://localhost/", session=None, state=state)
+            crawler._remember("http://localhost/", response, None, [], {})
+            since = state.get("http://localhost/").validators[
+                    "If-Modified-Since"]
+        finally:
+            state.close()
+    assert since.endswith(" GMT")
+    assert parsedate_to_datetime(since) <= time_now()
+
+
+def test_crawler_per_host_limit():
+    """Concurrent crawlers should talk to each host one request at a time when
+    asked to, leaving the configured delay between the start of each
+    request, and should keep count of what they've done."""
+    requests_made = []
+    lock = threading.Lock()
+
+    def head(url, **kwargs):
+        start = time.monotonic()
+        time.sleep(0.02)
+        with lock:
+            requests_made.append((start, time.monotonic()))
+        response = mock.Mock(
+                status_code=200, headers={"Content-Type": "image/png"},
+                is_redirect=False)
+        response.request.method = "HEAD"
+        return response
+
+    session = mock.Mock()
+    session.head.side_effect = head
+    crawler = WebCrawler(
+            "http://localhost/", session=session,
+            workers=4, per_host=1, delay=0.05)
+    for i in range(6):
+        crawler.add(f"http://localhost/{i}.png")
+    # (this link isn't part of the site, so it shouldn't be fetched)
+    crawler.add("http://example.invalid/")
+
+    visited = [url for _, url in crawler.visit()]
+
+    assert len(visited) == 7
+    assert session.head.call_count == 6
+    requests_made.sort()
+    for (start, _), (next_start, _) in zip(requests_made, requests_made[1:]):
+        assert next_start - start >= 0.045
+    for (_, end), (next_start, _) in zip(requests_made, requests_made[1:]):
+        assert next_start >= end
+    metrics = crawler.metrics.to_dict()
+    assert metrics["pages"] == 6
+    assert metrics["unchanged"] == 0
+    assert metrics["pages_per_second"] > 0
+    assert metrics["max_queue_depth"] == 3
+    assert metrics["queue_depth"] == metrics["in_flight"] == 0
+
+
 class Engine2HTTPSetup():
     @classmethod
     def setUpClass(cls):
@@ -497,6 +617,38 @@ class Engine2HTTPExplorationTest(Engine2HTTPSetup, unittest.TestCase):
             "embedded site without sitemap should have 3 handles",
         )
 
+    def test_exploration_sequential(self):
+        "crawling one page at a time finds the same handles"
+
+        with SourceManager() as sm, mock.patch.dict(
+                engine2_settings.model["http"]["crawler"], {"workers": 1}):
+            presentation_urls = [
+                    h.presentation_url for h in site["source"].handles(sm)]
+        self.assertCountEqual(
+            presentation_urls,
+            site["handles"],
+            "sequential crawler should find the same 3 handles",
+        )
+
+    def test_exploration_incremental(self):
+        "a second crawl reuses what the first one found out"
+
+        with tempfile.TemporaryDirectory() as td, mock.patch.dict(
+                engine2_settings.model["http"]["crawler"],
+                {"state_directory": td}):
+            with SourceManager() as sm:
+                first = list(site["source"].handles(sm))
+            with SourceManager() as sm:
+                second = list(site["source"].handles(sm))
+
+        self.assertCountEqual(
+            [h.presentation_url for h in second],
+            site["handles"],
+            "second crawl should still find all 3 handles",
+        )
+        self.assertFalse(any(h.hint("fresh") for h in first))
+        self.assertTrue(all(h.hint("fresh") for h in second))
+
     def test_exploration_sitemap(self):
         "Use sitemap and no scraping"
 
@@ -1129,6 +1281,24 @@ class Engine2HTTPTest(Engine2HTTPSetup, unittest.TestCase):
         self.assertEqual(check(alive_links['403']), (True, 403))
         self.assertEqual(check(alive_links['500']), (True, 500))
 
+    def test_links_follow_check_all(self):
+        """check_all gives the same results as check, in the same order, and
+        remembers them."""
+        links = [dead_links['404'], alive_links['200'], dead_links['404'],
+                 alive_links['500']]
+        links_follow._cache.clear()
+        try:
+            self.assertEqual(
+                    check_all(links),
+                    [(False, 404), (True, 200), (False, 404), (True, 500)])
+            with mock.patch.object(links_follow, "check") as check_mock:
+                self.assertEqual(
+                        check_all(links),
+                        [(False, 404), (True, 200), (False, 404), (True, 500)])
+                check_mock.assert_not_called()
+        finally:
+            links_follow._cache.clear()
+
 
 class Engine2HTTPConversionTests(Engine2HTTPSetup, unittest.TestCase):
     def test_links_conversion(self):
@@ -0,0 +1,101 @@
+import os
+import sys
+import tempfile
+import unittest
+from subprocess import TimeoutExpired
+from unittest.mock import patch
+
+from os2datascanner.engine2 import settings
+from os2datascanner.engine2.model.derived import libreoffice
+
+
+# A stand-in for the libreoffice program: started with --invisible, it plays
+# the part of a server by locking its settings directory and waiting forever;
+# otherwise, it hangs if asked to, and does nothing if not
+FAKE_LIBREOFFICE = f"""#!{sys.executable}
+import os, sys, time
+profile = sys.argv[1].removeprefix("-env:UserInstallation=file://")
+if "--invisible" in sys.argv:
+    open(os.path.join(profile, ".lock"), "w").close()
+    time.sleep(600)
+elif "hang" in sys.argv:
+    time.sleep(600)
+"""
+
+
+class LibreOfficePoolTests(unittest.TestCase):
+    def setUp(self):
+        self._bindir = tempfile.TemporaryDirectory()
+        program = os.path.join(self._bindir.name, "libreoffice")
+        with open(program, "wt") as fp:
+            fp.write(FAKE_LIBREOFFICE)
+        os.chmod(program, 0o755)
+
+        self.pool = libreoffice.LibreOfficePool()
+        self._patches = [
+            patch.dict(os.environ, {
+                "PATH": self._bindir.name + os.pathsep + os.environ["PATH"]
+            }),
+            patch.dict(settings.subprocess, {"timeout": 5}),
+            patch.dict(settings.model["libreoffice"]["server"], {
+                "enabled": True, "instances": 1, "max_conversions": 2
+            }),
+            patch.object(libreoffice, "_pool", self.pool),
+        ]
+        for p in self._patches:
+            p.start()
+
+    def tearDown(self):
+        self.pool.shutdown()
+        for p in reversed(self._patches):
+            p.stop()
+        self._bindir.cleanup()
+
+    @property
+    def server(self):
+        server, = self.pool._servers
+        return server
+
+    def test_recycling(self):
+        """A server should be reused for the configured number of conversions,
+        and then replaced by a new one."""
+        libreoffice.libreoffice("--convert-to", "html")
+        pid = self.server._process.pid
+        libreoffice.libreoffice("--convert-to", "html")
+        self.assertEqual(self.server._process.pid, pid)
+        self.assertEqual(self.server.conversions, 2)
+
+        profile, tmpdir = self.server._profile.name, self.server._tmpdir.name
+        libreoffice.libreoffice("--convert-to", "html")
+        self.assertNotEqual(self.server._process.pid, pid)
+        self.assertEqual(self.server.conversions, 1)
+        with self.assertRaises(ProcessLookupError):
+            os.kill(pid, 0)
+        self.assertFalse(os.path.exists(profile))
+        self.assertFalse(os.path.exists(tmpdir))
+
+    def test_timeout(self):
+        """A conversion that takes too long should kill its server, and the
+        next conversion should start a new one."""
+        libreoffice.libreoffice("--convert-to", "html")
+        pid = self.server._process.pid
+
+        with patch.dict(settings.subprocess, {"timeout": 1}):
+            with self.assertRaises(TimeoutExpired):
+                libreoffice.libreoffice("hang")
+        self.assertFalse(self.server.alive)
+        with self.assertRaises(ProcessLookupError):
+            os.kill(pid, 0)
+
+        libreoffice.libreoffice("--convert-to", "html")
+        self.assertTrue(self.server.alive)
+        self.assertNotEqual(self.server._process.pid, pid)
+
+    def test_dead_server(self):
+        """A server that has died of its own accord should be replaced."""
+        libreoffice.libreoffice("--convert-to", "html")
+        self.server._process.kill()
+        self.server._process.wait()
+
+        libreoffice.libreoffice("--convert-to", "html")
+        self.assertTrue(self.server.alive)
@@ -0,0 +1,126 @@
+import io
+import os.path
+import zipfile
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from prometheus_client import REGISTRY
+
+from os2datascanner.engine2 import settings
+from os2datascanner.engine2.model.core import SourceManager
+from os2datascanner.engine2.model.file import FilesystemHandle
+from os2datascanner.engine2.model.derived.zip import ZipSource
+from os2datascanner.engine2.rules.regex import RegexRule
+from os2datascanner.engine2.conversions import convert
+from os2datascanner.engine2.conversions.types import OutputType
+from os2datascanner.engine2.utilities import metrics
+from os2datascanner.engine2.utilities.backoff import CountingRetrier
+
+
+def sample(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0
+
+
+class MetricsTests(unittest.TestCase):
+    def setUp(self):
+        self._tempdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self._tempdir.name, "archive.zip")
+        with zipfile.ZipFile(self.path, "w") as zf:
+            zf.writestr("member.txt", "This is the member's content")
+        metrics.enable("test")
+
+    def tearDown(self):
+        metrics.disable()
+        self._tempdir.cleanup()
+
+    def test_conversion_and_reads(self):
+        """Conversions, and the reads they make from resources, should be
+        timed and labelled with the type of their Source."""
+        labels = dict(stage="test", source_type="zip",
+                      mime_type="text/plain", output_type="text")
+        read_labels = dict(
+                stage="test", source_type="zip", operation="make_stream")
+        conversions = sample(
+                "os2datascanner_conversion_seconds_count", **labels)
+        bytes_read = sample(
+                "os2datascanner_resource_read_bytes_total", **read_labels)
+
+        with SourceManager() as sm:
+            source = ZipSource(FilesystemHandle.make_handle(self.path))
+            handle, = source.handles(sm)
+            self.assertEqual(
+                    convert(handle.follow(sm), OutputType.Text),
+                    "This is the member's content")
+
+        self.assertEqual(
+                sample("os2datascanner_conversion_seconds_count", **labels),
+                conversions + 1)
+        # (The content is read once to compute its type, and once again to
+        # convert it)
+        self.assertGreaterEqual(
+                sample("os2datascanner_resource_read_bytes_total",
+                       **read_labels),
+                bytes_read + len("This is the member's content"))
+
+    def test_counting_stream_iteration(self):
+        """Iterating over a wrapped stream should yield its lines and then
+        stop, whether the stream is binary or text."""
+        for content in (b"one\ntwo\n", "one\ntwo\n",):
+            with self.subTest(type=type(content).__name__):
+                stream = metrics._CountingStream(
+                        io.BytesIO(content) if isinstance(content, bytes)
+                        else io.StringIO(content))
+                self.assertEqual(list(stream), content.splitlines(True))
+                self.assertEqual(stream.bytes_read, len(content))
+
+    def test_rules(self):
+        """Evaluating a rule should be timed and labelled with its type."""
+        before = sample(
+                "os2datascanner_rule_match_seconds_count",
+                stage="test", rule_type="regex")
+        RegexRule("content").try_match({"text": "some content"})
+        self.assertEqual(
+                sample("os2datascanner_rule_match_seconds_count",
+                       stage="test", rule_type="regex"),
+                before + 1)
+
+    def test_retries(self):
+        """Retries should be counted."""
+        labels = dict(
+                stage="test", retrier="CountingRetrier",
+                exception="ConnectionError")
+        before = sample("os2datascanner_retries_total", **labels)
+        attempts = iter([ConnectionError(), ConnectionError(), "ok"])
+
+        def _operation():
+            if isinstance(result := next(attempts), Exception):
+                raise result
+            return result
+
+        self.assertEqual(
+                CountingRetrier(ConnectionError).run(_operation), "ok")
+        self.assertEqual(
+                sample("os2datascanner_retries_total", **labels),
+                before + 2)
+
+    def test_bounded_labels(self):
+        """Labels with open-ended values should only get a limited number of
+        distinct values."""
+        with patch.dict(settings.pipeline["metrics"], max_label_values=2):
+            label = metrics._BoundedLabel()
+            self.assertEqual(
+                    [label(v) for v in ("a", "b", "c", "a", "d")],
+                    ["a", "b", "other", "a", "other"])
+
+    def test_disabled(self):
+        """Nothing should be recorded when metrics are disabled."""
+        metrics.disable()
+        before = sample(
+                "os2datascanner_rule_match_seconds_count",
+                stage="test", rule_type="regex")
+        RegexRule("content").try_match({"text": "some content"})
+        self.assertEqual(
+                sample("os2datascanner_rule_match_seconds_count",
+                       stage="test", rule_type="regex"),
+                before)
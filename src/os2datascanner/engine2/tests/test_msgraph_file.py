@@ -1,4 +1,14 @@
-from ..model.msgraph.files import MSGraphDriveHandle, MSGraphFilesSource
+import json
+import requests
+from datetime import datetime, timezone
+from unittest.mock import Mock, patch
+
+from .. import settings
+from ..model.core import LastModifiedCutoff, Removed, SourceManager
+from ..model.msgraph.files import (
+        MSGraphDriveHandle, MSGraphDriveSource, MSGraphFilesSource)
+from ..model.msgraph.utilities import MSGraphSource
+from ..pipeline import messages
 
 
 class TestMSGraphDriveHandle:
@@ -28,3 +38,178 @@ class TestMSGraphDriveHandle:
 
         # Assert
         assert not the_same
+
+
+class StandInDeltaCaller:
+    """A stand-in for a GraphCaller that answers delta queries for a single
+    drive. Each delta link returns the changes registered for it."""
+
+    def __init__(self, initial, changes):
+        self._initial = initial
+        self._changes = changes
+        self.requests = []
+
+    def _response(self, items, link):
+        return Mock(json=Mock(return_value={
+                "value": items, "@odata.deltaLink": link}))
+
+    def get(self, tail, *args, headers=None):
+        self.requests.append(tail)
+        return self._response(self._initial, "link1")
+
+    def follow_next_link(self, link, *, headers=None):
+        self.requests.append(link)
+        return self._response(self._changes[link], link + "+")
+
+
+class TestMSGraphDriveDelta:
+    root = {"id": "root", "name": "root", "root": {},
+            "webUrl": "https://example.invalid/root"}
+
+    def _explore(self, gc, tag, since):
+        source = MSGraphDriveSource(MSGraphDriveHandle(
+                MSGraphFilesSource(None, "tenant", None),
+                "drive1", "Dokumenter", None))
+        sm = Mock(open=Mock(return_value=gc))
+        return [(type(h).__name__, (h.handle if isinstance(h, Removed) else h)
+                 .relative_path)
+                for h in source.handles(
+                        sm, cutoff=LastModifiedCutoff(since), scan_tag=tag)]
+
+    def test_incremental_exploration(self, tmp_path):
+        """Drives explored with delta queries yield only what changed, and
+        notice when renaming a folder changes the paths of its contents."""
+        # Arrange
+        t1 = datetime(2024, 1, 1, tzinfo=timezone.utc)
+        t2 = datetime(2024, 2, 1, tzinfo=timezone.utc)
+        tag = messages.ScanTagFragment.make_dummy()
+        gc = StandInDeltaCaller(
+                [self.root,
+                 {"id": "a", "name": "A", "folder": {},
+                  "parentReference": {"id": "root"}},
+                 {"id": "x", "name": "x.txt", "file": {},
+                  "parentReference": {"id": "a"}},
+                 {"id": "y", "name": "y.txt", "file": {},
+                  "parentReference": {"id": "root"}}],
+                {"link1": [
+                    {"id": "a", "name": "B", "folder": {},
+                     "parentReference": {"id": "root"}},
+                    {"id": "y", "deleted": {"state": "deleted"}},
+                    {"id": "z", "name": "z.txt", "file": {},
+                     "parentReference": {"id": "a"}}]})
+
+        # Act
+        with patch.dict(settings.model["msgraph"]["delta"],
+                        {"state_directory": str(tmp_path)}):
+            first = self._explore(gc, tag._replace(time=t1), None)
+            second = self._explore(gc, tag._replace(time=t2), t1)
+            # (The second exploration's scan never finished, so its delta
+            # link can't be trusted)
+            third = self._explore(gc, tag._replace(time=t2), t1)
+
+        # Assert
+        assert sorted(first) == [
+                ("MSGraphFileHandle", "A/x.txt"),
+                ("MSGraphFileHandle", "y.txt")]
+        assert sorted(second) == [
+                ("MSGraphFileHandle", "B/x.txt"),
+                ("MSGraphFileHandle", "B/z.txt"),
+                ("Removed", "A/x.txt"),
+                ("Removed", "y.txt")]
+        assert len(third) == 2
+        assert gc.requests == [
+                "drives/drive1/root/delta?$select=id,name,parentReference,"
+                "file,folder,root,deleted,webUrl,lastModifiedDateTime",
+                "link1",
+                "drives/drive1/root/delta?$select=id,name,parentReference,"
+                "file,folder,root,deleted,webUrl,lastModifiedDateTime"]
+
+
+class StandInDriveSession:
+    """A stand-in for a requests.Session that answers Microsoft Graph GET
+    requests from a dictionary of canned results."""
+
+    def __init__(self, results):
+        self._results = results
+        self.urls = []
+
+    def get(self, url, **kwargs):
+        self.urls.append(url)
+        response = requests.Response()
+        response.status_code = 200
+        response._content = json.dumps(self._results[url]).encode()
+        return response
+
+
+class TestMSGraphDriveExploration:
+    base = "https://graph.microsoft.com/v1.0/drives/drive1"
+    fields = "id,name,file,folder,webUrl,lastModifiedDateTime,size"
+
+    def _children(self, folder_id, page=None):
+        url = (f"{self.base}/items/{folder_id}/children"
+               f"?$top=999&$select={self.fields}")
+        return url + (f"&page={page}" if page else "")
+
+    def test_exploration(self):
+        """Drives are explored by following every page of every folder, and
+        the files found carry hints about their size and age."""
+        # Arrange
+        session = StandInDriveSession({
+            f"{self.base}/root?$select={self.fields}": {
+                "id": "root", "name": "root", "folder": {"childCount": 3},
+                "webUrl": "https://example.invalid/root"},
+            self._children("root"): {
+                "value": [
+                    {"id": "a", "name": "A", "folder": {"childCount": 2},
+                     "webUrl": "https://example.invalid/A"},
+                    {"id": "e", "name": "Empty", "folder": {"childCount": 0}},
+                    {"id": "n", "name": "Notebook",
+                     "package": {"type": "oneNote"}},
+                ],
+                "@odata.nextLink": self._children("root", 2)},
+            self._children("root", 2): {
+                "value": [
+                    {"id": "y", "name": "y.txt", "file": {}, "size": 12,
+                     "lastModifiedDateTime": "2024-03-01T00:00:00Z"},
+                ]},
+            self._children("a"): {
+                "value": [
+                    {"id": "x", "name": "x.txt", "file": {}, "size": 34,
+                     "lastModifiedDateTime": "2024-01-01T00:00:00Z",
+                     "webUrl": "https://example.invalid/A/x.txt"},
+                    {"id": "w", "name": "w.txt", "file": {}, "size": 56,
+                     "lastModifiedDateTime": "2023-01-01T00:00:00Z"},
+                ]},
+        })
+        gc = MSGraphSource.GraphCaller(lambda: "token", session)
+        source = MSGraphDriveSource(MSGraphDriveHandle(
+                MSGraphFilesSource(None, "tenant", None),
+                "drive1", "Dokumenter", None))
+        cutoff = LastModifiedCutoff(
+                datetime(2023, 6, 1, tzinfo=timezone.utc))
+
+        # Act
+        with SourceManager() as sm, patch.object(
+                sm, "open", return_value=gc):
+            handles = sorted(
+                    source.handles(sm, cutoff=cutoff),
+                    key=lambda h: h.relative_path)
+            x, y = handles
+            resources = [h.follow(sm) for h in handles]
+
+        # Assert
+        assert [h.relative_path for h in handles] == ["A/x.txt", "y.txt"]
+        assert x.presentation_url == "https://example.invalid/A/x.txt"
+        assert x.container_url == "https://example.invalid/A"
+        assert y.container_url == "https://example.invalid/root?view=0"
+        assert [r.get_size() for r in resources] == [34, 12]
+        assert [r.get_last_modified() for r in resources] == [
+                datetime(2024, 1, 1, tzinfo=timezone.utc),
+                datetime(2024, 3, 1, tzinfo=timezone.utc)]
+        # The empty folder and the notebook were never listed, and the files'
+        # metadata was never requested
+        assert sorted(session.urls) == sorted([
+                f"{self.base}/root?$select={self.fields}",
+                self._children("root"),
+                self._children("root", 2),
+                self._children("a")])
@@ -1,8 +1,15 @@
 import pytest
 from io import BytesIO
+from datetime import datetime, timezone
+from unittest.mock import Mock, patch
 from requests.models import Response
-from os2datascanner.engine2.model.msgraph.mail import MSGraphMailAccountSource
-from os2datascanner.engine2.model.core.utilities import SourceManager
+from os2datascanner.engine2 import settings
+from os2datascanner.engine2.model.msgraph.mail import (
+        MSGraphMailAccountHandle, MSGraphMailAccountSource,
+        MSGraphMailMessageHandle, MSGraphMailSource)
+from os2datascanner.engine2.model.core.utilities import (
+        LastModifiedCutoff, Removed, SourceManager)
+from os2datascanner.engine2.pipeline import messages
 
 
 class MockGraphCaller:
@@ -97,3 +104,89 @@ class TestMSGraphMailAccountSource:
         assert query == ("users/osdatascanner@microsoft.cloud/messages?$select=id,subject,webLink,"
                          "parentFolderId&$top=1&$filter=parentFolderId "
                          "ne 'a_very_real_folder_id'")
+
+
+class StandInMailCaller:
+    """A stand-in for a GraphCaller that knows about a single mail folder and
+    answers delta queries for it. Each delta link returns the changes
+    registered for it."""
+
+    def __init__(self, pn, initial, changes):
+        self._pn = pn
+        self._initial = initial
+        self._changes = changes
+        self.requests = []
+
+    def _response(self, value, link=None):
+        return Mock(json=Mock(return_value={"value": value} | (
+                {"@odata.deltaLink": link} if link else {})))
+
+    def get(self, tail, *args, headers=None):
+        if tail.startswith(f"users/{self._pn}/mailFolders?"):
+            return self._response([{
+                    "id": "inbox", "parentFolderId": "root",
+                    "displayName": "Indbakke", "childFolderCount": 0}])
+        self.requests.append(tail)
+        return self._response(self._initial, "link1")
+
+    def follow_next_link(self, link, *, headers=None):
+        self.requests.append(link)
+        return self._response(self._changes[link], link + "+")
+
+
+class TestMSGraphMailDelta:
+    pn = "osdatascanner@microsoft.cloud"
+
+    @staticmethod
+    def _message(mid, subject, ts):
+        return {"id": mid, "subject": subject, "parentFolderId": "inbox",
+                "webLink": f"https://example.invalid/{mid}",
+                "sentDateTime": ts, "lastModifiedDateTime": ts}
+
+    def _explore(self, gc, tag, since):
+        source = MSGraphMailAccountSource(MSGraphMailAccountHandle(
+                MSGraphMailSource(None, "tenant", None), self.pn))
+        sm = Mock(open=Mock(return_value=gc))
+        return list(source.handles(
+                sm, cutoff=LastModifiedCutoff(since), scan_tag=tag))
+
+    def test_incremental_exploration(self, tmp_path):
+        """Mail folders explored with delta queries yield only the messages
+        that changed, along with Removed objects, keyed by message ID, for
+        the messages that have gone away."""
+        # Arrange
+        t0 = datetime(2023, 12, 1, tzinfo=timezone.utc)
+        t1 = datetime(2024, 1, 1, tzinfo=timezone.utc)
+        t2 = datetime(2024, 2, 1, tzinfo=timezone.utc)
+        tag = messages.ScanTagFragment.make_dummy()
+        gc = StandInMailCaller(
+                self.pn,
+                [self._message("m1", "Old", "2023-06-01T00:00:00Z"),
+                 self._message("m2", "New", "2024-01-15T00:00:00Z")],
+                {"link1": [
+                    {"id": "m1", "@removed": {"reason": "deleted"}},
+                    self._message("m3", "Newer", "2024-01-20T00:00:00Z")]})
+
+        # Act
+        with patch.dict(settings.model["msgraph"]["delta"],
+                        {"state_directory": str(tmp_path)}):
+            first = self._explore(gc, tag._replace(time=t1), None)
+            second = self._explore(gc, tag._replace(time=t2), t1)
+            # (There's no delta link old enough to cover this cutoff, so the
+            # folder must be enumerated again, and the cutoff applied to it)
+            third = self._explore(gc, tag._replace(time=t2), t0)
+
+        # Assert
+        assert [h.relative_path for h in first] == ["m1", "m2"]
+        assert all(h.presentation_place.startswith("\"Indbakke\" of ")
+                   for h in first)
+
+        removed, added = second
+        assert isinstance(removed, Removed)
+        assert removed.handle == first[0]
+        assert isinstance(added, MSGraphMailMessageHandle)
+        assert added.relative_path == "m3"
+
+        assert [h.relative_path for h in third] == ["m2"]
+        assert gc.requests[1] == "link1"
+        assert gc.requests[0] == gc.requests[2]
@@ -2,10 +2,13 @@
 Unit tests for utilities for use with MS Graph.
 """
 
+import json
 import requests
 import unittest
 
 from os2datascanner.engine2.model.msgraph import utilities as msgu
+from os2datascanner.engine2.model.msgraph.mail import (
+        MSGraphMailSource, MSGraphMailAccountHandle)
 from os2datascanner.engine2.model.msgraph.graphiti import (builder,
                                                            baseclasses,
                                                            exceptions,
@@ -38,6 +41,100 @@ class TestGraphUtilities(unittest.TestCase):
                 "didn't get the expected status code")
 
 
+class StandInGraphSession:
+    """A stand-in for a requests.Session that answers Microsoft Graph JSON
+    batch requests from a dictionary of canned results. Every endpoint in the
+    throttled set is answered with HTTP 429 the first time it's requested."""
+
+    def __init__(self, results, throttled=()):
+        self._results = results
+        self._throttled = set(throttled)
+        self.batches = []
+
+    def _answer(self, request):
+        url = request["url"]
+        if url in self._throttled:
+            self._throttled.remove(url)
+            return {"status": 429, "headers": {"Retry-After": "0"}}
+        elif url in self._results:
+            return {"status": 200,
+                    "headers": {"Content-Type": "application/json"},
+                    "body": self._results[url]}
+        else:
+            return {"status": 404,
+                    "headers": {"Content-Type": "application/json"},
+                    "body": {"error": {"code": "ResourceNotFound"}}}
+
+    def post(self, url, **kwargs):
+        assert url == "https://graph.microsoft.com/v1.0/$batch"
+        requests_ = kwargs["json"]["requests"]
+        self.batches.append([r["url"] for r in requests_])
+        # Graph doesn't promise to return responses in the order of the
+        # requests, so we don't either
+        answers = [dict(self._answer(r), id=r["id"])
+                   for r in reversed(requests_)]
+
+        response = requests.Response()
+        response.status_code = 200
+        response._content = json.dumps({"responses": answers}).encode()
+        return response
+
+
+class TestGraphBatching(unittest.TestCase):
+    def setUp(self):
+        self.session = StandInGraphSession(
+                {f"/users/user{i}/messages?$select=id&$top=1": {
+                    "value": [{"id": "x"}] if i % 2 else []}
+                 for i in range(40)},
+                throttled={"/users/user7/messages?$select=id&$top=1"})
+        self.gc = msgu.MSGraphSource.GraphCaller(
+                lambda: "token", self.session)
+
+    def test_batch_get(self):
+        """GraphCaller.batch_get splits requests into batches of at most 20,
+        retries throttled requests, and returns the responses in order."""
+        tails = [f"users/user{i}/messages?$select=id&$top=1"
+                 for i in range(45)]
+
+        responses = self.gc.batch_get(tails)
+
+        self.assertEqual(
+                [len(b) for b in self.session.batches],
+                [20, 20, 5, 1])
+        self.assertEqual(
+                [r.status_code for r in responses],
+                [200] * 40 + [404] * 5)
+        self.assertEqual(
+                [bool(r.json()["value"]) for r in responses[:40]],
+                [bool(i % 2) for i in range(40)])
+        with self.assertRaises(requests.exceptions.HTTPError):
+            responses[-1].raise_for_status()
+
+    def test_mail_presence_probes(self):
+        """MSGraphMailSource batches its checks for which users have mails."""
+        gc = self.gc
+
+        class StandInSourceManager:
+            def open(self, source):
+                return gc
+
+        source = MSGraphMailSource(
+                None, "tenant", None,
+                userlist=[f"user{i}" for i in range(40)])
+
+        handles = list(source.handles(StandInSourceManager()))
+
+        self.assertEqual(
+                handles,
+                [MSGraphMailAccountHandle(source, f"user{i}")
+                 for i in range(1, 40, 2)])
+        # (The throttled request for user7 is retried before the second group
+        # of users is looked at)
+        self.assertEqual(
+                [len(b) for b in self.session.batches],
+                [20, 1, 20])
+
+
 class TestMSGraphURLBuilder(unittest.TestCase):
     """
     Unit tests for the MSGraphURLBuilder utility class.
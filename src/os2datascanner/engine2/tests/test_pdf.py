@@ -0,0 +1,135 @@
+import os
+import tempfile
+import unittest
+from subprocess import TimeoutExpired
+from unittest.mock import patch
+
+from PIL import Image
+
+from os2datascanner.engine2 import settings
+from os2datascanner.engine2.model.derived.pdf import PDFDocument
+
+
+here_path = os.path.dirname(__file__)
+test_data_path = os.path.join(here_path, "data", "pdf")
+
+
+class FakeTools:
+    """Stands in for run_custom, producing the output that pdftotext and
+    pdfimages would produce for a two-page document with two images on its
+    second page."""
+
+    def __init__(self, fail=0):
+        self.calls = []
+        self.fail = fail
+
+    def __call__(self, args, *, timeout, **kwargs):
+        page = int(args[args.index("-f") + 1]) if "-f" in args else None
+        self.calls.append((args[0], page, timeout))
+        if self.fail:
+            self.fail -= 1
+            raise TimeoutExpired(args, timeout)
+        if args[0] == "pdftotext":
+            with open(args[-1], "wt") as fp:
+                fp.write(f"Text on page {page}" if page
+                         else "Text on page one\fText on page two\f")
+        elif args[0] == "pdfimages" and page in (2, None,):
+            for num, colour in enumerate((0, 255,)):
+                Image.new("L", (200, 200), color=colour).save(
+                        f"{args[-1]}-{num:03d}.png" if page
+                        else f"{args[-1]}-002-{num:03d}.png")
+
+
+class PDFDocumentTests(unittest.TestCase):
+    def setUp(self):
+        self._outputdir = tempfile.TemporaryDirectory()
+        self.document = PDFDocument(
+                os.path.join(test_data_path, "embedded-cpr.pdf"),
+                self._outputdir.name, {})
+
+    def tearDown(self):
+        self._outputdir.cleanup()
+
+    def extract(self, tools):
+        with patch(
+                "os2datascanner.engine2.model.derived.pdf.run_custom",
+                tools):
+            return {
+                page: sorted(os.listdir(self.document.page_directory(page)))
+                for page in (1, 2,)}
+
+    def test_batched_extraction(self):
+        """When the document is being expanded, each tool should be run once
+        for the whole document, and their output sorted into one directory
+        for each page."""
+        tools = FakeTools()
+        self.document.expand()
+        self.assertEqual(
+                self.extract(tools),
+                {
+                    1: ["page.txt"],
+                    2: ["image-000.png", "image-001.png", "page.txt"],
+                })
+        self.assertEqual(
+                [(tool, page) for tool, page, _ in tools.calls],
+                [("pdftotext", None), ("pdfimages", None)])
+        with open(os.path.join(
+                self.document.page_directory(2), "page.txt")) as fp:
+            self.assertEqual(fp.read(), "Text on page two")
+
+        # Asking for another page shouldn't run anything again
+        self.extract(tools)
+        self.assertEqual(len(tools.calls), 2)
+
+    def test_single_page_extraction(self):
+        """When the document isn't being expanded, only the pages that are
+        asked for should be extracted."""
+        tools = FakeTools()
+        with patch(
+                "os2datascanner.engine2.model.derived.pdf.run_custom",
+                tools):
+            directory = self.document.page_directory(2)
+            self.document.page_directory(2)
+        self.assertEqual(
+                sorted(os.listdir(directory)),
+                ["image-000.png", "image-001.png", "page.txt"])
+        self.assertEqual(
+                [(tool, page) for tool, page, _ in tools.calls],
+                [("pdftotext", 2), ("pdfimages", 2)])
+        self.assertEqual(os.listdir(self._outputdir.name), ["2"])
+
+    def _test_retry_after_failure(self):
+        tools = FakeTools(fail=1)
+        with self.assertRaises(TimeoutExpired):
+            self.extract(tools)
+        self.assertEqual(os.listdir(self._outputdir.name), [])
+
+        self.assertEqual(
+                self.extract(tools)[2],
+                ["image-000.png", "image-001.png", "page.txt"])
+
+    def test_retry_after_failure(self):
+        """If a tool fails, the partial output should be removed, so that the
+        extraction can be tried again."""
+        self.document.expand()
+        self._test_retry_after_failure()
+
+    def test_single_page_retry_after_failure(self):
+        """If a tool fails on a single page, the partial output should be
+        removed, so that the extraction can be tried again."""
+        self._test_retry_after_failure()
+
+    def test_bounded_timeout(self):
+        """The time limit for the whole document should grow with the number
+        of pages, but never beyond the document limit; the time limit for a
+        single page shouldn't."""
+        tools = FakeTools()
+        with patch.dict(settings.subprocess,
+                        {"timeout": 10, "document_timeout": 15}):
+            self.extract(tools)
+            self.document.expand()
+            self.document._pages.clear()
+            self.extract(tools)
+        self.assertEqual(
+                {(page, timeout) for _, page, timeout in tools.calls},
+                {(1, 10), (2, 10), (None, 15)})
@@ -0,0 +1,136 @@
+import time
+import unittest
+
+from ..pipeline.utilities.pika import PikaPipelineThread
+from .pika_stand_ins import StandInConnection
+
+
+class StandInPipelineThread(PikaPipelineThread):
+    def make_connection(self):
+        return StandInConnection()
+
+
+def wait_until(predicate, timeout=5.0):
+    """Waits for the given predicate to become true, returning how long that
+    took, or raises an AssertionError if it doesn't happen in time."""
+    start = time.monotonic()
+    while not predicate():
+        if time.monotonic() - start > timeout:
+            raise AssertionError("condition not met in time")
+        time.sleep(0.01)
+    return time.monotonic() - start
+
+
+class PikaBatchingTests(unittest.TestCase):
+    def start(self, count, **kwargs):
+        """Starts the background thread of a new PikaPipelineThread
+        with the given number of messages waiting for it."""
+        self.runner = StandInPipelineThread(
+                read=["test_in"], write=["test_out"], **kwargs)
+        self.channel = self.runner.channel
+        for i in range(count):
+            self.channel.basic_publish(
+                    exchange="", routing_key="test_in",
+                    body=b'{"index": %d}' % i)
+        self.channel.log.clear()
+        self.runner.start()
+
+    def tearDown(self):
+        self.runner.enqueue_stop()
+        self.runner.join()
+
+    def events(self, kind):
+        return [e for e in self.channel.log if e[0] == kind]
+
+    def handle(self):
+        """Receives a message and enqueues a result and an acknowledgement for
+        it, as run_consumer would, returning its delivery tag."""
+        method, _, body = self.runner.await_message(timeout=5.0)
+        self.runner.enqueue_message("test_out", body)
+        self.runner.enqueue_ack(method.delivery_tag)
+        return method.delivery_tag
+
+    def test_prefetch(self):
+        """The prefetch count should be raised to the batch size, so that the
+        broker can deliver a whole batch before any of it is acknowledged."""
+        self.start(10, prefetch_count=1, batch_size=8, batch_latency=60)
+
+        self.assertEqual(self.channel.prefetch_count, 8)
+        wait_until(lambda: len(self.runner._incoming) == 8)
+        time.sleep(0.1)
+        self.assertEqual(len(self.runner._incoming), 8)
+
+    def test_prefetch_unbatched(self):
+        """Without batching, the prefetch count should be left alone."""
+        self.start(0, prefetch_count=1)
+
+        self.assertEqual(self.channel.prefetch_count, 1)
+
+    def test_deferred_acks(self):
+        """Acknowledgements should be held back until a full batch has been
+        handled, and should then be committed after the batch's
+        publications."""
+        self.start(3, batch_size=3, batch_latency=60)
+
+        self.handle()
+        self.handle()
+        wait_until(lambda: len(self.events("publish")) == 2)
+        time.sleep(0.1)
+        self.assertFalse(self.events("ack"))
+        self.assertFalse(self.events("commit"))
+
+        self.handle()
+        wait_until(lambda: self.events("commit"))
+        self.assertEqual(
+                [e[0] for e in self.channel.log],
+                ["publish", "publish", "publish", "ack", "commit"])
+        self.assertEqual(self.events("ack"), [("ack", 3, True)])
+        self.assertFalse(self.channel._unacked)
+        self.assertEqual(len(self.channel.messages("test_out")), 3)
+
+    def test_partial_batch(self):
+        """A batch that isn't full should be committed when the batch latency
+        expires."""
+        self.start(1, batch_size=10, batch_latency=0.5)
+
+        self.handle()
+        elapsed = wait_until(lambda: self.events("commit"))
+        self.assertGreaterEqual(elapsed, 0.4)
+        self.assertEqual(
+                self.channel.log,
+                [("publish", "test_out"), ("ack", 1, True), ("commit",)])
+        self.assertFalse(self.channel._unacked)
+
+    def test_out_of_order_acks(self):
+        """A multiple=True acknowledgement should only cover a run of handled
+        deliveries; anything after a gap should be acknowledged separately."""
+        self.start(3, batch_size=10, batch_latency=60)
+
+        first, _, _ = self.runner.await_message(timeout=5.0)
+        self.runner.await_message(timeout=5.0)
+        third, _, _ = self.runner.await_message(timeout=5.0)
+        self.runner.enqueue_ack(third.delivery_tag)
+        self.runner.enqueue_ack(first.delivery_tag)
+        self.runner.synchronise(timeout=5.0)
+
+        self.assertEqual(
+                self.events("ack"), [("ack", 1, True), ("ack", 3, False)])
+        self.assertEqual(self.channel._unacked, {2})
+
+    def test_await_batch(self):
+        """await_batch should collect up to batch_size messages, giving up on
+        a partial batch when the batch latency expires."""
+        self.start(5, batch_size=3, batch_latency=0.2)
+
+        batch = self.runner.await_batch(
+                self.runner.await_message(timeout=5.0))
+        self.assertEqual(len(batch), 3)
+        # (The broker won't deliver any more until these have been dealt with)
+        for method, _, _ in batch:
+            self.runner.enqueue_ack(method.delivery_tag)
+
+        start = time.monotonic()
+        batch = self.runner.await_batch(
+                self.runner.await_message(timeout=5.0))
+        self.assertEqual(len(batch), 2)
+        self.assertGreaterEqual(time.monotonic() - start, 0.15)
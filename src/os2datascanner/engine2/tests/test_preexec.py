@@ -8,7 +8,9 @@ from os2datascanner.engine2.model import file
 from os2datascanner.engine2.model.core import SourceManager
 from os2datascanner.engine2.rules import logical
 from os2datascanner.engine2.rules.last_modified import LastModifiedRule
-from os2datascanner.engine2.rules.utilities.analysis import compute_mss
+from os2datascanner.engine2.rules.regex import RegexRule
+from os2datascanner.engine2.rules.utilities.analysis import (
+        compute_mss, compute_required_literal)
 from os2datascanner.engine2.pipeline import explorer, messages
 
 
@@ -57,6 +59,37 @@ class TestPreExec:
         """The minimal set of SimpleRules is calculated correctly."""
         assert compute_mss(rule) == mss
 
+    @pytest.mark.parametrize(
+            "expression,literal",
+            [
+                ("fortrolig", "fortrolig"),
+                # The longest of several required runs is picked...
+                (r"[\w.]+@[\w.]+\.dk", ".dk"),
+                # ... including runs common to all branches of an alternation
+                (r"Konto(?:nummer|nr)\.? ?\d+", "Konton"),
+                # Optional parts of the expression are never required
+                (r"(?:foo)?bar", "bar"),
+                (r"x(?:yz)+w", "yz"),
+                ("a|b", None),
+                # Case-insensitive literals can't be looked for exactly
+                ("(?i)hemmelig", None),
+                ("(?i:ab)cd", "cd"),
+                (r"\b(\d{6})[ -]?(\d{4})\b", None),
+            ])
+    def test_required_literal_computation(self, expression, literal):
+        """The longest required literal of a regular expression is calculated
+        correctly."""
+        assert compute_required_literal(expression) == literal
+
+    def test_required_literal_skipping(self):
+        """RegexRules don't find anything in content without their required
+        literal, but otherwise behave as usual."""
+        rule = RegexRule(r"Konto(?:nummer|nr)\.? ?\d+")
+        assert not list(rule.match("Konto 1234 mangler"))
+        assert [m["match"] for m in rule.match(
+                "Kontonummer 1234 og Kontonr. 5678")] == [
+                        "Kontonummer 1234", "Kontonr. 5678"]
+
     def test_explorer_rule(self):
         """The pipeline's explorer stage correctly propagates rules to Sources
         for pre-execution."""
@@ -80,13 +113,20 @@ class TestPreExec:
                     rule=LastModifiedRule(after=after_first_two))
 
             # Act
+            replies = list(explorer.message_received_raw(
+                    message.to_json_object(), "os2ds_scan_specs", sm))
             message_objects = [
                     messages.ConversionMessage.from_json_object(j)
-                    for channel, j in explorer.message_received_raw(
-                            message.to_json_object(),
-                            "os2ds_scan_specs", sm)
+                    for channel, j in replies
                     if channel == "os2ds_conversions"]
             handle_names = set(msg.handle.name for msg in message_objects)
+            status, = [
+                    messages.StatusMessage.from_json_object(j)
+                    for channel, j in replies
+                    if channel == "os2ds_status"]
 
             # Assert
             assert handle_names == {"test_three.txt"}
+            # Skipped objects are still accounted for in the status message
+            assert status.total_objects == 3
+            assert status.skipped_by_last_modified == 2
@@ -0,0 +1,103 @@
+import os
+import json
+import unittest
+from types import SimpleNamespace
+from unittest.mock import patch
+
+from ..pipeline import run_stage
+from .pika_stand_ins import StandInConnection
+
+
+MESSAGE_COUNT = 6
+
+
+def _echo(body, channel, source_manager):
+    """A stand-in pipeline stage: reports the process that handled each
+    message, unless it's been asked to fail."""
+    if body.get("fail"):
+        raise ValueError("asked to fail")
+    yield ("test_out", {"index": body["index"], "pid": os.getpid()})
+
+
+TEST_STAGE = SimpleNamespace(
+        READS_QUEUES=("test_in",),
+        WRITES_QUEUES=("test_out",),
+        PROMETHEUS_DESCRIPTION="Messages handled by the test stage",
+        PREFETCH_COUNT=1,
+        message_received_raw=_echo)
+
+
+class RunStageProcessesTests(unittest.TestCase):
+    def setUp(self):
+        self.connection = StandInConnection()
+        self.channel = self.connection.channel()
+        self._patches = [
+            # The tagger stage doesn't preload any datasets, so it's a cheap
+            # one to stand in for
+            patch.dict(run_stage._module_mapping, {"tagger": TEST_STAGE}),
+            patch.object(
+                    run_stage.GenericRunner, "make_connection",
+                    lambda runner: self.connection),
+            patch.object(run_stage, "restarting", False),
+        ]
+        for p in self._patches:
+            p.start()
+
+    def tearDown(self):
+        for p in reversed(self._patches):
+            p.stop()
+
+    def _send(self, *bodies):
+        for body in bodies:
+            self.channel.basic_publish(
+                    exchange="", routing_key="test_in",
+                    body=json.dumps(body).encode())
+        self.channel.log.clear()
+
+    def _run(self, *args):
+        run_stage.main(
+                ["--processes", "2", *args, "tagger"],
+                standalone_mode=False)
+
+    def test_processes(self):
+        """Messages handled by a pool of processes should each be acknowledged
+        once, after their results have been published."""
+        self._send(*({"index": i} for i in range(MESSAGE_COUNT)))
+
+        with self.assertRaises(SystemExit) as cm:
+            self._run("--restart-after", str(MESSAGE_COUNT))
+        self.assertEqual(cm.exception.code, 0)
+
+        self.assertFalse(self.channel._unacked)
+        published = 0
+        for event in self.channel.log:
+            if event[0] == "publish":
+                published += 1
+            elif event[0] == "ack":
+                published -= 1
+                self.assertGreaterEqual(
+                        published, 0, "message acknowledged before its results")
+        acks = [e for e in self.channel.log if e[0] == "ack"]
+        self.assertCountEqual(
+                [tag for _, tag, _ in acks],
+                range(1, MESSAGE_COUNT + 1))
+        outputs = self.channel.messages("test_out")
+        self.assertCountEqual(
+                [o["index"] for o in outputs],
+                range(MESSAGE_COUNT))
+        self.assertNotIn(
+                os.getpid(), {o["pid"] for o in outputs},
+                "messages were handled in the main process")
+
+    def test_processes_failure(self):
+        """An exception raised in a handler process should stop the runner,
+        leaving the failed message unacknowledged."""
+        self._send({"index": 0, "fail": True})
+
+        with self.assertRaisesRegex(Exception, "Handler process failed") as cm:
+            self._run()
+        self.assertIsInstance(cm.exception.__cause__, ValueError)
+
+        self.assertEqual(self.channel._unacked, {1})
+        self.assertFalse(
+                [e for e in self.channel.log if e[0] in ("ack", "publish")])
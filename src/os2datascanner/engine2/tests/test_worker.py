@@ -0,0 +1,177 @@
+import os.path
+import zipfile
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from os2datascanner.engine2 import settings
+from os2datascanner.engine2.model.core import SourceManager
+from os2datascanner.engine2.model.file import (
+        FilesystemSource, FilesystemHandle)
+from os2datascanner.engine2.rules.regex import RegexRule
+from os2datascanner.engine2.pipeline import explorer, messages, worker
+
+
+def tally_status(replies, total_sources=1) -> dict:
+    """Adds up the status messages produced by a scan in the same way that the
+    administration system's status collector does, starting with the given
+    number of Sources."""
+    counts = dict(
+            total_sources=total_sources, explored_sources=0,
+            total_objects=0, scanned_objects=0)
+    for channel, msg in replies:
+        if channel != "os2ds_status":
+            continue
+        if msg["total_objects"] is not None:
+            counts["total_objects"] += msg["total_objects"]
+            counts["explored_sources"] += 1
+        elif msg["object_size"] is not None and msg["object_type"]:
+            counts["scanned_objects"] += 1
+        counts["total_sources"] += msg["new_sources"] or 0
+    return counts
+
+
+class WorkerExpansionTests(unittest.TestCase):
+    def setUp(self):
+        self._tempdir = tempfile.TemporaryDirectory()
+        with zipfile.ZipFile(
+                os.path.join(self._tempdir.name, "archive.zip"), "w") as zf:
+            for i in range(5):
+                zf.writestr(f"member{i}.txt", f"This is member number {i}")
+
+        source = FilesystemSource(self._tempdir.name)
+        rule = RegexRule("member")
+        self.message = messages.ConversionMessage(
+                scan_spec=messages.ScanSpecMessage(
+                        scan_tag=messages.ScanTagFragment.make_dummy(),
+                        source=source,
+                        rule=rule,
+                        configuration={},
+                        filter_rule=None,
+                        progress=None),
+                handle=FilesystemHandle(source, "archive.zip"),
+                progress=messages.ProgressFragment(
+                        rule=rule, matches=[])).to_json_object()
+
+    def tearDown(self):
+        self._tempdir.cleanup()
+
+    def run_worker(self, **policy):
+        with SourceManager() as sm, patch.dict(
+                settings.pipeline["worker"], policy):
+            return list(worker.message_received_raw(
+                    self.message, "os2ds_conversions", sm))
+
+    def channels(self, replies):
+        return [channel for channel, _ in replies]
+
+    def test_inline_expansion(self):
+        """Small derived Sources should be scanned completely in-process."""
+        replies = self.run_worker(inline_max_size=0, inline_max_children=0)
+        channels = self.channels(replies)
+
+        self.assertEqual(channels.count("os2ds_matches"), 5)
+        self.assertNotIn("os2ds_conversions", channels)
+        self.assertNotIn("os2ds_scan_specs", channels)
+
+    def test_child_offloading(self):
+        """Children past the configured limit should be sent back to the
+        conversions queue and accounted for in a status message."""
+        replies = self.run_worker(inline_max_size=0, inline_max_children=2)
+        channels = self.channels(replies)
+
+        self.assertEqual(channels.count("os2ds_matches"), 2)
+        self.assertEqual(channels.count("os2ds_conversions"), 3)
+        self.assertIn(
+                3,
+                [msg["total_objects"] for channel, msg in replies
+                 if channel == "os2ds_status"])
+        # The derived Source was explored here, so it must also have been
+        # announced
+        counts = tally_status(replies, total_sources=0)
+        self.assertEqual(
+                counts["explored_sources"], counts["total_sources"])
+
+    def test_container_offloading(self):
+        """Derived Sources bigger than the configured limit should be sent
+        back to the explorer."""
+        replies = self.run_worker(inline_max_size=1, inline_max_children=0)
+        channels = self.channels(replies)
+
+        self.assertEqual(channels.count("os2ds_scan_specs"), 1)
+        self.assertNotIn("os2ds_matches", channels)
+        self.assertEqual(
+                tally_status(replies, total_sources=0)["total_sources"], 1)
+
+
+class WorkerScanTests(unittest.TestCase):
+    """Runs whole scans, passing messages between an explorer and a worker in
+    this process, to check that the status messages they produce still add up
+    when the worker offloads work."""
+
+    def setUp(self):
+        self._tempdir = tempfile.TemporaryDirectory()
+        with zipfile.ZipFile(
+                os.path.join(self._tempdir.name, "archive.zip"), "w") as zf:
+            for i in range(5):
+                zf.writestr(f"member{i}.txt", f"This is member number {i}")
+        with open(os.path.join(self._tempdir.name, "plain.txt"), "w") as fp:
+            fp.write("This is not a member")
+
+        self.scan_spec = messages.ScanSpecMessage(
+                scan_tag=messages.ScanTagFragment.make_dummy(),
+                source=FilesystemSource(self._tempdir.name),
+                rule=RegexRule("member"),
+                configuration={},
+                filter_rule=None,
+                progress=None).to_json_object()
+
+    def tearDown(self):
+        self._tempdir.cleanup()
+
+    def run_scan(self, **policy):
+        handlers = {
+            "os2ds_scan_specs": explorer.message_received_raw,
+            "os2ds_conversions": worker.message_received_raw,
+        }
+        queue = [("os2ds_scan_specs", self.scan_spec)]
+        replies = []
+        with SourceManager() as sm, patch.dict(
+                settings.pipeline["worker"], policy):
+            while queue:
+                channel, body = queue.pop(0)
+                for reply in handlers[channel](body, channel, sm):
+                    if reply[0] in handlers:
+                        queue.append(reply)
+                    else:
+                        replies.append(reply)
+        return replies
+
+    def assert_completed(self, replies):
+        counts = tally_status(replies)
+        self.assertGreater(counts["total_objects"], 0)
+        self.assertEqual(
+                counts["explored_sources"], counts["total_sources"])
+        self.assertEqual(counts["scanned_objects"], counts["total_objects"])
+
+    def test_inline_scan_completes(self):
+        replies = self.run_scan(inline_max_size=0, inline_max_children=0)
+        self.assertEqual(
+                sum(channel == "os2ds_matches" for channel, _ in replies), 6)
+        self.assert_completed(replies)
+
+    def test_child_offloading_scan_completes(self):
+        """A scan in which a worker offloads some of a derived Source's
+        children should still complete."""
+        replies = self.run_scan(inline_max_size=0, inline_max_children=2)
+        self.assertEqual(
+                sum(channel == "os2ds_matches" for channel, _ in replies), 6)
+        self.assert_completed(replies)
+
+    def test_container_offloading_scan_completes(self):
+        """A scan in which a worker sends a derived Source back to the
+        explorer should still complete."""
+        replies = self.run_scan(inline_max_size=1, inline_max_children=0)
+        self.assertEqual(
+                sum(channel == "os2ds_matches" for channel, _ in replies), 6)
+        self.assert_completed(replies)
@@ -6,6 +6,7 @@ import structlog
 
 from os2datascanner.utils.timer import TimerManager
 from os2datascanner.utils.system_utilities import time_now
+from . import metrics
 from .datetime import parse_datetime
 
 
@@ -66,6 +67,7 @@ class Retrier:
             except Exception as ex:
                 logger.debug(f'Retrier: Exception raised: {ex}')
                 if self._should_retry(ex):
+                    metrics.count_retry(self, ex)
                     self._before_retry(ex, operation)
                     if self._should_proceed:
                         continue
@@ -0,0 +1,255 @@
+"""Fine-grained Prometheus metrics for the engine: how long conversions, rules
+and reads from resources take, how many bytes are read, and how often
+operations are retried.
+
+Collection is disabled by default, in which case every instrumented
+operation costs only a check of a global flag. The pipeline enables it (with
+enable()) when it's asked to export metrics."""
+
+import os
+import time
+import threading
+from functools import wraps
+
+from prometheus_client import Counter, Histogram
+
+from .. import settings
+
+
+# Conversions and reads can take anything from a millisecond (a cached text
+# file) to several minutes (OCR of a big scanned document)
+_BUCKETS = (
+        0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0,
+        60.0, 300.0, float("inf"),)
+
+_conversion_seconds = Histogram(
+        "os2datascanner_conversion_seconds",
+        "Time taken to convert a resource to a representation",
+        ["stage", "source_type", "mime_type", "output_type"],
+        buckets=_BUCKETS)
+_rule_seconds = Histogram(
+        "os2datascanner_rule_match_seconds",
+        "Time taken to evaluate a simple rule against a representation",
+        ["stage", "rule_type"],
+        buckets=_BUCKETS)
+_read_seconds = Histogram(
+        "os2datascanner_resource_read_seconds",
+        "Time taken to open a resource and to read from it",
+        ["stage", "source_type", "operation"],
+        buckets=_BUCKETS)
+_read_bytes = Counter(
+        "os2datascanner_resource_read_bytes",
+        "Bytes read from resources (or, for paths, the size of the file)",
+        ["stage", "source_type", "operation"])
+_retries = Counter(
+        "os2datascanner_retries",
+        "Operations retried after a transient error",
+        ["stage", "retrier", "exception"])
+
+
+_enabled = False
+_stage = ""
+
+
+def enable(stage: str):
+    """Enables the collection of metrics in this process, labelling them with
+    the given pipeline stage."""
+    global _enabled, _stage
+    _enabled = True
+    _stage = stage
+
+
+def disable():
+    global _enabled
+    _enabled = False
+
+
+def is_enabled() -> bool:
+    return _enabled
+
+
+class _BoundedLabel:
+    """A _BoundedLabel passes through the first few distinct values it sees,
+    and replaces all of the others with "other". This keeps the number of time
+    series behind a label with an open-ended set of values (MIME types, for
+    example) under control."""
+
+    def __init__(self):
+        self._seen = set()
+        self._lock = threading.Lock()
+
+    def __call__(self, value) -> str:
+        value = str(value)
+        if value in self._seen:
+            return value
+        with self._lock:
+            if len(self._seen) < settings.pipeline["metrics"][
+                    "max_label_values"]:
+                self._seen.add(value)
+                return value
+        return "other"
+
+
+_mime_type_label = _BoundedLabel()
+_exception_label = _BoundedLabel()
+
+
+def _source_type(resource) -> str:
+    try:
+        return resource.handle.source.type_label
+    except AttributeError:
+        return "unknown"
+
+
+def time_conversion(resource, mime_type, output_type, converter):
+    """Calls converter(resource), recording how long it took if metrics are
+    enabled."""
+    if not _enabled:
+        return converter(resource)
+    start = time.perf_counter()
+    try:
+        return converter(resource)
+    finally:
+        _conversion_seconds.labels(
+                _stage, _source_type(resource), _mime_type_label(mime_type),
+                output_type.value).observe(time.perf_counter() - start)
+
+
+def time_rule(rule, evaluate, *args):
+    """Calls evaluate(rule, *args), recording how long it took to evaluate the
+    given SimpleRule if metrics are enabled."""
+    if not _enabled:
+        return evaluate(rule, *args)
+    start = time.perf_counter()
+    try:
+        return evaluate(rule, *args)
+    finally:
+        _rule_seconds.labels(_stage, rule.type_label).observe(
+                time.perf_counter() - start)
+
+
+def count_retry(retrier, ex: Exception):
+    if _enabled:
+        _retries.labels(
+                _stage, type(retrier).__name__,
+                _exception_label(type(ex).__name__)).inc()
+
+
+class _CountingStream:
+    """A _CountingStream wraps a file-like object, keeping track of how many
+    bytes were read from it and how long that took. Everything else is passed
+    through to the wrapped object."""
+
+    def __init__(self, stream):
+        self._stream = stream
+        self.bytes_read = 0
+        self.seconds = 0.0
+
+    def _timed(self, method, *args):
+        start = time.perf_counter()
+        try:
+            result = method(*args)
+        finally:
+            self.seconds += time.perf_counter() - start
+        if isinstance(result, int):
+            # (readinto and readinto1 return the number of bytes read)
+            self.bytes_read += result
+        elif result is not None:
+            self.bytes_read += len(result)
+        return result
+
+    def read(self, *args):
+        return self._timed(self._stream.read, *args)
+
+    def read1(self, *args):
+        return self._timed(self._stream.read1, *args)
+
+    def readinto(self, b):
+        return self._timed(self._stream.readinto, b)
+
+    def readinto1(self, b):
+        return self._timed(self._stream.readinto1, b)
+
+    def readline(self, *args):
+        return self._timed(self._stream.readline, *args)
+
+    def readlines(self, *args):
+        start = time.perf_counter()
+        try:
+            lines = self._stream.readlines(*args)
+        finally:
+            self.seconds += time.perf_counter() - start
+        self.bytes_read += sum(len(line) for line in lines)
+        return lines
+
+    def __iter__(self):
+        # (The wrapped stream might be a text stream, so stop at any empty
+        # line, not just at b"")
+        while (line := self.readline()):
+            yield line
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return self._stream.__exit__(*args)
+
+    def __getattr__(self, name):
+        return getattr(self._stream, name)
+
+
+class _TimedResourceContext:
+    """A _TimedResourceContext wraps the context manager returned by
+    FileResource.make_stream or FileResource.make_path, recording the time
+    taken to produce its value (and, for streams, to read from it) and the
+    number of bytes that were read."""
+
+    def __init__(self, context, resource, operation):
+        self._context = context
+        self._resource = resource
+        self._operation = operation
+        self._stream = None
+        self._seconds = 0.0
+        self._size = 0
+
+    def __enter__(self):
+        start = time.perf_counter()
+        value = self._context.__enter__()
+        self._seconds = time.perf_counter() - start
+        if self._operation == "make_stream":
+            value = self._stream = _CountingStream(value)
+        else:
+            # (The file behind the path might not exist any more once the
+            # context has been exited, so measure it now)
+            try:
+                self._size = os.path.getsize(value)
+            except (OSError, TypeError):
+                pass
+        return value
+
+    def __exit__(self, *args):
+        try:
+            return self._context.__exit__(*args)
+        finally:
+            seconds, size = self._seconds, self._size
+            if self._stream is not None:
+                seconds += self._stream.seconds
+                size = self._stream.bytes_read
+            labels = (_stage, _source_type(self._resource), self._operation)
+            _read_seconds.labels(*labels).observe(seconds)
+            _read_bytes.labels(*labels).inc(size)
+
+
+def instrument_resource_method(method):
+    """Decorator: instruments a FileResource.make_stream or
+    FileResource.make_path implementation, so that (if metrics are enabled)
+    the time it takes and the number of bytes it produces are recorded."""
+    operation = method.__name__
+
+    @wraps(method)
+    def _method(self, *args, **kwargs):
+        context = method(self, *args, **kwargs)
+        if not _enabled:
+            return context
+        return _TimedResourceContext(context, self, operation)
+    return _method
@@ -1,4 +1,6 @@
+import json
 import math
+import time
 import structlog
 
 from django.conf import settings
@@ -11,6 +13,7 @@ from django.core.management.base import BaseCommand
 from prometheus_client import Summary, start_http_server
 
 from os2datascanner.utils import debug
+from os2datascanner.utils.system_utilities import json_utf8_decode
 from os2datascanner.engine2.pipeline import messages
 from os2datascanner.engine2.pipeline.utilities.pika import PikaPipelineThread
 
@@ -24,93 +27,170 @@ SUMMARY = Summary("os2datascanner_scan_status_collector_admin",
                   "Messages through ScanStatus collector")
 
 
-def status_message_received_raw(body):  # noqa: CCR001 complexity
-    """A status message for a scannerjob is created in Scanner.run().
-    Therefore, this method can focus merely on updating the ScanStatus object."""
-    message = messages.StatusMessage.from_json_object(body)
+class ScanStatusDelta:
+    """A ScanStatusDelta is the combined effect of a number of status messages
+    on the ScanStatus of a single scan, so that the ScanStatus can be updated
+    once for all of them."""
 
-    try:
-        scanner = Scanner.objects.get(pk=message.scan_tag.scanner.pk)
-    except Scanner.DoesNotExist:
-        # This is a residual message for a scanner that the administrator has
-        # deleted. Throw it away
-        return
+    # The counters of a ScanStatus that status messages add to
+    COUNTERS = (
+            "total_objects", "scanned_objects", "scanned_size",
+            "skipped_by_last_modified", "matches_found",
+            "total_sources", "explored_sources",)
+
+    def __init__(self, scan_tag: dict):
+        self.scan_tag = scan_tag
+        self.counts = dict.fromkeys(self.COUNTERS, 0)
+        # The message text and error flag of the latest explorer or worker
+        # status message, if there was one
+        self.status = None
+        self.messages = 0
 
+    def add(self, message: messages.StatusMessage):
+        """Adds the effect of a status message to this ScanStatusDelta."""
+        self.messages += 1
+        counts = self.counts
+        if message.total_objects is not None:
+            # An explorer has finished exploring a Source. Objects that it
+            # skipped because of a LastModifiedRule are included in
+            # total_objects, but will never reach a worker, so count them as
+            # scanned straight away
+            counts["total_objects"] += message.total_objects
+            counts["scanned_objects"] += message.skipped_by_last_modified or 0
+            counts["explored_sources"] += 1
+            self.status = (message.message, message.status_is_error)
+        elif message.object_size is not None and message.object_type is not None:
+            # A worker has finished processing a Handle
+            counts["scanned_size"] += message.object_size
+            counts["scanned_objects"] += 1
+            self.status = (message.message, message.status_is_error)
+
+        if message.new_sources:
+            # Workers that send a derived Source back to the explorer announce
+            # it in a status message of its own
+            counts["total_sources"] += message.new_sources
+        if message.skipped_by_last_modified:
+            counts["skipped_by_last_modified"] += (
+                    message.skipped_by_last_modified)
+        if message.matches_found is not None:
+            counts["matches_found"] += message.matches_found
+
+    def to_update(self) -> dict:
+        """Returns the keyword arguments for a QuerySet.update call that
+        applies this ScanStatusDelta."""
+        update = {
+            k: F(k) + v for k, v in self.counts.items() if v}
+        if self.status is not None:
+            text, is_error = self.status
+            update |= {
+                "message": text,
+                "last_modified": timezone.now(),
+                "status_is_error": is_error,
+            }
+        return update
+
+
+def _snapshot_due(scan_status: ScanStatus, scanned_before: int) -> bool:
+    """Decides whether or not a snapshot should be taken of a ScanStatus,
+    given the number of scanned objects it had before its latest update."""
+    n_total = scan_status.total_objects
+    if not n_total or n_total <= 0:
+        return False
+    # Calculate a frequency for how often to take a snapshot.
+    # n_total must be at least 2 for this to work.
+    frequency = max(1, math.floor(
+            n_total * math.log(settings.SNAPSHOT_PARAMETER, max(n_total, 2))))
+    # It's time to take a snapshot if the count of scanned objects has
+    # reached a multiple of the frequency (or if it's stayed on one). An
+    # update can cover several objects, so check every count that it passed
+    scanned = scan_status.scanned_objects
+    first = scanned_before + 1 if scanned > scanned_before else scanned
+    return scanned - scanned % frequency >= first
+
+
+def update_scan_status(scanner: Scanner, delta: ScanStatusDelta):
+    """Applies a ScanStatusDelta to the ScanStatus of a scan, and then takes
+    a snapshot of it or sends the completion mail for it if necessary."""
     locked_qs = ScanStatus.objects.select_for_update(
         of=('self',)
     ).filter(
         scanner=scanner,
-        scan_tag=body["scan_tag"]
+        scan_tag=delta.scan_tag
     )
     # Queryset is evaluated immediately with .first() to lock the database entry.
     scan_status = locked_qs.first()
+    if not scan_status:
+        return
 
-    if message.total_objects is not None:
-        # An explorer has finished exploring a Source
-        locked_qs.update(
-                message=message.message,
-                last_modified=timezone.now(),
-                status_is_error=message.status_is_error,
-                total_objects=F('total_objects') + message.total_objects,
-                total_sources=F('total_sources') + (message.new_sources or 0),
-                explored_sources=F('explored_sources') + 1)
-
-    elif message.object_size is not None and message.object_type is not None:
-        # A worker has finished processing a Handle
-        locked_qs.update(
-                message=message.message,
-                last_modified=timezone.now(),
-                status_is_error=message.status_is_error,
-                scanned_size=F('scanned_size') + message.object_size,
-                scanned_objects=F('scanned_objects') + 1)
-
-    if message.skipped_by_last_modified:
-        locked_qs.update(skipped_by_last_modified=F("skipped_by_last_modified") +
-                         message.skipped_by_last_modified)
-
-    if message.matches_found is not None:
-        locked_qs.update(matches_found=F('matches_found') + message.matches_found)
-
-    # Get the frequency setting and decide whether to create a snapshot
-    snapshot_param = settings.SNAPSHOT_PARAMETER
-
-    if scan_status:
-        # We've just updated using locked_qs, refresh our saved instance before proceeding.
+    scanned_before = scan_status.scanned_objects
+    if (update := delta.to_update()):
+        locked_qs.update(**update)
+        # We've just updated using locked_qs, refresh our saved instance
+        # before proceeding.
         scan_status.refresh_from_db()
-        n_total = scan_status.total_objects
-        if n_total and n_total > 0:
-            # Calculate a frequency for how often to take a snapshot.
-            # n_total must be at least 2 for this to work.
-            frequency = n_total * math.log(snapshot_param, max(n_total, 2))
-            # Decide whether it is time to take a snapshot.
-            take_snap = scan_status.scanned_objects % max(1, math.floor(frequency))
-            if take_snap == 0:
-                ScanStatusSnapshot.objects.create(
-                    scan_status=scan_status,
-                    time_stamp=timezone.now(),
-                    total_sources=scan_status.total_sources,
-                    explored_sources=scan_status.explored_sources,
-                    total_objects=scan_status.total_objects,
-                    scanned_objects=scan_status.scanned_objects,
-                    scanned_size=scan_status.scanned_size,
-                    skipped_by_last_modified=scan_status.skipped_by_last_modified,
-                )
-
-        if scan_status.finished:
-            if not scan_status.email_sent:
-                # Send email upon scannerjob completion
-                logger.info("Sending notification mail for finished scannerjob.")
-                send_mail_upon_completion(scanner, scan_status)
-                scan_status.email_sent = True
-                scan_status.save()
-            else:
-                logger.warning(
-                    "BUG: received status message for a ScanStatus marked as complete!",
-                    scan_status=scan_status, message=message)
+
+    if _snapshot_due(scan_status, scanned_before):
+        ScanStatusSnapshot.objects.create(
+            scan_status=scan_status,
+            time_stamp=timezone.now(),
+            total_sources=scan_status.total_sources,
+            explored_sources=scan_status.explored_sources,
+            total_objects=scan_status.total_objects,
+            scanned_objects=scan_status.scanned_objects,
+            scanned_size=scan_status.scanned_size,
+            skipped_by_last_modified=scan_status.skipped_by_last_modified,
+        )
+
+    if scan_status.finished:
+        if not scan_status.email_sent:
+            # Send email upon scannerjob completion
+            logger.info("Sending notification mail for finished scannerjob.")
+            send_mail_upon_completion(scanner, scan_status)
+            scan_status.email_sent = True
+            scan_status.save()
+        else:
+            logger.warning(
+                "BUG: received status message for a ScanStatus marked as complete!",
+                scan_status=scan_status, messages=delta.messages)
+
+
+def status_message_received_raw(body):
+    """A status message for a scannerjob is created in Scanner.run().
+    Therefore, this method can focus merely on updating the ScanStatus object."""
+    message = messages.StatusMessage.from_json_object(body)
+
+    try:
+        scanner = Scanner.objects.get(pk=message.scan_tag.scanner.pk)
+    except Scanner.DoesNotExist:
+        # This is a residual message for a scanner that the administrator has
+        # deleted. Throw it away
+        return
+
+    delta = ScanStatusDelta(body["scan_tag"])
+    delta.add(message)
+    update_scan_status(scanner, delta)
 
     yield from []
 
 
+def coalesce_status_messages(bodies) -> list[tuple[Scanner, ScanStatusDelta]]:
+    """Combines a number of status messages into one ScanStatusDelta for each
+    of the scans that they're about. Messages for scanners that no longer
+    exist are thrown away."""
+    deltas = {}
+    for body in bodies:
+        message = messages.StatusMessage.from_json_object(body)
+        key = json.dumps(body["scan_tag"], sort_keys=True)
+        if key not in deltas:
+            deltas[key] = ScanStatusDelta(body["scan_tag"])
+        deltas[key].add(message)
+
+    scanners = Scanner.objects.in_bulk(
+            {d.scan_tag["scanner"]["pk"] for d in deltas.values()})
+    return [(scanners[pk], d) for d in deltas.values()
+            if (pk := d.scan_tag["scanner"]["pk"]) in scanners]
+
+
 class StatusCollectorRunner(PikaPipelineThread):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
@@ -135,14 +215,63 @@ class StatusCollectorRunner(PikaPipelineThread):
                     "Could not get or create object, due to DataError",
                     error=de)
 
+    def dispatch_message(self, method, properties, body):
+        """In batch mode, combines a batch of status messages into a single
+        update for each scan that they're about, and acknowledges them only
+        once those updates have been committed."""
+        if not self.batching:
+            return super().dispatch_message(method, properties, body)
+
+        deliveries = self.await_batch((method, properties, body))
+        bodies = [json_utf8_decode(b) for _, _, b in deliveries]
+        start = time.monotonic()
+        with transaction.atomic():
+            coalesced = coalesce_status_messages(
+                    b for (m, _, _), b in zip(deliveries, bodies)
+                    if m.routing_key == "os2ds_status")
+            for scanner, delta in coalesced:
+                try:
+                    with transaction.atomic():
+                        update_scan_status(scanner, delta)
+                except DataError as de:
+                    # (See handle_message)
+                    logger.error(
+                        "Could not get or create object, due to DataError",
+                        error=de, messages=delta.messages)
+
+        elapsed = time.monotonic() - start
+        logger.debug(
+                "status batch committed", size=len(deliveries),
+                scans=len(coalesced), elapsed=elapsed)
+        for (m, _, _), b in zip(deliveries, bodies):
+            SUMMARY.observe(elapsed / len(deliveries))
+            self.enqueue_ack(m.delivery_tag)
+            self.after_message(m.routing_key, b)
+
 
 class Command(BaseCommand):
     """Command for starting a ScanStatus collector process."""
     help = __doc__
 
-    def handle(self, *args, **options):
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1024,
+            help="The largest number of status messages to combine into a"
+                 " single update of each scan's status.")
+        parser.add_argument(
+            "--batch-latency",
+            type=float,
+            default=500,
+            help="The longest time, in milliseconds, to wait for more status"
+                 " messages to arrive before updating scan statuses.")
+
+    def handle(self, *args, batch_size, batch_latency, **options):
         debug.register_debug_signal()
 
         StatusCollectorRunner(
             read=["os2ds_status"],
-            prefetch_count=1024).run_consumer()
+            prefetch_count=1024,
+            batch_size=batch_size,
+            batch_latency=batch_latency / 1000).run_consumer()
@@ -0,0 +1,75 @@
+# Generated by Django 3.2.11 on 2026-10-17 10:12
+
+from django.db import migrations, models
+
+from os2datascanner.utils.batch import BatchUpdate
+
+
+# (Kept in step with HISTOGRAM_BUCKETS in adminapp.models.scannerjobs.
+# analysisscanner, but copied here so that this migration doesn't change if
+# that value does)
+HISTOGRAM_BUCKETS = 48
+
+
+def summarise_sizes(apps, schema_editor):
+    TypeStats = apps.get_model('os2datascanner', 'TypeStats')
+
+    with BatchUpdate(
+            TypeStats.objects,
+            ["count", "total_size", "histogram"]) as batch:
+        for ts in TypeStats.objects.order_by("pk").iterator():
+            sizes = ts.sizes or []
+            ts.count = len(sizes)
+            ts.total_size = sum(sizes)
+            ts.histogram = [0] * HISTOGRAM_BUCKETS
+            for size in sizes:
+                ts.histogram[
+                        min(max(size, 0).bit_length(),
+                            HISTOGRAM_BUCKETS - 1)] += 1
+            batch.append(ts)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('os2datascanner', '0136_alter_scanner_options'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='analysisjob',
+            name='handled',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='analysisjob',
+            name='to_handle',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='typestats',
+            name='count',
+            field=models.IntegerField(default=0, verbose_name='number of files'),
+        ),
+        migrations.AddField(
+            model_name='typestats',
+            name='total_size',
+            field=models.BigIntegerField(default=0, verbose_name='total size'),
+        ),
+        migrations.AddField(
+            model_name='typestats',
+            name='histogram',
+            field=models.JSONField(default=list, verbose_name='size histogram'),
+        ),
+        migrations.RunPython(
+                summarise_sizes,
+                reverse_code=migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='typestats',
+            name='sizes',
+        ),
+        migrations.AddConstraint(
+            model_name='typestats',
+            constraint=models.UniqueConstraint(fields=('analysis_job', 'mime_type'), name='unique_type_per_analysis_job'),
+        ),
+    ]
@@ -1,25 +1,63 @@
+import time
+import threading
 import structlog
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
 
 from .scanner import Scanner
-from django.db import models
+from django.db import models, transaction
 from django.utils.translation import gettext_lazy as _
 from os2datascanner.projects.admin.core.models import BackgroundJob
+from os2datascanner.projects.admin.core.models.background_job import JobState
 from os2datascanner.engine2.model.core import SourceManager
 
 logger = structlog.get_logger("adminapp")
 
 
+# The number of buckets in a TypeStats size histogram. Bucket 0 counts empty
+# files, and bucket n counts files of at least 2^(n-1) and less than 2^n
+# bytes; the last bucket also counts everything bigger than that
+HISTOGRAM_BUCKETS = 48
+
+
+def histogram_bucket(size: int) -> int:
+    """Returns the index of the TypeStats histogram bucket that counts files
+    of the given size."""
+    return min(max(size, 0).bit_length(), HISTOGRAM_BUCKETS - 1)
+
+
 class AnalysisJob(BackgroundJob):
     """
     Model for running analysis job to get sizes of files
     """
 
+    # The number of threads used to look up the sizes of files that the
+    # exploration didn't already tell us about
+    workers = 8
+    # Statistics are written to the database every flush_every files or every
+    # flush_interval seconds, whichever comes first
+    flush_every = 1000
+    flush_interval = 10.0
+
     scanner = models.ForeignKey(Scanner,
                                 on_delete=models.CASCADE)
 
+    handled = models.IntegerField(null=True, blank=True)
+    to_handle = models.IntegerField(null=True, blank=True)
+
+    @property
+    def progress(self):
+        # (The exploration and the analysis happen at the same time, so this
+        # is only relative to the files that have been found so far)
+        return (self.handled / self.to_handle
+                if self.handled is not None and self.to_handle not in (0, None)
+                else None)
+
+    @property
+    def job_label(self) -> str:
+        return "Analysis Job"
+
     def run(self):
         logger.info("Running ...")
-        sm = SourceManager()
 
         source = list(
             Scanner.objects.select_subclasses().get(
@@ -28,16 +66,95 @@ class AnalysisJob(BackgroundJob):
         if not source:
             return
 
-        for handle in source.handles(sm):
+        # SourceManagers can't be shared between threads, so each worker
+        # thread gets its own
+        local = threading.local()
+        managers = []
 
+        def _get_size(handle):
+            if not hasattr(local, "sm"):
+                local.sm = SourceManager()
+                managers.append(local.sm)
+            # (Resources that were given the size of their file by the
+            # exploration won't go back to the server to ask again)
+            return handle.follow(local.sm).get_size()
+
+        summary = _AnalysisSummary(self)
+        sm = SourceManager()
+        try:
+            with ThreadPoolExecutor(
+                    max_workers=self.workers,
+                    thread_name_prefix="AnalysisJob") as executor:
+                finished = self._analyse(
+                        source.handles(sm), executor, _get_size, summary)
+            if finished:
+                summary.flush()
+        finally:
+            sm.clear()
+            for m in managers:
+                m.clear()
+
+    def _analyse(self, handles, executor, get_size, summary) -> bool:
+        """Has the given executor find the sizes of the files behind the given
+        handles, collecting them into the given summary. Returns False if
+        this job was cancelled before all of the handles were examined."""
+        pending = {}
+        for handle in handles:
             # Is the handle actually an error? Skip it.
             if isinstance(handle, tuple) and handle[1]:
                 continue
 
-            # Are we unable to determine the size of the resource? Skip the handle.
+            summary.found += 1
+            pending[executor.submit(get_size, handle)] = handle
+            # Don't let the exploration get too far ahead of the workers, or
+            # the queue of pending handles will grow without bound
+            if len(pending) >= 2 * self.workers:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                summary.collect(pending, done)
+
+            if summary.flush_due:
+                summary.flush()
+                if self.exec_state == JobState.CANCELLING:
+                    for future in pending:
+                        future.cancel()
+                    return False
+
+        summary.collect(pending, wait(pending).done)
+        return True
+
+    def __str__(self):
+        return f'Analysis for {self.scanner}'
+
+
+class _AnalysisSummary:
+    """An _AnalysisSummary builds up the TypeStats of an AnalysisJob from the
+    sizes of the files that it examines, and writes them (and the job's
+    progress) to the database every so often."""
+
+    def __init__(self, job: AnalysisJob):
+        self.job = job
+        self.stats = {}
+        self.found = 0
+        self.examined = 0
+        self.last_flush = time.monotonic()
+
+    @property
+    def flush_due(self) -> bool:
+        return (self.examined - (self.job.handled or 0) >= self.job.flush_every
+                or time.monotonic() - self.last_flush
+                >= self.job.flush_interval)
+
+    def collect(self, pending: dict, done):
+        """Removes the given completed futures from the pending dictionary
+        and adds the sizes of their files to the statistics."""
+        for future in done:
+            handle = pending.pop(future)
+            self.examined += 1
             try:
-                size = handle.follow(sm).get_size()
+                size = future.result()
             except OSError:
+                # Are we unable to determine the size of the resource? Skip
+                # the handle
                 continue
 
             mime = handle.guess_type()
@@ -45,22 +162,38 @@ class AnalysisJob(BackgroundJob):
             if mime == "application/octet-stream":
                 continue
 
-            type_object, created = TypeStats.objects.get_or_create(analysis_job=self,
-                                                                   mime_type=mime)
-
-            if created:
-                type_object.sizes = [size]
-            else:
-                type_object.sizes.append(size)
-            type_object.save()
-
-    def __str__(self):
-        return f'Analysis for {self.scanner}'
+            if not (ts := self.stats.get(mime)):
+                ts = self.stats[mime] = TypeStats(
+                        analysis_job=self.job, mime_type=mime,
+                        histogram=[0] * HISTOGRAM_BUCKETS)
+            ts.add(size)
+
+    def flush(self):
+        job = self.job
+        with transaction.atomic():
+            # There are only ever a few dozen types, so it's fine to create
+            # their rows one at a time
+            existing = []
+            for ts in self.stats.values():
+                if ts.pk is None:
+                    ts.save()
+                else:
+                    existing.append(ts)
+            TypeStats.objects.bulk_update(
+                    existing, ["count", "total_size", "histogram"])
+            job.to_handle = self.found
+            job.handled = self.examined
+            job.status = f"Examined {self.examined} of {self.found} files found"
+            # (Saving every field would overwrite a cancellation request made
+            # since we last looked at the execution state)
+            job.save(update_fields=[
+                    "to_handle", "handled", "status", "changed_at"])
+        self.last_flush = time.monotonic()
 
 
 class TypeStats(models.Model):
     """
-    Model object for storing sizes of files for analysis
+    Model object for storing statistics about the sizes of files for analysis
     """
 
     analysis_job = models.ForeignKey(AnalysisJob,
@@ -71,14 +204,33 @@ class TypeStats(models.Model):
         verbose_name=_("Mime type")
     )
 
-    sizes = models.JSONField(
-        null=True,
-        blank=True
+    count = models.IntegerField(
+        verbose_name=_("number of files"),
+        default=0
     )
 
-    @property
-    def count(self):
-        return len(self.sizes)
+    total_size = models.BigIntegerField(
+        verbose_name=_("total size"),
+        default=0
+    )
+
+    histogram = models.JSONField(
+        verbose_name=_("size histogram"),
+        default=list
+    )
+
+    def add(self, size: int):
+        """Adds a file of the given size to these statistics."""
+        self.count += 1
+        self.total_size += size
+        self.histogram[histogram_bucket(size)] += 1
 
     def __str__(self):
         return f'{self.analysis_job}: {self.mime_type} ({self.count})'
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["analysis_job", "mime_type"],
+                name="unique_type_per_analysis_job"),
+        ]
@@ -58,9 +58,9 @@ class AnalysisPageView(LoginRequiredMixin, TemplateView):
 
                 if type_stats:
                     context["chart_data"] = json.dumps([{"type": ts.mime_type,
-                                                        "sizes": ts.sizes,
+                                                         "histogram": ts.histogram,
                                                          "n_files": ts.count,
-                                                         "total_size": sum(ts.sizes)}
+                                                         "total_size": ts.total_size}
                                                         for ts in type_stats])
 
                     context["bar_list"] = [ts.mime_type for ts in type_stats]
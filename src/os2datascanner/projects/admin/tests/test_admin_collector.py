@@ -3,6 +3,8 @@ import pytest
 from django.db import transaction
 from django.db.utils import DataError
 
+from os2datascanner.engine2.pipeline import messages
+
 from ..adminapp.management.commands import checkup_collector
 from ..adminapp.management.commands.checkup_collector import (
     create_usererrorlog, checkup_message_received_raw)
@@ -44,6 +46,32 @@ class TestPipelineCollector:
         assert scan_status.scanned_objects == expected_scanned_objects
         assert scan_status.scanned_size == expected_scanned_size
 
+    def test_worker_offloaded_sources(self, basic_scanner, status_messages):
+        """A derived Source that a worker announces and sends back to the
+        explorer should count towards both total_sources and
+        explored_sources."""
+        scan_tag = status_messages["status_message_10_objects"].scan_tag
+        ScanStatus.objects.create(
+                scanner=basic_scanner,
+                scan_tag=scan_tag.to_json_object(),
+                total_sources=1,
+                total_objects=0)
+
+        for message in (
+                # The explorer explores the top-level Source...
+                messages.StatusMessage(scan_tag=scan_tag, total_objects=1),
+                # ... a worker sends a derived Source back to the explorer...
+                messages.StatusMessage(scan_tag=scan_tag, new_sources=1),
+                # ... and the explorer explores it
+                messages.StatusMessage(scan_tag=scan_tag, total_objects=2),):
+            [s for s in status_message_received_raw(message.to_json_object())]
+
+        scan_status = ScanStatus.objects.get(
+                scan_tag=scan_tag.to_json_object())
+        assert scan_status.total_sources == 2
+        assert scan_status.explored_sources == 2
+        assert scan_status.total_objects == 3
+
     def test_surrogate_errors_are_caught(self, positive_corrupt_match_message):
         """How to test an exception is caught?
         We expect that no object is created if a DataError occurs. Reason being
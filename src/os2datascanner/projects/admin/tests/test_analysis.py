@@ -0,0 +1,73 @@
+import pytest
+
+from os2datascanner.engine2.model.file import FilesystemSource
+from os2datascanner.projects.admin.adminapp.models.scannerjobs.scanner import Scanner
+from os2datascanner.projects.admin.adminapp.models.scannerjobs.analysisscanner import (
+        AnalysisJob, HISTOGRAM_BUCKETS, histogram_bucket)
+
+
+@pytest.fixture
+def analysed_directory(tmp_path, monkeypatch):
+    for name, size in (
+            ("empty.txt", 0),
+            ("small.txt", 3),
+            ("medium.txt", 1000),
+            ("notes.html", 1000),
+            ("big.html", 70000),):
+        (tmp_path / name).write_bytes(b"x" * size)
+    monkeypatch.setattr(
+            Scanner, "generate_sources",
+            lambda self: iter([FilesystemSource(str(tmp_path))]))
+    return tmp_path
+
+
+class TestHistogram:
+
+    @pytest.mark.parametrize("size,bucket", [
+        (0, 0),
+        (1, 1),
+        (2, 2),
+        (3, 2),
+        (4, 3),
+        (1023, 10),
+        (1024, 11),
+        (2 ** 80, HISTOGRAM_BUCKETS - 1),
+    ])
+    def test_buckets(self, size, bucket):
+        assert histogram_bucket(size) == bucket
+
+
+@pytest.mark.django_db
+class TestAnalysisJob:
+
+    def test_run(self, basic_scanner, analysed_directory):
+        """Running an AnalysisJob summarises the files found by its scanner
+        by type."""
+        job = AnalysisJob.objects.create(scanner=basic_scanner)
+        # Make sure that flushing partway through the job doesn't count
+        # anything twice
+        job.flush_every = 2
+
+        job.run()
+
+        stats = {ts.mime_type: ts for ts in job.types.all()}
+        assert set(stats) == {"text/plain", "text/html"}
+
+        text = stats["text/plain"]
+        assert text.count == 3
+        assert text.total_size == 1003
+        assert len(text.histogram) == HISTOGRAM_BUCKETS
+        assert text.histogram[0] == 1
+        assert text.histogram[2] == 1
+        assert text.histogram[10] == 1
+        assert sum(text.histogram) == 3
+
+        html = stats["text/html"]
+        assert html.count == 2
+        assert html.total_size == 71000
+        assert html.histogram[10] == 1
+        assert html.histogram[17] == 1
+
+        job.refresh_from_db()
+        assert job.to_handle == 5
+        assert job.progress == 1.0
@@ -1,6 +1,8 @@
 import pytest
 
 from os2datascanner.projects.admin.adminapp.management.commands import status_collector
+from os2datascanner.projects.admin.adminapp.models.scannerjobs.scanner import (
+        ScanStatus, ScanStatusSnapshot)
 
 
 def record_status(status):
@@ -79,3 +81,60 @@ class TestStatus:
 
         basic_scanstatus.refresh_from_db()
         assert basic_scanstatus.explored_sources == 5
+
+    def test_coalesced_status_messages(
+            self,
+            basic_scanner,
+            status_message_10_objects,
+            status_message_with_object_size):
+        """Combining several status messages into one update should have the
+        same effect as handling them one at a time."""
+        bodies = [status_message_10_objects.to_json_object()] + [
+                status_message_with_object_size.to_json_object()] * 10
+        scan_tag = status_message_10_objects.scan_tag.to_json_object()
+
+        def fresh_status():
+            ScanStatus.objects.all().delete()
+            # (There's another source left to explore, so the scan won't be
+            # finished)
+            return ScanStatus.objects.create(
+                    scanner=basic_scanner, scan_tag=scan_tag, total_sources=2)
+
+        one_at_a_time = fresh_status()
+        for body in bodies:
+            list(status_collector.status_message_received_raw(body))
+        one_at_a_time.refresh_from_db()
+        snapshots = ScanStatusSnapshot.objects.filter(
+                scan_status=one_at_a_time).count()
+
+        coalesced = fresh_status()
+        (scanner, delta), = status_collector.coalesce_status_messages(bodies)
+        status_collector.update_scan_status(scanner, delta)
+        coalesced.refresh_from_db()
+
+        for field in status_collector.ScanStatusDelta.COUNTERS:
+            assert getattr(coalesced, field) == getattr(one_at_a_time, field)
+        assert coalesced.message == "status_message_with_object_size"
+        # Every snapshot that was due along the way is replaced by one for
+        # the combined update
+        assert snapshots > 1
+        assert ScanStatusSnapshot.objects.filter(
+                scan_status=coalesced).count() == 1
+
+    def test_coalescing_separates_scans(
+            self, basic_scanner, status_message_10_objects):
+        """Status messages for different scans should be combined
+        separately."""
+        other = status_message_10_objects._replace(
+                scan_tag=status_message_10_objects.scan_tag._replace(
+                        time=status_message_10_objects.scan_tag.time.replace(
+                                year=2000)))
+        bodies = [status_message_10_objects.to_json_object(),
+                  other.to_json_object(),
+                  status_message_10_objects.to_json_object()]
+
+        coalesced = status_collector.coalesce_status_messages(bodies)
+
+        assert sorted(
+                delta.counts["total_objects"] for _, delta in coalesced) == [
+                        10, 20]
@@ -15,6 +15,7 @@
 # The code is currently governed by OS2 the Danish community of open
 # source municipalities ( https://os2.eu/ )
 
+import time
 import structlog
 from django.db import transaction
 from django.core.management.base import BaseCommand
@@ -29,7 +30,7 @@ from os2datascanner.engine2.pipeline import messages
 from os2datascanner.engine2.pipeline.utilities.pika import PikaPipelineThread
 from os2datascanner.engine2.rules.last_modified import LastModifiedRule
 from os2datascanner.projects.report.organizations.models import Alias, AliasType, Organization
-from os2datascanner.utils.system_utilities import time_now
+from os2datascanner.utils.system_utilities import time_now, json_utf8_decode
 from prometheus_client import Summary, start_http_server
 
 
@@ -47,11 +48,107 @@ SUMMARY = Summary("os2datascanner_result_collector_report",
 ResolutionChoices = DocumentReport.ResolutionChoices
 
 
-def result_message_received_raw(body):
+class ResultBatch:
+    """A ResultBatch holds the database objects needed to handle a number of
+    result messages in the same transaction, so that they can be retrieved
+    with a handful of queries instead of with several queries per message.
+
+    The DocumentReports for all of the messages can be retrieved (and locked)
+    at once with the prefetch method. Handlers must tell the ResultBatch
+    whenever they change a DocumentReport, so that later messages for the
+    same object see the change."""
+
+    def __init__(self):
+        self._reports = {}
+        self._aliases = {}
+        self._remediators = {}
+        self._organizations = {}
+
+    @staticmethod
+    def _locked_reports():
+        return DocumentReport.objects.select_for_update(of=('self',))
+
+    def prefetch(self, bodies):
+        """Retrieves and locks the DocumentReports associated with all of the
+        given result messages."""
+        paths = {}
+        for body in bodies:
+            if (key := _report_key(body)):
+                path, scanner_pk = key
+                paths.setdefault(scanner_pk, set()).add(path)
+        if not paths:
+            return
+
+        q = Q()
+        for scanner_pk, scanner_paths in paths.items():
+            q |= Q(scanner_job_pk=scanner_pk, path__in=scanner_paths)
+        for dr in self._locked_reports().filter(q).order_by("-scan_time"):
+            self._reports.setdefault((dr.path, dr.scanner_job_pk), dr)
+        for scanner_pk, scanner_paths in paths.items():
+            for path in scanner_paths:
+                self._reports.setdefault((path, scanner_pk), None)
+
+    def get_report(self, path, scanner_pk) -> DocumentReport | None:
+        """Returns the (locked) DocumentReport for the given object and
+        scanner, or None if there isn't one."""
+        key = (path, scanner_pk)
+        if key not in self._reports:
+            self._reports[key] = self._locked_reports().filter(
+                    path=path, scanner_job_pk=scanner_pk).order_by(
+                    "-scan_time").first()
+        return self._reports[key]
+
+    def put_report(self, path, scanner_pk, dr: DocumentReport | None):
+        """Records that the DocumentReport for the given object and scanner
+        is now the given one (or that there's no longer one at all)."""
+        self._reports[(path, scanner_pk)] = dr
+
+    def forget_report(self, path, scanner_pk):
+        """Records that the DocumentReport for the given object and scanner
+        has been changed in the database, and must be retrieved again."""
+        self._reports.pop((path, scanner_pk), None)
+
+    def get_aliases(self, owner: str) -> list[Alias]:
+        if (key := owner.lower()) not in self._aliases:
+            self._aliases[key] = list(
+                    Alias.objects.filter(_value__iexact=owner))
+        return self._aliases[key]
+
+    def get_remediators(self, scanner_pk) -> list[Alias]:
+        """Returns the remediator Aliases responsible for the given scanner:
+        those for all scanners, and those for this one in particular."""
+        if scanner_pk not in self._remediators:
+            self._remediators[scanner_pk] = list(Alias.objects.filter(
+                    Q(_alias_type=AliasType.REMEDIATOR)
+                    & (Q(_value=0) | Q(_value=scanner_pk))))
+        return self._remediators[scanner_pk]
+
+    def get_organization(self, scan_tag) -> Organization | None:
+        if (uuid := scan_tag.organisation.uuid) not in self._organizations:
+            self._organizations[uuid] = get_org_from_scantag(scan_tag)
+        return self._organizations[uuid]
+
+
+def _report_key(body):
+    """Returns the path and scanner primary key of the DocumentReport that a
+    result message is about, or None if the message isn't valid."""
+    reference = body.get("handle") or body.get("source")
+    tag, _ = _identify_message(body)
+    if not reference or not tag:
+        return None
+    obj = (Handle.from_json_object(reference) if body.get("handle")
+           else Source.from_json_object(reference))
+    return obj.crunch(hash=True), tag["scanner"]["pk"]
+
+
+def result_message_received_raw(body, batch: ResultBatch = None):
     """Method for restructuring and storing result body.
 
     The agreed structure is as follows:
     {'scan_tag': {...}, 'matches': null, 'metadata': null, 'problem': null}
+
+    If a ResultBatch is given, then the message is handled as part of a batch
+    in the caller's transaction.
     """
     reference = body.get("handle") or body.get("source")
     tag, queue = _identify_message(body)
@@ -71,13 +168,15 @@ def result_message_received_raw(body):
         if not body.get("handle") else None,
     )
 
-    with transaction.atomic():
+    # (There's no point in a savepoint for every message in a batch: if one
+    # fails, the whole batch is rolled back anyway)
+    with transaction.atomic(savepoint=batch is None):
         if queue == "matches":
-            handle_match_message(tag, body)
+            handle_match_message(tag, body, batch)
         elif queue == "problem":
-            handle_problem_message(tag, body)
+            handle_problem_message(tag, body, batch)
         elif queue == "metadata":
-            yield from handle_metadata_message(tag, body)
+            yield from handle_metadata_message(tag, body, batch)
 
     yield from []
 
@@ -102,18 +201,26 @@ def outlook_categorize_enabled(owner: str) -> bool:
                                                      categorize_email=True))
 
 
-def handle_metadata_message(scan_tag, result):
-    # Evaluate the queryset that is updated later to lock it.
+def is_outlook_false_positive(message, owner) -> bool:
+    """Specific to Outlook matches - checks if they have the owner's "False
+    Positive" category set, in which case they should be resolved."""
+    outlook_categories = message.metadata.get("outlook-categories", [])
+    settings = outlook_settings_from_owner(owner)
+    if outlook_categories and settings and settings.false_positive_category:
+        return (settings.false_positive_category.category_name in
+                outlook_categories)
+    else:
+        return False
+
+
+def handle_metadata_message(scan_tag, result, batch: ResultBatch = None):
+    batch = batch or ResultBatch()
     message = messages.MetadataMessage.from_json_object(result)
     path = message.handle.crunch(hash=True)
     owner = owner_from_metadata(message)
 
-    previous_report = DocumentReport.objects.select_for_update(
-        of=('self',)
-    ).filter(
-        path=path,
-        scanner_job_pk=scan_tag.scanner.pk
-    ).first()
+    # Evaluate the queryset that is updated later to lock it.
+    previous_report = batch.get_report(path, scan_tag.scanner.pk)
 
     resolution_status = None
     lm = None
@@ -127,14 +234,7 @@ def handle_metadata_message(scan_tag, result):
         # shown.
         lm = scan_tag.time or time_now()
 
-    # Specific to Outlook matches - if they have a "False Positive" category set, resolve them.
-    outlook_categories = message.metadata.get("outlook-categories", [])
-    settings = outlook_settings_from_owner(owner)
-    if outlook_categories and settings and settings.false_positive_category:
-        outlook_false_positive = (settings.false_positive_category.category_name in
-                                  outlook_categories)
-    else:
-        outlook_false_positive = False
+    outlook_false_positive = is_outlook_false_positive(message, owner)
 
     # If the report is already handled as a false positive, keep it handled in that way.
     previous_false_positive = (scan_tag.scanner.keep_fp and previous_report and
@@ -155,9 +255,10 @@ def handle_metadata_message(scan_tag, result):
                 "scanner_job_name": scan_tag.scanner.name,
                 "only_notify_superadmin": scan_tag.scanner.test,
                 "resolution_status": resolution_status,
-                "organization": get_org_from_scantag(scan_tag),
+                "organization": batch.get_organization(scan_tag),
                 "owner": owner,
             })
+    batch.put_report(path, scan_tag.scanner.pk, dr)
 
     od, _ = OffendingDocument.objects.update_or_create(
                 handle=prepare_json_object(message.handle.presentation_name),  
@@ -174,17 +275,21 @@ def handle_metadata_message(scan_tag, result):
             logger.debug(f"Categorizing mail not enabled for {owner}")
 
     if dr:
-        create_aliases(dr)
+        create_aliases(dr, batch)
     else: 
         return od
 
 
-def create_aliases(dr: DocumentReport):
+def create_aliases(dr: DocumentReport, batch: ResultBatch = None):
     """ Given a DocumentReport, creates relevant alias-match relations.
     Though in most cases there'll be a One-To-One, multiple users can have
     identical aliases (think shared mailboxes or websites). Thus, relations are handled by
     bulk operations.
+
+    If a ResultBatch is given, then alias lookups are shared with the other
+    messages in the batch.
     """
+    batch = batch or ResultBatch()
     tm = Alias.match_relation.through
     new_objects = []
     owner = dr.owner
@@ -204,13 +309,12 @@ def create_aliases(dr: DocumentReport):
         return
 
     # Look for relevant alias(es) and append relation(s) to new_objects.
-    aliases = Alias.objects.filter(_value__iexact=owner)
+    aliases = batch.get_aliases(owner)
     # If there aren't any, we must look for remediators
     if not aliases:
         # Alias type must be remediator and value either 0 (all scannerjobs) or remediator
         # for this specific scannerjob.
-        aliases = Alias.objects.filter(Q(_alias_type=AliasType.REMEDIATOR) &
-                                       (Q(_value=0) | Q(_value=dr.scanner_job_pk)))
+        aliases = batch.get_remediators(dr.scanner_job_pk)
     else:
         # This means we've found an alias that fits the owner - delete remediator relations if any.
         tm.objects.filter(documentreport_id=dr.pk,
@@ -231,13 +335,12 @@ def add_new_relations(aliases, new_objects, dr, tm):
             tm(documentreport_id=dr.pk, alias_id=alias.pk))
 
 
-def handle_match_message(scan_tag, result):  # noqa: CCR001, E501 too high cognitive complexity
-    locked_qs = DocumentReport.objects.select_for_update(of=('self',))
+def handle_match_message(scan_tag, result, batch: ResultBatch = None):  # noqa: CCR001, E501 too high cognitive complexity
+    batch = batch or ResultBatch()
     new_matches = messages.MatchesMessage.from_json_object(result)
     path = new_matches.handle.crunch(hash=True)
     # The queryset is evaluated and locked here.
-    previous_report = (locked_qs.filter(
-            path=path, scanner_job_pk=scan_tag.scanner.pk).order_by("-scan_time").first())
+    previous_report = batch.get_report(path, scan_tag.scanner.pk)
 
     matches = [(match.rule.presentation, match.matches) for match in new_matches.matches]
     logger.debug(
@@ -249,6 +352,7 @@ def handle_match_message(scan_tag, result):  # noqa: CCR001, E501 too high cogni
     if previous_report and previous_report.resolution_status is None:
         # There are existing unresolved results; resolve them based on the new
         # message
+        batch.forget_report(path, scan_tag.scanner.pk)
         if not new_matches.matched:
             # No new matches. Be cautiously optimistic, but check what
             # actually happened
@@ -321,30 +425,26 @@ def handle_match_message(scan_tag, result):  # noqa: CCR001, E501 too high cogni
                     "scanner_job_name": scan_tag.scanner.name,
                     "only_notify_superadmin": scan_tag.scanner.test,
                     "resolution_status": new_status,
-                    "organization": get_org_from_scantag(scan_tag),
+                    "organization": batch.get_organization(scan_tag),
 
                     "raw_problem": None,
                 })
+        batch.put_report(path, scan_tag.scanner.pk, dr)
         od, _ = OffendingDocument.objects.update_or_create(
                 handle=prepare_json_object(new_matches.handle.presentation_name),  
                 defaults={ "handle": prepare_json_object(new_matches.handle.presentation_name),}
         )
         
         
-        for match in matches:
-            if match[0] == 'CPR regel':
-                for match in match[1]:
-            
-                    p, _ = Person.objects.update_or_create(
-                    
-                        cpr=prepare_json_object(match['match']),  
-                        defaults={ "cpr": prepare_json_object(match['match']),}
-                    )
-                    if not od.persons.filter(cpr=p.cpr).exists():
-
-                        od.persons.add(p)
-
-
+        cprs = {prepare_json_object(match['match'])
+                for rule, rule_matches in matches if rule == 'CPR regel'
+                for match in rule_matches}
+        if cprs:
+            # Create all of the missing Persons at once, and then link them
+            # all to the document at once (add() skips existing links)
+            Person.objects.bulk_create(
+                    [Person(cpr=cpr) for cpr in cprs], ignore_conflicts=True)
+            od.persons.add(*cprs)
 
         logger.debug("matches, saved DocReport", report=dr)
         return dr, od
@@ -372,16 +472,14 @@ def sort_matches_by_probability(body):
     return body
 
 
-def handle_problem_message(scan_tag, result):
-    locked_qs = DocumentReport.objects.select_for_update(of=('self',))
+def handle_problem_message(scan_tag, result, batch: ResultBatch = None):
+    batch = batch or ResultBatch()
     problem = messages.ProblemMessage.from_json_object(result)
     obj = (problem.handle if problem.handle else problem.source)
     path = obj.crunch(hash=True)
 
     # Queryset is evaluated and locked here.
-    previous_report = (locked_qs.filter(
-            path=path, scanner_job_pk=scan_tag.scanner.pk).
-            order_by("-scan_time").first())
+    previous_report = batch.get_report(path, scan_tag.scanner.pk)
 
     handle = problem.handle if problem.handle else None
     presentation = str(handle) if handle else "(source)"
@@ -403,6 +501,7 @@ def handle_problem_message(scan_tag, result):
                 msgtype="problem",
             )
             prev.delete()
+            batch.put_report(path, scan_tag.scanner.pk, None)
         case (DocumentReport() as prev, messages.ProblemMessage(missing=True)) \
                 if not prev.resolution_status:
             # A resource for which we have some unresolved reports has been
@@ -420,6 +519,7 @@ def handle_problem_message(scan_tag, result):
                 resolution_status=ResolutionChoices.REMOVED.value,
                 resolution_time=time_now(),
                 raw_problem=None)
+            batch.forget_report(path, scan_tag.scanner.pk)
         case (DocumentReport() as prev,
               messages.ProblemMessage(missing=False)) if prev.resolution_status is not None:
             # A known resource, which isn't missing, has a problem, but has already been resolved.
@@ -463,7 +563,8 @@ def handle_problem_message(scan_tag, result):
                     scanner_job_name=scan_tag.scanner.name,
                     only_notify_superadmin=scan_tag.scanner.test,
                     resolution_status=None,
-                    organization=get_org_from_scantag(scan_tag))
+                    organization=batch.get_organization(scan_tag))
+            batch.put_report(path, scan_tag.scanner.pk, dr)
 
             logger.debug(
                 "Unresolved, created new report",
@@ -479,6 +580,7 @@ def handle_problem_message(scan_tag, result):
             # existing report
             DocumentReport.objects.filter(pk=prev.pk).update(
                     raw_problem=prepare_json_object(problem.to_json_object()))
+            batch.forget_report(path, scan_tag.scanner.pk)
             return prev
 
 
@@ -504,6 +606,47 @@ class ResultCollectorRunner(PikaPipelineThread):
         super().__init__(*args, **kwargs)
         start_http_server(9091)
 
+    def dispatch_message(self, method, properties, body):
+        """In batch mode, handles a batch of result messages in a single
+        database transaction, acknowledging them (and sending the messages
+        they produced) only once that transaction has been committed.
+
+        If handling the batch fails, it's rolled back and each of its
+        messages is handled on its own instead, exactly as it would have been
+        outside of batch mode."""
+        if not self.batching:
+            return super().dispatch_message(method, properties, body)
+
+        deliveries = self.await_batch((method, properties, body))
+        keys = [m.routing_key for m, _, _ in deliveries]
+        bodies = [json_utf8_decode(b) for _, _, b in deliveries]
+        start = time.monotonic()
+        try:
+            with transaction.atomic():
+                batch = ResultBatch()
+                batch.prefetch(
+                        b for k, b in zip(keys, bodies) if k == "os2ds_results")
+                results = [
+                        list(result_message_received_raw(b, batch))
+                        if k == "os2ds_results" else []
+                        for k, b in zip(keys, bodies)]
+        except Exception:
+            logger.warning(
+                    "failed to handle batch, retrying messages one at a time",
+                    size=len(deliveries), exc_info=True)
+            for delivery in deliveries:
+                super().dispatch_message(*delivery)
+            return
+
+        elapsed = time.monotonic() - start
+        logger.debug(
+                "batch committed", size=len(deliveries), elapsed=elapsed)
+        for (m, _, _), k, b, result in zip(deliveries, keys, bodies, results):
+            SUMMARY.observe(elapsed / len(deliveries))
+            self.enqueue_results(result)
+            self.enqueue_ack(m.delivery_tag)
+            self.after_message(k, b)
+
     def handle_message(self, routing_key, body):
         with SUMMARY.time():
             logger.debug(
@@ -519,10 +662,26 @@ class Command(BaseCommand):
     """Command for starting a result collector process."""
     help = __doc__
 
-    def handle(self, *args, **options):
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1,
+            help="The largest number of result messages to handle in a single"
+                 " database transaction.")
+        parser.add_argument(
+            "--batch-latency",
+            type=float,
+            default=100,
+            help="The longest time, in milliseconds, to wait for more result"
+                 " messages to arrive before handling a batch.")
+
+    def handle(self, *args, batch_size, batch_latency, **options):
         debug.register_debug_signal()
 
         ResultCollectorRunner(
             read=["os2ds_results"],
             write=["os2ds_email_tags"],
-            prefetch_count=8).run_consumer()
+            prefetch_count=8,
+            batch_size=batch_size,
+            batch_latency=batch_latency / 1000).run_consumer()
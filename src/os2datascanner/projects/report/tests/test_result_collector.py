@@ -641,3 +641,43 @@ class TestPipelineCollector:
 
         assert not before
         assert after
+
+    @pytest.mark.parametrize('first,second', [
+        ('positive_match', 'deletion'),
+        ('transient_handle_error', 'deletion'),
+        ('positive_match', 'negative_match'),
+    ])
+    def test_batch_matches_individual_handling(self, request, first, second):
+        """Handling several messages about the same object as a batch should
+        have the same effect as handling them one at a time."""
+        first = request.getfixturevalue(first)
+        second = request.getfixturevalue(second)
+        bodies = [
+            first.to_json_object() | {"origin": origin(first)},
+            second.to_json_object() | {"origin": origin(second)},
+        ]
+
+        for body in bodies:
+            list(result_collector.result_message_received_raw(body))
+        expected = list(DocumentReport.objects.values_list(
+                "resolution_status", "raw_problem"))
+        DocumentReport.objects.all().delete()
+
+        batch = result_collector.ResultBatch()
+        batch.prefetch(bodies)
+        for body in bodies:
+            list(result_collector.result_message_received_raw(body, batch))
+
+        assert list(DocumentReport.objects.values_list(
+                "resolution_status", "raw_problem")) == expected
+
+
+def origin(message):
+    """Returns the name of the queue from which the pipeline collector would
+    have received the given message."""
+    if isinstance(message, messages.MatchesMessage):
+        return "os2ds_matches"
+    elif isinstance(message, messages.ProblemMessage):
+        return "os2ds_problems"
+    else:
+        return "os2ds_metadata"
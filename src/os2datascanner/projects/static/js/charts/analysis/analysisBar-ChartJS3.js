@@ -1,70 +1,41 @@
-/* jshint ignore:start */
-function getDigitLength(number) {
-  return number.toString().length;
-}
-/* jshint ignore:end */
-
-function bytesToKB(bytes) {
-  if (bytes === 0) {return 0;}
-  let KB = parseInt((bytes / Math.pow(1024, 1)).toFixed(1));
-  return KB;
-}
-/* jshint ignore:start */
-function binAndCount(array, binVal){
-  // divides array into bins with a range of approx {binVal} % of total range
-  // counts number of instances in each bin
-  const max = Math.max.apply(Math, array);
-  let binSize = 0;
-  if (array.length <= 15){
-    binSize = max/array.length
+function formatBytes(bytes) {
+  const units = ["B", "KB", "MB", "GB", "TB", "PB"];
+  let i = 0;
+  while (bytes >= 1024 && i < units.length - 1) {
+    bytes /= 1024;
+    i++;
   }
+  return `${Math.round(bytes)} ${units[i]}`;
+}
 
-  else {
-    binSize = Math.round(max*(binVal/100));
-  }
-  const roundNumber = Math.pow(10, getDigitLength(Math.round(binSize))-1);
-  binSize = Math.round(binSize/roundNumber)*roundNumber;
-  let nBins = Math.ceil(max/binSize);
-  if (Number.isInteger(max/binSize)){
-    nBins++;
-  }
-  
-  let counts = Array(nBins).fill(0);
-  for (let i = 0; i < array.length; i++ ){
-    const index = Math.floor(array[i]/binSize);
-    counts[index]++;
+function bucketLabel(index) {
+  // bucket 0 counts empty files, and bucket n counts files of at least
+  // 2^(n-1) and less than 2^n bytes
+  if (index === 0) {
+    return "0 B";
   }
-  return [counts, binSize];
+  return `${formatBytes(Math.pow(2, index - 1))}-${formatBytes(Math.pow(2, index))}`;
 }
-/* jshint ignore:end */
 
-function getData(dataArray, granularity=5){ // jshint ignore:line
-  // bins and counts dataArray
-  // begins with a binrange of approx {granularity} % of total range
-  // balances number of vary large and very small bins
-  // balancing values are rather arbitrary - should they be soft-coded???
-  // binsize is passed as it is used to create appropriate labels for tooltips
-
-  if (dataArray.length ===1){
-    return [[{x: dataArray[0], y:1}], 1];
+function getData(histogram){ // jshint ignore:line
+  // turns a histogram of file sizes into labelled bars, leaving out the empty
+  // buckets at either end
+  const first = histogram.findIndex(count => count > 0);
+  if (first === -1) {
+    return [];
   }
-  dataArray.sort(function(a,b) {
-    return a-b;
-  });
-
-  const converted = dataArray.map(byte => bytesToKB(byte));
-  let [counts, binSize] = binAndCount(converted, granularity);
-
-  let nBins = counts.length;
-  let labels = [];
-  for (let i = 0; i < nBins; i++){
-    labels.push(binSize*i+(binSize/2));
+  let last = histogram.length - 1;
+  while (last > first && histogram[last] === 0) {
+    last--;
+  }
+  let points = [];
+  for (let i = first; i <= last; i++) {
+    points.push({x: bucketLabel(i), y: histogram[i]});
   }
-  let points = labels.map((c, i) => ({x: c, y: counts[i]}));
-  return [points, binSize];
+  return points;
 }
 
-function createBars(data, ctx, titleText, binSize){ // jshint ignore:line
+function createBars(data, ctx, titleText){ // jshint ignore:line
   const bar = new Chart(ctx, {
     type: 'bar',
     data: {
@@ -78,13 +49,12 @@ function createBars(data, ctx, titleText, binSize){ // jshint ignore:line
     options: {
       scales: {
         x: {
-            type: 'linear',
-            offset: false,
+            type: 'category',
+            offset: true,
             grid: {
-              offset: false
+              offset: true
             },
             ticks: {
-              stepSize: binSize,
               color: 'black',
               font: {
                 size: 13
@@ -93,7 +63,7 @@ function createBars(data, ctx, titleText, binSize){ // jshint ignore:line
             },
             title: {
               display: true,
-              text: 'KB',
+              text: gettext('File size'),
               font: {
                   size: 16
               },
@@ -153,9 +123,7 @@ function createBars(data, ctx, titleText, binSize){ // jshint ignore:line
           padding: 10,
           callbacks: {
             label:(tooltipItem)=>{
-              let start = parseInt(tooltipItem.label) - (binSize/2);
-              let end = parseInt(tooltipItem.label) + (binSize/2);
-                return `${start}-${end} KB`;},
+                return tooltipItem.label;},
             title:(tooltipItem) =>{
               let val = tooltipItem[0].formattedValue;
               if (val === '1'){
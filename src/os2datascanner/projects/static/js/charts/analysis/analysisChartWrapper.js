@@ -4,9 +4,9 @@ function drawBars(){
     const Data = JSON.parse(dataElement.textContent);
     JSON.parse(Data).forEach((dataset, i) => {
       let ctx = document.getElementById("bar"+(i+1).toString());
-      let [data, binSize] = getData(dataset.sizes);
+      let data = getData(dataset.histogram);
       let title = dataset.type.charAt(0).toUpperCase() + dataset.type.slice(1);
-      charts.push(createBars(data, ctx, title, binSize));
+      charts.push(createBars(data, ctx, title));
     });
   }
 }